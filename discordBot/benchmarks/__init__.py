@@ -0,0 +1,9 @@
+'''
+Benchmarks for the bot8 API
+
+Run from the discordBot directory, ex
+    python -m benchmarks.asgi_vs_wsgi --help
+
+The benchmarks use their own database (see benchmarks/settings.py)
+so they never touch db.sqlite3
+'''
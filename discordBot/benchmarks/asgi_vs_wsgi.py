@@ -0,0 +1,68 @@
+'''
+Compare the async views under an ASGI server with the DRF views under WSGI
+
+Both servers are started against the same seeded benchmark database and
+get the same mix of read requests. Needs uvicorn for the ASGI server
+(pip install uvicorn), the WSGI side uses "manage.py runserver" unless
+another command is given with --wsgi-command
+
+    python -m benchmarks.asgi_vs_wsgi --requests 2000 --concurrency 32
+'''
+import argparse
+import shlex
+import sys
+from .harness import (
+    setup_django, seed_tasks, launch, wait_for_server, stop, http_load, print_table, write_json)
+
+
+def request_paths(guilds):
+    from bot8.models import Task
+    task_ids = list(Task.objects.values_list('id', flat=True)[:100])
+    paths = []
+    for i, task_id in enumerate(task_ids):
+        paths.append(f'/task?guild={i % guilds}&limit=50')
+        paths.append(f'/task/{task_id}')
+        paths.append(f'/due-date/{task_id}')
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--guilds', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--wsgi-command', default=f'{sys.executable} manage.py runserver --noreload {{port}}')
+    parser.add_argument('--asgi-command', default=f'{sys.executable} -m uvicorn discordbot.asgi:application --port {{port}} --log-level warning')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    seed_tasks(args.tasks, args.guilds)
+    paths = request_paths(args.guilds)
+
+    servers = [
+        ('wsgi', args.wsgi_command, {'BOT8_ASYNC_VIEWS': '0'}),
+        ('asgi', args.asgi_command, {'BOT8_ASYNC_VIEWS': '1'}),
+    ]
+    results = []
+    for name, command, env in servers:
+        base_url = f'http://127.0.0.1:{args.port}'
+        process = launch(shlex.split(command.format(port=args.port)), env)
+        try:
+            wait_for_server(base_url + '/task?limit=1')
+            # warm up connections and caches before measuring
+            http_load(base_url, paths, min(200, args.requests), args.concurrency)
+            result = http_load(base_url, paths, args.requests, args.concurrency)
+        finally:
+            stop(process)
+        results.append(dict(server=name, **result))
+
+    print_table(results, ['server', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms'])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''
+Time of listing the tasks of a user, joined through the assignees and
+sorted by the tasks' due dates vs read in order from the assignee index
+with the copied due dates, see bot8/assignments.py
+
+Seeds users and tasks with harness.seed_realistic, so a few users are
+assigned to a lot of tasks, then lists the tasks of the users with the
+most of them: the first page, the page in the middle of the listing and
+the whole listing, and the first page within their largest guild
+
+    python -m benchmarks.assignees --tasks 200000 --users 2000
+'''
+import argparse
+import statistics
+import time
+from .harness import setup_django, seed_realistic, print_table, write_json
+
+
+def timed(function, repeat):
+    '''the median wall time of the calls in ms'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=200000)
+    parser.add_argument('--guilds', type=int, default=200)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--fanout', type=int, default=3, help='most users assigned to a task')
+    parser.add_argument('--top', type=int, default=3, help='users listed, the ones with the most tasks')
+    parser.add_argument('--limit', type=int, default=100, help='tasks of a page')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db.models import Count, F
+    from bot8.models import Task, TaskAssignee
+    from bot8.pagination import TaskCursorPagination
+    from bot8.rows import task_rows
+    from bot8.views import list_tasks
+    if not Task.objects.exists():
+        seed_realistic(args.tasks, args.guilds, args.users, args.fanout)
+
+    def joined(user, guild=None):
+        '''the listing before the copies, ordered by the joined tasks'''
+        queryset = Task.objects.filter(assignees=user)
+        if guild is not None:
+            queryset = queryset.filter(guild=guild)
+        return queryset.order_by(F('due_date').asc(nulls_last=True), 'id')
+
+    top = (TaskAssignee.objects.values('users').annotate(count=Count('id'))
+           .order_by('-count')[:args.top])
+    results = []
+    for user, count in top.values_list('users', 'count'):
+        guild = (TaskAssignee.objects.filter(users=user).values('guild').annotate(count=Count('id'))
+                 .order_by('-count').values_list('guild', flat=True)[0])
+        # the cursor of the page in the middle of the listing
+        middle = joined(user).values_list('due_date', 'id')[count // 2]
+        listings = {
+            'first page': lambda listing: listing(user)[:args.limit],
+            'middle page': lambda listing: TaskCursorPagination.filter_after(listing(user), *middle)[:args.limit],
+            'all': lambda listing: listing(user),
+            'guild first page': lambda listing: listing(user, guild)[:args.limit],
+        }
+        for name, queryset in listings.items():
+            row = {'user': user, 'tasks': count, 'listing': name}
+            for column, listing in (('join ms', joined), ('index ms', list_tasks)):
+                row[column] = timed(lambda: task_rows(queryset(listing)), args.repeat)
+            row['speedup'] = row['join ms'] / row['index ms']
+            results.append(row)
+    print_table(results, ['user', 'tasks', 'listing', 'join ms', 'index ms', 'speedup'])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
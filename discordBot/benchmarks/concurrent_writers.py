@@ -0,0 +1,103 @@
+'''
+Concurrent writers against sqlite, with and without the production profile
+
+Every profile gets its own database file and the same workload: worker
+processes sending due date, reminder and create requests through the
+views, mixed with guild listings. The default profile opens a connection
+per request in rollback journal mode, the production profile
+(discordbot/production_settings.py) keeps connections open and sets the
+WAL, synchronous, mmap and busy timeout pragmas. Failed requests are
+mostly "database is locked" errors
+
+    python -m benchmarks.concurrent_writers --workers 8 --requests 500
+'''
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from .harness import BASE_DIR, setup_django, seed_tasks, summarize, print_table, write_json
+
+PROFILES = ('default', 'production')
+
+
+def prepare(tasks, guilds):
+    '''migrate and seed the database of the profile in the environment'''
+    setup_django()
+    seed_tasks(tasks, guilds)
+    from bot8.models import Task
+    return list(Task.objects.values_list('id', flat=True))
+
+
+def init_worker():
+    setup_django(migrate=False)
+
+
+def run_worker(args):
+    '''send requests and return the latencies of the answered ones and the error count'''
+    worker, requests, task_ids, guilds, read_ratio = args
+    from django.test import Client
+    client = Client(raise_request_exception=False)
+    rng = random.Random(worker)
+
+    latencies = []
+    errors = 0
+    start = time.time()
+    for i in range(requests):
+        task_id = rng.choice(task_ids)
+        request_start = time.perf_counter()
+        if rng.random() < read_ratio:
+            response = client.get(f'/task?guild={rng.randrange(guilds)}&limit=50')
+        else:
+            kind = rng.randrange(3)
+            if kind == 0:
+                response = client.post(f'/due-date/{task_id}', data={'due_date': '2023-10-25T14:30:00Z'})
+            elif kind == 1:
+                response = client.put(f'/reminder/{task_id}', data={'reminder': '2023-10-25T14:00:00Z'},
+                                      content_type='application/json')
+            else:
+                response = client.post('/task', data={'title': f'worker {worker} task {i}', 'guild': rng.randrange(guilds)})
+        if response.status_code < 400:
+            latencies.append(time.perf_counter() - request_start)
+        else:
+            errors += 1
+    return latencies, errors, start, time.time()
+
+
+def run_profile(profile, args):
+    os.environ['BENCH_PROFILE'] = profile
+    os.environ['BENCH_DB'] = str(BASE_DIR / f'bench-writers-{profile}.sqlite3')
+
+    # spawned processes start with a fresh django set up for the profile
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        task_ids = pool.apply(prepare, (args.tasks, args.guilds))
+    with context.Pool(args.workers, initializer=init_worker) as pool:
+        jobs = [(worker, args.requests, task_ids, args.guilds, args.read_ratio) for worker in range(args.workers)]
+        results = pool.map(run_worker, jobs)
+
+    latencies = [latency for worker_latencies, _, _, _ in results for latency in worker_latencies]
+    errors = sum(worker_errors for _, worker_errors, _, _ in results)
+    elapsed = max(end for _, _, _, end in results) - min(start for _, _, start, _ in results)
+    return dict(profile=profile, **summarize(latencies, elapsed, errors))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requests per worker')
+    parser.add_argument('--read-ratio', type=float, default=0.3, help='share of the requests that are listings')
+    parser.add_argument('--profile', choices=PROFILES, action='append', help='only run these profiles')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = [run_profile(profile, args) for profile in args.profile or PROFILES]
+    print_table(results, ['profile', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms'])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
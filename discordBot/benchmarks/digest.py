@@ -0,0 +1,65 @@
+'''
+Time of the upcoming deadline digest of many guilds, see bot8/digest.py
+
+Seeds tasks spread over the guilds, then times the digest counted from
+the tasks and read from the trigger kept summary, with and without the
+first tasks of every bucket. "summary (new day)" is the first digest of
+a day, which counts the tasks again to refresh the summary
+
+    python -m benchmarks.digest --tasks 200000 --guilds 5000
+'''
+import argparse
+import statistics
+import time
+from .harness import setup_django, seed_tasks, print_table, write_json
+
+
+def timed(function, repeat):
+    '''the median wall time of the calls in ms'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=200000)
+    parser.add_argument('--guilds', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=3, help='tasks of every bucket')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from bot8 import digest
+    seed_tasks(args.tasks, args.guilds)
+    guilds = list(range(args.guilds))
+
+    def row(counts, limit, ms):
+        return {'counts': counts, 'limit': limit, 'guilds': args.guilds, 'ms': ms}
+
+    results = []
+    settings.TASK_DIGEST_SUMMARY = False
+    digest.uninstall(connection)
+    for limit in (0, args.limit):
+        results.append(row('tasks', limit, timed(lambda: digest.digest(guilds, limit), args.repeat)))
+
+    settings.TASK_DIGEST_SUMMARY = True
+    digest.install(connection)
+    results.append(row('summary (new day)', 0, timed(lambda: digest.digest(guilds, 0), 1)))
+    for limit in (0, args.limit):
+        results.append(row('summary', limit, timed(lambda: digest.digest(guilds, limit), args.repeat)))
+    settings.TASK_DIGEST_SUMMARY = False
+    digest.uninstall(connection)
+    print_table(results, ['counts', 'limit', 'guilds', 'ms'])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+'''helpers shared by the benchmarks: seeding, servers and load generation'''
+import json
+import os
+import random
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SETTINGS_MODULE = 'benchmarks.settings'
+
+
+def setup_django(migrate=True):
+    '''configure django with the benchmark settings and migrate the benchmark database'''
+    os.environ['DJANGO_SETTINGS_MODULE'] = SETTINGS_MODULE
+    import django
+    django.setup()
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+
+
+def seed_tasks(tasks, guilds, seed=0):
+    '''create tasks spread over guilds, unless the database already has enough'''
+    from django.utils import timezone
+    from datetime import timedelta
+    from bot8.models import Task
+
+    existing = Task.objects.count()
+    if existing >= tasks:
+        return existing
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    Task.objects.bulk_create(
+        [Task(title=f'task {i}',
+              guild=rng.randrange(guilds),
+              due_date=now + timedelta(hours=rng.randrange(-500, 500)) if rng.random() < 0.8 else None)
+         for i in range(existing, tasks)],
+        batch_size=1000)
+    return tasks
+
+
+def seed_realistic(tasks, guilds, users, fanout, seed=0, skew=1.1):
+    '''
+    create users and tasks shaped like real traffic: a few large guilds
+    and many small ones (zipf distributed with the skew exponent), and
+    tasks assigned to up to fanout users, picked with the same skew so a
+    few users are assigned to a lot of tasks
+    '''
+    from datetime import timedelta
+    from django.db import transaction
+    from django.utils import timezone
+    from bot8.models import Task, Users
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    guild_weights = [1 / (rank + 1) ** skew for rank in range(guilds)]
+    user_weights = [1 / (rank + 1) ** skew for rank in range(users)]
+    usernames = [f'user{i}#{1000 + i % 9000}' for i in range(users)]
+
+    with transaction.atomic():
+        Users.objects.bulk_create([Users(username=username) for username in usernames], ignore_conflicts=True)
+        guild_of = rng.choices(range(guilds), guild_weights, k=tasks)
+        created = Task.objects.bulk_create(
+            [Task(title=f'task {i}',
+                  guild=guild_of[i],
+                  due_date=now + timedelta(hours=rng.randrange(-500, 500)) if rng.random() < 0.8 else None,
+                  reminder=now + timedelta(hours=rng.randrange(1, 500)) if rng.random() < 0.2 else None)
+             for i in range(tasks)],
+            batch_size=1000)
+
+        through = Task.assignees.through
+        rows = []
+        for task in created:
+            for username in set(rng.choices(usernames, user_weights, k=rng.randrange(fanout + 1))):
+                rows.append(through(task_id=task.id, users_id=username, due_date=task.due_date, guild=task.guild))
+        through.objects.bulk_create(rows, batch_size=1000)
+    return len(created), len(rows)
+
+
+def percentile(samples, p):
+    '''nearest rank percentile of a sorted list'''
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, int(round(p / 100 * len(samples) + 0.5)) - 1))
+    return samples[rank]
+
+
+def summarize(latencies, elapsed, errors=0):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50_ms': 1000 * percentile(latencies, 50),
+        'p95_ms': 1000 * percentile(latencies, 95),
+        'p99_ms': 1000 * percentile(latencies, 99),
+    }
+
+
+def launch(command, env=None):
+    '''start a server process from the discordBot directory'''
+    process_env = dict(os.environ, DJANGO_SETTINGS_MODULE=SETTINGS_MODULE, **(env or {}))
+    return subprocess.Popen(
+        command, cwd=BASE_DIR, env=process_env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_server(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except urllib.error.HTTPError:
+            # the server is up, the response just isn't a success
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {url} did not start')
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def http_request(base_url, request):
+    '''
+    a urllib request for a path, or for a (method, path, json body, headers)
+    tuple where the body and headers can be None. A bytes body is sent as
+    it is, with the Content-Type of the headers
+    '''
+    if isinstance(request, str):
+        return urllib.request.Request(base_url + request)
+    method, path, body, headers = request
+    headers = dict(headers or {})
+    data = None
+    if isinstance(body, bytes):
+        data = body
+    elif body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    return urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+
+
+def http_load(base_url, paths, requests, concurrency):
+    '''
+    send requests requests spread over paths with concurrency threads,
+    returns the summary of the response latencies. A path can also be
+    a request tuple, see http_request
+    '''
+    def send(i):
+        request = http_request(base_url, paths[i % len(paths)])
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            # error responses are still answered requests
+            e.read()
+        except OSError:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(send, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for latency in results if latency is not None]
+    return summarize(latencies, elapsed, errors=len(results) - len(latencies))
+
+
+def print_table(rows, columns):
+    '''print a list of dicts as an aligned table'''
+    widths = {column: max(len(column), *(len(format_value(row[column])) for row in rows)) for column in columns}
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print('  '.join(format_value(row[column]).ljust(widths[column]) for column in columns))
+
+
+def format_value(value):
+    return f'{value:.2f}' if isinstance(value, float) else str(value)
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
@@ -0,0 +1,81 @@
+'''
+CPU time of serializing task listings, TaskSerializer against bot8/rows.py
+
+Both paths list the same tasks in the same order. The model path reads
+the tasks with their assignees prefetched, serializes them with
+TaskSerializer and renders with DRF's JSONRenderer. The rows path reads
+tuples with task_rows, builds the dicts with task_row_data and renders
+with FastJSONRenderer. The outputs are checked to be the same bytes, and
+the CPU time is reported per 10k tasks
+
+    python -m benchmarks.serialization --tasks 10000 --repeat 5
+'''
+import argparse
+import time
+from .harness import setup_django, seed_realistic, print_table, write_json
+
+
+def model_path(queryset):
+    from rest_framework.renderers import JSONRenderer
+    from bot8.serializers import TaskSerializer
+    return JSONRenderer().render(TaskSerializer(queryset.prefetch_related('assignees'), many=True).data)
+
+
+def rows_path(queryset):
+    from bot8.renderers import FastJSONRenderer
+    from bot8.rows import task_rows, task_row_data
+    return FastJSONRenderer().render([task_row_data(row) for row in task_rows(queryset)])
+
+
+def measure(path, queryset, repeat):
+    '''the best cpu and wall time of repeat runs, and the output'''
+    best_cpu = best_wall = float('inf')
+    for _ in range(repeat):
+        cpu, wall = time.process_time(), time.perf_counter()
+        content = path(queryset)
+        best_cpu = min(best_cpu, time.process_time() - cpu)
+        best_wall = min(best_wall, time.perf_counter() - wall)
+    return best_cpu, best_wall, content
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=10000, help='tasks in one listing')
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from bot8.models import Task
+    from bot8.views import list_tasks
+    if Task.objects.count() < args.tasks:
+        seed_realistic(args.tasks - Task.objects.count(), guilds=50, users=500, fanout=args.fanout)
+    queryset = list_tasks()[:args.tasks]
+    tasks = len(queryset.values_list('id', flat=True))
+
+    results = []
+    outputs = []
+    for name, path in (('TaskSerializer', model_path), ('rows', rows_path)):
+        cpu, wall, content = measure(path, queryset, args.repeat)
+        outputs.append(content)
+        scale = 10000 / tasks
+        results.append({
+            'path': name,
+            'tasks': tasks,
+            'cpu_ms_per_10k': 1000 * cpu * scale,
+            'wall_ms_per_10k': 1000 * wall * scale,
+            'bytes': len(content),
+        })
+    results[1]['speedup'] = results[0]['cpu_ms_per_10k'] / results[1]['cpu_ms_per_10k']
+    results[0]['speedup'] = 1.0
+    if outputs[0] != outputs[1]:
+        raise SystemExit('the outputs differ')
+
+    print_table(results, ['path', 'tasks', 'cpu_ms_per_10k', 'wall_ms_per_10k', 'bytes', 'speedup'])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
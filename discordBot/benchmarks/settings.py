@@ -0,0 +1,18 @@
+# settings for benchmark runs, the database is a separate sqlite file
+# that can be set with the BENCH_DB environment variable.
+# BENCH_PROFILE=production runs on top of discordbot/production_settings.py
+# and BENCH_PROFILE=api on top of discordbot/api_settings.py
+import os
+
+if os.environ.get('BENCH_PROFILE') == 'production':
+    from discordbot.production_settings import *
+elif os.environ.get('BENCH_PROFILE') == 'api':
+    from discordbot.api_settings import *
+else:
+    from discordbot.settings import *
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+DATABASES['default']['NAME'] = os.environ.get('BENCH_DB', BASE_DIR / 'bench.sqlite3')
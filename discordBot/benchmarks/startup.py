@@ -0,0 +1,128 @@
+'''
+Startup time of a new process with the default, production and api-only
+settings, see discordbot/api_settings.py
+
+For every profile:
+- setup ms: the time to set up django, load the WSGI application and
+  the url conf in a new interpreter, the median of --repeat runs, and
+  process ms the wall time of the whole interpreter
+- import ms and modules: the import time and number of modules imported
+  by the same code, from "python -X importtime", with the packages that
+  take the most of it
+- first response ms: from starting a server (by default "manage.py serve"
+  with one worker) to its first answered request, the median of --repeat
+  starts
+
+    python -m benchmarks.startup --repeat 5
+'''
+import argparse
+import collections
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from .harness import BASE_DIR, SETTINGS_MODULE, setup_django, launch, stop, print_table, write_json
+
+PROFILES = ('default', 'production', 'api')
+
+# prints the milliseconds to set up django and load the url conf
+SETUP = '''
+import time
+start = time.perf_counter()
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+get_wsgi_application()
+get_resolver().reverse_dict
+print((time.perf_counter() - start) * 1000)
+'''
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+\d+ \| +(\S+)')
+
+
+def run_setup(profile, *options):
+    env = dict(os.environ, BENCH_PROFILE=profile, DJANGO_SETTINGS_MODULE=SETTINGS_MODULE)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *options, '-c', SETUP], cwd=BASE_DIR, env=env,
+        capture_output=True, text=True, check=True)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def import_times(profile):
+    '''the import time in ms of every top level package, from -X importtime'''
+    result, _ = run_setup(profile, '-X', 'importtime')
+    packages = collections.Counter()
+    modules = 0
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            # self times, so the packages add up to the whole import time
+            packages[match.group(2).split('.')[0]] += int(match.group(1)) / 1000
+            modules += 1
+    return packages, modules
+
+
+def first_response(profile, command, port, timeout=60):
+    '''ms from starting the server to its first answered request'''
+    url = f'http://127.0.0.1:{port}/task?limit=1'
+    start = time.perf_counter()
+    process = launch(command, env={'BENCH_PROFILE': profile})
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    response.read()
+                return (time.perf_counter() - start) * 1000
+            except urllib.error.HTTPError:
+                # the server is up, the response just isn't a success
+                return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f'server at {url} did not start')
+    finally:
+        stop(process)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8, help='packages listed with the most import time')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--command', default=f'{sys.executable} manage.py serve --workers 1 --port {{port}}')
+    parser.add_argument('--profile', choices=PROFILES, action='append', help='only run these profiles')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    command = shlex.split(args.command.format(port=args.port))
+    results = []
+    for profile in args.profile or PROFILES:
+        setups = [run_setup(profile) for _ in range(args.repeat)]
+        packages, modules = import_times(profile)
+        results.append({
+            'profile': profile,
+            'setup ms': statistics.median(float(result.stdout) for result, _ in setups),
+            'process ms': statistics.median(elapsed for _, elapsed in setups),
+            'import ms': sum(packages.values()),
+            'modules': modules,
+            'first response ms': statistics.median(
+                first_response(profile, command, args.port) for _ in range(args.repeat)),
+            'top imports': dict(packages.most_common(args.top)),
+        })
+    print_table(results, ['profile', 'setup ms', 'process ms', 'import ms', 'modules', 'first response ms'])
+    for result in results:
+        print(f"\n{result['profile']}: " + ', '.join(
+            f'{package} {ms:.1f}' for package, ms in result['top imports'].items()))
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
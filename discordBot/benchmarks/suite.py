@@ -0,0 +1,315 @@
+'''
+Benchmarks for the routes of bot8/urls.py: every listing mode, detail,
+dashboard, digest, search, export and import, changes, and the writes
+(create, batches, due dates, reminders, assignment, occurrences,
+completion, delete). /metrics is left out, it is only served with the
+PROFILING setting on
+
+    python -m benchmarks.suite seed --reset
+    python -m benchmarks.suite run --json baseline.json
+    python -m benchmarks.suite run --server --json current.json
+    python -m benchmarks.suite compare baseline.json current.json
+
+"seed" fills the suite's database (bench-suite.sqlite3 unless BENCH_DB is
+set) with skewed guilds and heavy assignee fan-out, see
+harness.seed_realistic. "run" sends every scenario's requests through the
+django test client in this process, recording the latency percentiles
+and the number of queries per request, and with --server also against a
+server started on the same database. "compare" prints the change of
+every scenario between two result files and exits with 1 when a scenario
+got slower than the threshold or runs more queries.
+
+Write scenarios change the data, so seed again with --reset before
+recording a baseline
+'''
+import argparse
+import json
+import os
+import platform
+import shlex
+import sys
+import time
+import uuid
+from datetime import timedelta
+from .harness import (
+    BASE_DIR, setup_django, seed_realistic, summarize, launch, wait_for_server, stop,
+    http_load, print_table, write_json)
+
+DEFAULT_DB = BASE_DIR / 'bench-suite.sqlite3'
+
+
+class Context:
+    '''ids and names the scenarios build their requests from'''
+
+    def __init__(self, disposable):
+        from django.db.models import Count
+        from django.utils import timezone
+        from bot8.changes import latest_seq
+        from bot8.models import Task, Users
+        from bot8.transfer import FORMAT_VERSION
+
+        guilds = list(
+            Task.objects.values('guild').annotate(tasks=Count('id'))
+            .order_by('-tasks').values_list('guild', flat=True))
+        if not guilds:
+            raise SystemExit('the database is empty, run "python -m benchmarks.suite seed" first')
+        self.hot_guild = guilds[0]
+        self.guilds = guilds
+        self.task_ids = list(Task.objects.order_by('?').values_list('id', flat=True)[:1000])
+        self.due_task_ids = list(
+            Task.objects.filter(due_date__isnull=False).order_by('?').values_list('id', flat=True)[:1000])
+        self.heavy_user = (
+            Users.objects.annotate(tasks=Count('task')).order_by('-tasks')
+            .values_list('username', flat=True).first())
+        self.since = max(0, latest_seq() - 100)
+        now = timezone.now()
+        self.window = f'from={(now - timedelta(days=7)):%Y-%m-%dT%H:%M:%SZ}&to={(now + timedelta(days=7)):%Y-%m-%dT%H:%M:%SZ}'
+        self.token = uuid.uuid4().hex[:8]
+        self.digest_guilds = ','.join(str(guild) for guild in guilds[:20])
+
+        # daily tasks for the occurrence scenario, kept between runs
+        start = now.replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=7)
+        recurring = Task.objects.filter(title__startswith='recurring ', recurrence='FREQ=DAILY')
+        if not recurring.exists():
+            Task.objects.bulk_create([
+                Task(title=f'recurring {i}', guild=self.hot_guild, due_date=start, recurrence='FREQ=DAILY')
+                for i in range(20)])
+        self.recurring = list(recurring.values_list('id', 'due_date'))
+
+        # an export of 50 tasks for the import scenario
+        lines = [{'type': 'export', 'version': FORMAT_VERSION, 'guild': None}] + [
+            {'type': 'task', 'id': i, 'title': f'imported {i}', 'due_date': None, 'reminder': None,
+             'guild': self.pick(guilds, i), 'assignees': []}
+            for i in range(50)]
+        self.export = ''.join(json.dumps(line) + '\n' for line in lines).encode()
+
+        # tasks the delete scenario can remove
+        self.disposable = [task.id for task in Task.objects.bulk_create(
+            [Task(title=f'disposable {i}', guild=self.hot_guild) for i in range(disposable)])]
+
+    def pick(self, items, i):
+        return items[i % len(items)]
+
+    def occurrence(self, i):
+        '''an occurrence of a recurring task within two weeks of its start'''
+        task_id, start = self.pick(self.recurring, i)
+        occurrence = start + timedelta(days=i % 14)
+        return task_id, {'occurrence': occurrence.isoformat(), 'completed': i % 2 == 0}
+
+
+def task_spec(ctx, i, n):
+    return {'title': f'bench {ctx.token} {i} {n}', 'guild': ctx.pick(ctx.guilds, i),
+            'due_date': '2023-10-25T14:30:00Z', 'assignees': [ctx.heavy_user]}
+
+
+# name, read only, function of the context and the request number
+# returning a (method, path, json body, headers) request
+SCENARIOS = [
+    ('list_hot_guild', True, lambda ctx, i: ('GET', f'/task?guild={ctx.hot_guild}', None, None)),
+    ('list_guild', True, lambda ctx, i: ('GET', f'/task?guild={ctx.pick(ctx.guilds, i)}', None, None)),
+    ('list_user', True, lambda ctx, i: ('GET', f'/task?user={ctx.heavy_user}', None, None)),
+    ('list_page', True, lambda ctx, i: ('GET', '/task?limit=100', None, None)),
+    ('list_window', True, lambda ctx, i: ('GET', f'/task?guild={ctx.hot_guild}&{ctx.window}', None, None)),
+    ('list_stream', True, lambda ctx, i: ('GET', f'/task?guild={ctx.hot_guild}&stream=true', None, None)),
+    ('list_archived', True, lambda ctx, i: ('GET', f'/task?guild={ctx.hot_guild}&include_archived=true&limit=100', None, None)),
+    ('dashboard', True, lambda ctx, i: ('GET', f'/task/dashboard?user={ctx.heavy_user}&limit=5', None, None)),
+    ('digest', True, lambda ctx, i: ('GET', f'/task/digest?guilds={ctx.digest_guilds}', None, None)),
+    ('search', True, lambda ctx, i: ('GET', f'/task/search?q=task%20{i}', None, None)),
+    ('search_guild', True, lambda ctx, i: ('GET', f'/task/search?q=task&guild={ctx.hot_guild}', None, None)),
+    ('export_guild', True, lambda ctx, i: ('GET', f'/task/export?guild={ctx.pick(ctx.guilds, i)}', None, None)),
+    ('detail', True, lambda ctx, i: ('GET', f'/task/{ctx.pick(ctx.task_ids, i)}', None, None)),
+    ('due_date_get', True, lambda ctx, i: ('GET', f'/due-date/{ctx.pick(ctx.due_task_ids, i)}', None, None)),
+    ('changes', True, lambda ctx, i: ('GET', f'/task/changes?since={ctx.since}', None, None)),
+    ('cache_stats', True, lambda ctx, i: ('GET', '/task/cache', None, None)),
+    ('create', False, lambda ctx, i: ('POST', '/task', {'title': f'bench {ctx.token} {i}', 'guild': ctx.pick(ctx.guilds, i)}, None)),
+    ('batch_50', False, lambda ctx, i: ('POST', '/task/batch', {'tasks': [task_spec(ctx, i, n) for n in range(50)]}, None)),
+    ('due_date_set', False, lambda ctx, i: (
+        'POST', f'/due-date/{ctx.pick(ctx.task_ids, i)}', {'due_date': '2023-10-25T14:30:00Z'}, None)),
+    ('due_date_batch_50', False, lambda ctx, i: (
+        'PUT', '/task/batch', {'tasks': [
+            {'id': task_id, 'due_date': '2023-10-25T14:30:00Z'} for task_id in ctx.task_ids[i % 20 * 50:][:50]]}, None)),
+    ('reminder_set', False, lambda ctx, i: (
+        'PUT', f'/reminder/{ctx.pick(ctx.task_ids, i)}', {'reminder': '2023-10-25T14:00:00Z'}, None)),
+    ('assign', False, lambda ctx, i: (
+        'PUT', f'/assignees/{ctx.pick(ctx.task_ids, i)}', {'assignees': [f'bench{i}#{ctx.token}']}, None)),
+    ('assign_bulk', False, lambda ctx, i: (
+        'PUT', '/assignees', {'tasks': ctx.task_ids[i % 50 * 20:][:20], 'assignees': [f'bulk{i}#{ctx.token}']}, None)),
+    ('occurrence', False, lambda ctx, i: (
+        'PUT', f'/task/{ctx.occurrence(i)[0]}/occurrence', ctx.occurrence(i)[1], None)),
+    ('complete', False, lambda ctx, i: ('PUT', f'/task/{ctx.pick(ctx.task_ids, i)}/complete', None, None)),
+    ('import_50', False, lambda ctx, i: (
+        'POST', '/task/import', ctx.export, {'Content-Type': 'application/x-ndjson'})),
+    ('delete', False, lambda ctx, i: ('DELETE', f'/task/{ctx.disposable.pop()}', None, None)),
+]
+
+
+def run_in_process(scenarios, ctx, requests, warmup):
+    '''send the requests through the test client, one at a time'''
+    from django.db import connection
+    from django.test import Client
+
+    client = Client(raise_request_exception=False)
+    # the query log is reset at the start of every request
+    connection.force_debug_cursor = True
+
+    results = []
+    for name, _, make_request in scenarios:
+        latencies = []
+        queries = []
+        errors = 0
+        started = time.perf_counter()
+        for i in range(warmup + requests):
+            method, path, body, headers = make_request(ctx, i)
+            headers = dict(headers or {})
+            content_type = headers.pop('Content-Type', 'application/json')
+            if not isinstance(body, bytes):
+                body = json.dumps(body) if body is not None else ''
+            extra = {f'HTTP_{key.upper().replace("-", "_")}': value for key, value in headers.items()}
+            start = time.perf_counter()
+            response = client.generic(method, path, body, content_type=content_type, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            latency = time.perf_counter() - start
+            if i == warmup:
+                started = start
+            if i < warmup:
+                continue
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(latency)
+            queries.append(len(connection.queries_log))
+        elapsed = time.perf_counter() - started
+        results.append(dict(
+            scenario=name, mode='in-process', queries=max(queries, default=0),
+            **summarize(latencies, elapsed, errors)))
+    return results
+
+
+def run_server(scenarios, ctx, requests, warmup, concurrency, command, port):
+    '''send the requests to a server started on the suite's database'''
+    base_url = f'http://127.0.0.1:{port}'
+    # new usernames, so assignments don't repeat those of the in-process run
+    ctx.token = uuid.uuid4().hex[:8]
+    process = launch(shlex.split(command.format(port=port)))
+    results = []
+    try:
+        wait_for_server(base_url + '/task/cache')
+        for name, _, make_request in scenarios:
+            paths = [make_request(ctx, i) for i in range(warmup + requests)]
+            http_load(base_url, paths[:warmup], warmup, concurrency)
+            result = http_load(base_url, paths[warmup:], requests, concurrency)
+            results.append(dict(scenario=name, mode='server', queries=None, **result))
+    finally:
+        stop(process)
+    return results
+
+
+def seed(args):
+    setup_django()
+    if args.reset:
+        from bot8.models import ArchivedTask, GuildDigest, GuildRevision, Task, TaskChange, TaskOccurrence, Users
+        # the assignee rows and reminder deliveries are deleted with their tasks
+        for model in (TaskOccurrence, Task, ArchivedTask, Users, TaskChange, GuildRevision, GuildDigest):
+            model.objects.all().delete()
+    tasks, assignees = seed_realistic(args.tasks, args.guilds, args.users, args.fanout, args.seed)
+    print(f'created {tasks} tasks with {assignees} assignees')
+
+
+def run(args):
+    setup_django()
+    scenarios = [
+        scenario for scenario in SCENARIOS
+        if (not args.only or any(pattern in scenario[0] for pattern in args.only))
+        and (scenario[1] or not args.read_only)]
+    deletes = sum(1 for name, _, _ in scenarios if name == 'delete')
+    runs = 2 if args.server else 1
+    ctx = Context(disposable=deletes * runs * (args.requests + args.warmup))
+
+    results = run_in_process(scenarios, ctx, args.requests, args.warmup)
+    if args.server:
+        results += run_server(scenarios, ctx, args.requests, args.warmup, args.concurrency, args.server_command, args.port)
+
+    print_table(results, ['scenario', 'mode', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries'])
+    if args.json:
+        import django
+        meta = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        }
+        write_json(args.json, {'meta': meta, 'results': results})
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = {(row['scenario'], row['mode']): row for row in json.load(f)['results']}
+    with open(args.current) as f:
+        current = json.load(f)['results']
+
+    def change(old, new):
+        return 100 * (new - old) / old if old else 0.0
+
+    rows = []
+    regressions = 0
+    for row in current:
+        old = baseline.get((row['scenario'], row['mode']))
+        if old is None:
+            continue
+        p95_change = change(old['p95_ms'], row['p95_ms'])
+        more_queries = (row['queries'] or 0) > (old['queries'] or 0)
+        regressed = p95_change > args.threshold or more_queries
+        regressions += regressed
+        rows.append({
+            'scenario': row['scenario'],
+            'mode': row['mode'],
+            'p50_%': change(old['p50_ms'], row['p50_ms']),
+            'p95_%': p95_change,
+            'rps_%': change(old['rps'], row['rps']),
+            'queries': f'{old["queries"]} -> {row["queries"]}',
+            'status': 'REGRESSED' if regressed else 'ok',
+        })
+    if rows:
+        print_table(rows, ['scenario', 'mode', 'p50_%', 'p95_%', 'rps_%', 'queries', 'status'])
+    print(f'{regressions} regression(s) over {args.threshold}% p95 or with more queries')
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    os.environ.setdefault('BENCH_DB', str(DEFAULT_DB))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='fill the database with realistic data')
+    seed_parser.add_argument('--tasks', type=int, default=50000)
+    seed_parser.add_argument('--guilds', type=int, default=500)
+    seed_parser.add_argument('--users', type=int, default=2000)
+    seed_parser.add_argument('--fanout', type=int, default=8, help='most users assigned to one task')
+    seed_parser.add_argument('--seed', type=int, default=0)
+    seed_parser.add_argument('--reset', action='store_true', help='delete the existing data first')
+
+    run_parser = commands.add_parser('run', help='run the scenarios')
+    run_parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=20)
+    run_parser.add_argument('--only', action='append', help='only scenarios with this in their name')
+    run_parser.add_argument('--read-only', action='store_true', help='skip the write scenarios')
+    run_parser.add_argument('--server', action='store_true', help='also run against a local server')
+    run_parser.add_argument('--server-command', default=f'{sys.executable} manage.py runserver --noreload {{port}}')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--port', type=int, default=8766)
+    run_parser.add_argument('--json', help='write the results to this file')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='allowed p95 increase in percent')
+
+    args = parser.parse_args(argv)
+    return {'seed': seed, 'run': run, 'compare': compare}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+'''
+Throughput and memory of the NDJSON export and import, see bot8/transfer.py
+
+Seeds a guild with the given number of tasks, exports it to a file and
+imports the file into another guild, reporting tasks per second and the
+peak memory allocated by python (tracemalloc, which slows both down).
+The peak should stay the same whatever the number of tasks
+
+    python -m benchmarks.transfer --tasks 100000 --gzip
+'''
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from .harness import setup_django, seed_realistic, print_table, write_json
+
+SOURCE_GUILD = 0
+TARGET_GUILD = 1000000
+
+
+def measure(function, memory):
+    '''the wall time and the peak traced memory in MB of the call'''
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = 0.0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--gzip', action='store_true', help='compress the export')
+    parser.add_argument('--no-memory', action='store_true', help="don't trace memory, for the real throughput")
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from bot8.models import Task
+    from bot8.transfer import export_chunks, gzip_chunks, import_lines, open_import
+    Task.objects.filter(guild=TARGET_GUILD).delete()
+    existing = Task.objects.filter(guild=SOURCE_GUILD).count()
+    if existing < args.tasks:
+        seed_realistic(args.tasks - existing, guilds=1, users=2000, fanout=args.fanout)
+    memory = not args.no_memory
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'export.ndjson' + ('.gz' if args.gzip else ''))
+
+        def export():
+            chunks = export_chunks(SOURCE_GUILD)
+            with open(path, 'wb') as f:
+                for chunk in gzip_chunks(chunks) if args.gzip else chunks:
+                    f.write(chunk)
+
+        def load():
+            with open(path, 'rb') as f:
+                return import_lines(open_import(f), TARGET_GUILD)
+
+        export_seconds, export_peak, _ = measure(export, memory)
+        size = os.path.getsize(path)
+        import_seconds, import_peak, imported = measure(load, memory)
+
+    tasks = imported['tasks']
+    results = [
+        {'phase': 'export', 'tasks': tasks, 'seconds': export_seconds, 'tasks_per_s': tasks / export_seconds,
+         'peak_mb': export_peak, 'bytes': size},
+        {'phase': 'import', 'tasks': tasks, 'seconds': import_seconds, 'tasks_per_s': tasks / import_seconds,
+         'peak_mb': import_peak, 'bytes': size},
+    ]
+    print_table(results, ['phase', 'tasks', 'seconds', 'tasks_per_s', 'peak_mb', 'bytes'])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
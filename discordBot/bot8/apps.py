@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_migrate
+from .db import apply_sqlite_pragmas
 
 class Bot8Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bot8'
+
+    def ready(self):
+        from . import assignments, digest, search
+        from .models import Task
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='bot8_sqlite_pragmas')
+        post_migrate.connect(search.install_after_migrate, sender=self, dispatch_uid='bot8_search_index')
+        post_migrate.connect(digest.install_after_migrate, sender=self, dispatch_uid='bot8_digest_summary')
+        m2m_changed.connect(assignments.assignees_added, sender=Task.assignees.through, dispatch_uid='bot8_assignees_added')
@@ -0,0 +1,132 @@
+'''
+Completed and archived tasks
+
+A task is completed when its completed_at is set, completed tasks are
+listed like the others until they are archived. The archiving job
+(manage.py archivetasks) moves the tasks completed before a cutoff, with
+their assignees, to the ArchivedTask table one chunk per transaction, so
+the task table that every listing scans and sorts only holds the open
+and the recently completed tasks. The occurrence overrides and reminder
+deliveries of archived tasks are dropped, and archived tasks are no
+longer found by search. Archiving is logged as an "archive" change, the
+change feed reports archived tasks as deleted.
+
+Archived tasks can't be changed. Listings include them with
+include_archived=true: the task and the archive tables are read in the
+same ordering and merged with heapq.merge, so a page or a stream reads one
+keyset range of each table
+'''
+import datetime
+import heapq
+from itertools import islice
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .cache import task_list_cache
+from .changes import log_changes
+from .models import ArchivedTask, Task, TaskChange
+from .revisions import bump
+from .rows import TASK_COLUMNS, task_rows
+
+ARCHIVE_AFTER = datetime.timedelta(days=30)
+ARCHIVE_CHUNK_SIZE = 500
+
+
+def include_archived(params):
+    return params.get('include_archived') in ('1', 'true')
+
+
+def archived_tasks(user=None, guild=None):
+    '''archived tasks in listing order, optionally only those of a user and/or guild'''
+    queryset = ArchivedTask.objects.order_by(F('due_date').asc(nulls_last=True), 'id')
+    if user is not None:
+        queryset = queryset.filter(assignees=user)
+    if guild is not None:
+        queryset = queryset.filter(guild=guild)
+    return queryset
+
+
+def listing_key(row):
+    '''the position of a row in the listing order, due date with nulls last then id'''
+    return (row.due_date is None, row.due_date, row.id)
+
+
+def merge_rows(*rows):
+    '''sorted iterables of rows merged in listing order'''
+    return heapq.merge(*rows, key=listing_key)
+
+
+async def _next(rows):
+    try:
+        return await rows.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def amerge_rows(first, second):
+    '''two sorted async iterators of rows merged in listing order'''
+    a = await _next(first)
+    b = await _next(second)
+    while a is not None and b is not None:
+        if listing_key(a) <= listing_key(b):
+            yield a
+            a = await _next(first)
+        else:
+            yield b
+            b = await _next(second)
+    rest, row = (first, a) if a is not None else (second, b)
+    while row is not None:
+        yield row
+        row = await _next(rest)
+
+
+def page_rows(paginator, request, queryset, archived):
+    '''the rows of the requested page of both querysets, see TaskCursorPagination.page_queryset'''
+    rows = merge_rows(
+        task_rows(paginator.page_queryset(queryset, request)),
+        task_rows(paginator.page_queryset(archived, request)))
+    return list(islice(rows, paginator.limit + 1))
+
+
+def _archive_chunk(before, chunk_size):
+    '''archive one chunk of the tasks completed before the cutoff, returns the number archived'''
+    with transaction.atomic():
+        # locked so a task can't be reopened while it is archived
+        rows = list(
+            Task.objects.select_for_update().filter(completed_at__lt=before)
+            .order_by('completed_at', 'id').values_list(*TASK_COLUMNS)[:chunk_size])
+        if not rows:
+            return 0
+        now = timezone.now()
+        archived = ArchivedTask.objects.bulk_create([
+            ArchivedTask(**dict(zip(TASK_COLUMNS, row)), archived_at=now) for row in rows])
+
+        task_ids = [task.id for task in archived]
+        through = ArchivedTask.assignees.through
+        through.objects.bulk_create([
+            through(archivedtask_id=task_id, users_id=username)
+            for task_id, username in Task.assignees.through.objects
+            .filter(task_id__in=task_ids).values_list('task_id', 'users_id')])
+        # the assignees, occurrences and reminder deliveries go with the tasks
+        Task.objects.filter(id__in=task_ids).delete()
+
+        guilds = {task.guild for task in archived}
+        bump(guilds)
+        log_changes(TaskChange.ARCHIVE, [(task.id, task.guild) for task in archived])
+        task_list_cache.invalidate(guilds)
+    return len(archived)
+
+
+def archive_completed(before=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    '''
+    move the tasks completed before the cutoff, ARCHIVE_AFTER ago by
+    default, to the archive one transaction of chunk_size tasks at a
+    time. Yields the number of tasks archived by every chunk
+    '''
+    if before is None:
+        before = timezone.now() - ARCHIVE_AFTER
+    while True:
+        archived = _archive_chunk(before, chunk_size)
+        if not archived:
+            return
+        yield archived
@@ -0,0 +1,147 @@
+'''
+Assignees of tasks
+
+The assignee rows (TaskAssignee) have copies of the due date and guild
+of their task, so the tasks of a user are listed from the assignee
+table's (user, due date, task) index in one range scan, without joining
+every task of the user to sort them, see list_tasks. The copies are
+written with the rows by add_assignees, and changed with the task's due
+date by update_tasks in the same transaction (the guild of a task
+doesn't change). Rows added with the related managers
+(task.assignees.add, set) get them from the m2m_changed signal.
+
+Writes that change a task's due date or guild without going through
+update_tasks (the admin, the shell, a queryset update) leave the copies
+stale, manage.py checkassignees finds and fixes them
+'''
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from .cache import task_list_cache
+from .changes import log_changes
+from .models import Task, TaskAssignee, TaskChange, Users
+from .revisions import bump
+
+
+class MissingTasks(Exception):
+    '''Raised when some of the tasks to assign users to do not exist'''
+
+    def __init__(self, task_ids):
+        self.task_ids = task_ids
+        super().__init__(f'Task(s) {task_ids} do not exist')
+
+
+def assigned_usernames(task_id, usernames):
+    '''usernames from the list that are already assigned to the task'''
+    return list(
+        TaskAssignee.objects.filter(task_id=task_id, users_id__in=usernames)
+        .order_by('id').values_list('users_id', flat=True))
+
+
+def assign_users(task_ids, usernames):
+    '''
+    Assign the users to every task in a single transaction.
+
+    Users that don't exist yet are created, and the assignee rows for
+    all tasks are inserted with one bulk insert. Users that are already
+    assigned to a task are left as they are.
+    Raises MissingTasks without assigning anyone if a task does not exist.
+    Returns the guilds of the tasks
+    '''
+    # keep the first occurrence of every id and username
+    task_ids = list(dict.fromkeys(task_ids))
+    usernames = list(dict.fromkeys(usernames))
+
+    with transaction.atomic():
+        tasks = {task_id: (due_date, guild) for task_id, due_date, guild in
+                 Task.objects.filter(id__in=task_ids).values_list('id', 'due_date', 'guild')}
+        missing = [task_id for task_id in task_ids if task_id not in tasks]
+        if missing:
+            raise MissingTasks(missing)
+
+        add_assignees([(task_id, username) for task_id in task_ids for username in usernames], tasks)
+        guilds = {task_id: guild for task_id, (_, guild) in tasks.items()}
+        bump(guilds.values(), task_ids)
+        log_changes(TaskChange.ASSIGN, [(task_id, guilds[task_id]) for task_id in task_ids])
+    return set(guilds.values())
+
+
+def add_assignees(pairs, tasks):
+    '''
+    Insert (task id, username) assignee pairs with one bulk insert,
+    creating the users that don't exist yet. tasks has the
+    (due date, guild) of every task id, copied to the rows.
+    Pairs that are already assigned are skipped.
+    Should be called inside a transaction
+    '''
+    usernames = dict.fromkeys(username for _, username in pairs)
+    Users.objects.bulk_create(
+        [Users(username=username) for username in usernames],
+        ignore_conflicts=True)
+
+    TaskAssignee.objects.bulk_create([
+        TaskAssignee(task_id=task_id, users_id=username, due_date=tasks[task_id][0], guild=tasks[task_id][1])
+        for task_id, username in pairs],
+        ignore_conflicts=True)
+
+
+def _chunks(task_ids):
+    # stay under the number of parameters a query can have
+    size = connection.features.max_query_params or len(task_ids) or 1
+    for start in range(0, len(task_ids), size):
+        yield task_ids[start:start + size]
+
+
+def copy_due_dates(due_dates):
+    '''copy the new due dates of {task id: due date} to the assignee rows, one UPDATE per due date'''
+    tasks = {}
+    for task_id, due_date in due_dates.items():
+        tasks.setdefault(due_date, []).append(task_id)
+    for due_date, task_ids in tasks.items():
+        for chunk in _chunks(task_ids):
+            TaskAssignee.objects.filter(task_id__in=chunk).update(due_date=due_date)
+
+
+def copy_task_columns(task_ids=None):
+    '''
+    copy the due date and guild of the tasks to their assignee rows with
+    one UPDATE per chunk of tasks, all the rows when task_ids is None.
+    Returns the number of rows written
+    '''
+    task = Task.objects.filter(id=OuterRef('task_id'))
+    values = {'due_date': Subquery(task.values('due_date')[:1]), 'guild': Subquery(task.values('guild')[:1])}
+    if task_ids is None:
+        return TaskAssignee.objects.update(**values)
+    return sum(
+        TaskAssignee.objects.filter(task_id__in=chunk).update(**values)
+        for chunk in _chunks(list(task_ids)))
+
+
+def stale_assignees():
+    '''the assignee rows whose due date or guild differ from their task's'''
+    same_due_date = Q(due_date=F('task__due_date')) | Q(due_date__isnull=True, task__due_date__isnull=True)
+    same_guild = Q(guild=F('task__guild')) | Q(guild__isnull=True, task__guild__isnull=True)
+    return TaskAssignee.objects.exclude(same_due_date & same_guild)
+
+
+def fix_stale_assignees():
+    '''
+    copy the task columns to the stale assignee rows in one transaction, the
+    listings of the guilds they were in and are now in get new revisions.
+    Returns the number of rows fixed
+    '''
+    with transaction.atomic():
+        stale = list(stale_assignees().values_list('task_id', 'guild', 'task__guild'))
+        if not stale:
+            return 0
+        copy_task_columns({task_id for task_id, _, _ in stale})
+        guilds = {guild for _, *guilds in stale for guild in guilds}
+        bump(guilds)
+    task_list_cache.invalidate(guilds)
+    return len(stale)
+
+
+def assignees_added(sender, instance, action, reverse, pk_set, **kwargs):
+    '''m2m_changed handler that copies the task columns to the rows added by the related managers'''
+    if action != 'post_add' or not pk_set:
+        return
+    copy_task_columns(pk_set if reverse else [instance.pk])
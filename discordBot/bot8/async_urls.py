@@ -0,0 +1,24 @@
+from django.urls import path
+from . import async_views
+from .views import TaskBatch, TaskDashboard, TaskDigest, TaskCacheStats, TaskChanges, TaskSearch, TaskExport, TaskImport, TaskOccurrences, TaskComplete, Metrics, assignUsersToTasks
+
+# same routes as bot8/urls.py, with the async views where there is one
+urlpatterns = [
+    path('task', async_views.TaskList.as_view()),
+    path('task/batch', TaskBatch.as_view()),
+    path('task/dashboard', TaskDashboard.as_view()),
+    path('task/digest', TaskDigest.as_view()),
+    path('task/cache', TaskCacheStats.as_view()),
+    path('task/changes', TaskChanges.as_view()),
+    path('task/search', TaskSearch.as_view()),
+    path('task/export', TaskExport.as_view()),
+    path('task/import', TaskImport.as_view()),
+    path('task/<int:pk>', async_views.TaskDetail.as_view()),
+    path('task/<int:pk>/occurrence', TaskOccurrences.as_view()),
+    path('task/<int:pk>/complete', TaskComplete.as_view()),
+    path('due-date/<int:pk>', async_views.DueDate.as_view()),
+    path('assignees', assignUsersToTasks.as_view()),
+    path('assignees/<int:pk>', async_views.assignUsersToTask.as_view()),
+    path('metrics', Metrics.as_view()),
+    path('reminder/<int:pk>', async_views.reminder.as_view()),
+]
@@ -0,0 +1,384 @@
+'''
+Async versions of the task views for the ASGI server
+
+DRF views are synchronous, so under ASGI every request to them is run
+in a worker thread. These are plain Django views with async handlers
+that use the async ORM instead. They take the same requests and return
+the same responses as the views of the same name in bot8/views.py, and
+are routed by bot8/async_urls.py
+'''
+import json
+from io import BytesIO
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Sum
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.http.multipartparser import MultiPartParser, MultiPartParserError
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ParseError, Throttled
+from .archive import amerge_rows, archived_tasks, include_archived, merge_rows
+from .assignments import add_assignees, assign_users, MissingTasks
+from .cache import task_list_cache
+from .changes import log_changes
+from .models import Task, TaskChange
+from .pagination import TaskCursorPagination
+from .recurrence import parse_window, window_items
+from .reminders import reminder_changed
+from .renderers import dumps
+from .revisions import bump, listing_revisions, listing_etag, task_etag, not_modified, set_etag
+from .rows import atask_rows, task_row_data
+from .serializers import TaskSerializer
+from .streaming import STREAM_CHUNK_SIZE
+from .throttling import GuildRateThrottle, listing_slot
+from .updates import update_tasks
+from .views import list_tasks, get_list
+
+
+class AsyncAPIView(View):
+    '''base view that parses request bodies and skips csrf checks like DRF'''
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    def parse(self, request):
+        '''
+        the request body as a dict or QueryDict, raises ParseError
+        with the message of DRF's parsers for a malformed body
+        '''
+        content_type = request.content_type
+        if content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError as e:
+                raise ParseError(f'JSON parse error - {e}')
+        if content_type == 'multipart/form-data':
+            parser = MultiPartParser(request.META, BytesIO(request.body), request.upload_handlers, request.encoding)
+            try:
+                data, _ = parser.parse()
+            except MultiPartParserError as e:
+                raise ParseError(f'Multipart form parse error - {e}')
+            return data
+        return QueryDict(request.body, encoding=request.encoding)
+
+    def dispatch(self, request, *args, **kwargs):
+        # the same throttle as the DRF views
+        throttle = GuildRateThrottle()
+        if not throttle.allow_request(request, self):
+            response = self.throttled(throttle.wait())
+
+            async def throttled():
+                return response
+            return throttled()
+        handler = super().dispatch(request, *args, **kwargs)
+
+        async def handle():
+            # a malformed body is a 400 like in the DRF views
+            try:
+                return await handler
+            except ParseError as e:
+                return self.respond({'detail': e.detail}, e.status_code)
+        return handle()
+
+    def throttled(self, wait):
+        '''the 429 response DRF sends for a Throttled exception'''
+        exception = Throttled(wait)
+        response = self.respond({'detail': exception.detail}, exception.status_code)
+        response['Retry-After'] = str(exception.wait)
+        return response
+
+    def not_found(self):
+        return self.respond({'detail': 'No Task matches the given query.'}, status.HTTP_404_NOT_FOUND)
+
+    def respond(self, data, status=status.HTTP_200_OK):
+        return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+# transactions are not supported by the async ORM, so the writes that
+# increment revisions and invalidate the cached listings run in a thread
+
+@sync_to_async
+def create_task(data, assignees):
+    with transaction.atomic():
+        task = Task.objects.create(**data)
+        add_assignees([(task.id, user.pk) for user in assignees], {task.id: (task.due_date, task.guild)})
+        bump([task.guild])
+        log_changes(TaskChange.CREATE, [(task.id, task.guild)])
+    task_list_cache.invalidate([task.guild])
+    if task.reminder is not None:
+        reminder_changed()
+    return task
+
+
+@sync_to_async
+def delete_task(task):
+    pk = task.pk
+    with transaction.atomic():
+        task.delete()
+        bump([task.guild])
+        log_changes(TaskChange.DELETE, [(pk, task.guild)])
+    task_list_cache.invalidate([task.guild])
+
+
+# a single UPDATE, see bot8/updates.py
+aupdate_tasks = sync_to_async(update_tasks)
+
+# the cache backends are synchronous, see bot8/cache.py
+acache_key = sync_to_async(task_list_cache.key)
+acache_get = sync_to_async(task_list_cache.get)
+acache_set = sync_to_async(task_list_cache.set)
+
+
+class TaskList(AsyncAPIView):
+    '''
+    Async version of views.TaskList
+
+    - GET "/task", "/task?user=<username>&guild=<guild>"
+    - GET "/task?limit=<n>&cursor=<cursor>"
+    - GET "/task?stream=true"
+    - GET "/task?from=<date-time>&to=<date-time>"
+    - GET "/task?include_archived=true"
+    - POST "/task"
+    '''
+
+    async def get(self, request):
+        revisions = listing_revisions(request.GET.get('guild'))
+        if revisions is None:
+            return await self.list(request)
+
+        revision = (await revisions.aaggregate(revision=Sum('revision')))['revision'] or 0
+        etag = listing_etag(request, revision)
+        response = not_modified(request, etag)
+        if response is None:
+            response = await self.list(request)
+        return set_etag(response, etag)
+
+    async def list(self, request):
+        if not task_list_cache.enabled or request.GET.get('stream') in ('1', 'true'):
+            return await self.list_rows(request)
+
+        # the rendered listing is cached like the DRF view's, so a hit skips reading the tasks
+        key = await acache_key(request.GET.get('guild'), request.build_absolute_uri())
+        if key is None:
+            return await self.list_rows(request)
+        content = await acache_get(key)
+        if content is None:
+            response = await self.list_rows(request)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = response.content
+            await acache_set(key, content)
+        return HttpResponse(content, content_type='application/json')
+
+    async def list_rows(self, request):
+        params = request.GET
+        queryset = list_tasks(params.get('user'), params.get('guild'))
+        archived = archived_tasks(params.get('user'), params.get('guild')) if include_archived(params) else None
+        try:
+            window = parse_window(params)
+        except ValueError as e:
+            return self.respond(str(e), status.HTTP_400_BAD_REQUEST)
+        try:
+            with listing_slot(request) as hold:
+                if window is not None:
+                    # the occurrences are merged in a thread, streamed or not
+                    return self.respond(await sync_to_async(self.window_items)(request, queryset, window, archived))
+
+                if params.get('stream') in ('1', 'true'):
+                    return StreamingHttpResponse(hold(self.stream(queryset, archived)), content_type='application/json')
+
+                paginator = TaskCursorPagination()
+                if not paginator.is_requested(request):
+                    rows = await atask_rows(queryset)
+                    if archived is not None:
+                        rows = merge_rows(rows, await atask_rows(archived))
+                    return self.respond([task_row_data(row) for row in rows])
+
+                try:
+                    queryset = paginator.page_queryset(queryset, request)
+                    if archived is not None:
+                        archived = paginator.page_queryset(archived, request)
+                except NotFound as e:
+                    return self.respond({'detail': e.detail}, status.HTTP_404_NOT_FOUND)
+                rows = await atask_rows(queryset)
+                if archived is not None:
+                    # the first rows of both pages
+                    rows = list(islice(merge_rows(rows, await atask_rows(archived)), paginator.limit + 1))
+                page = paginator.set_page(rows)
+        except Throttled as e:
+            return self.throttled(e.wait)
+        data = [task_row_data(row) for row in page]
+        return self.respond({'next': paginator.get_next_link(), 'results': data})
+
+    def window_items(self, request, queryset, window, archived=None):
+        items = window_items(queryset, *window, archived)
+        if 'limit' in request.GET:
+            items = islice(items, TaskCursorPagination().get_limit(request))
+        return list(items)
+
+    async def rows(self, queryset):
+        '''
+        the rows of the queryset read one keyset page at a time, every
+        page is a single query plus one for its assignees
+        '''
+        page = await atask_rows(queryset[:STREAM_CHUNK_SIZE])
+        while page:
+            for row in page:
+                yield row
+            if len(page) < STREAM_CHUNK_SIZE:
+                break
+            last = page[-1]
+            after = TaskCursorPagination.filter_after(queryset, last.due_date, last.pk)
+            page = await atask_rows(after[:STREAM_CHUNK_SIZE])
+
+    async def stream(self, queryset, archived=None):
+        '''stream the tasks, and the archived tasks merged in, STREAM_CHUNK_SIZE at a time'''
+        rows = self.rows(queryset)
+        if archived is not None:
+            rows = amerge_rows(rows, self.rows(archived))
+        yield b'['
+        first = True
+        chunk = []
+        async for row in rows:
+            chunk.append(dumps(task_row_data(row)))
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield (b'' if first else b',') + b','.join(chunk)
+                first = False
+                chunk = []
+        if chunk:
+            yield (b'' if first else b',') + b','.join(chunk)
+        yield b']'
+
+    async def post(self, request):
+        # the assignee ids are checked against the database, so validation
+        # runs in a thread like the rest of a sync view
+        serializer = TaskSerializer(data=self.parse(request))
+        if not await sync_to_async(serializer.is_valid)():
+            return self.respond(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        data = dict(serializer.validated_data)
+        assignees = data.pop('assignees', [])
+        task = await create_task(data, assignees)
+        task = await Task.objects.prefetch_related('assignees').aget(pk=task.pk)
+        return self.respond(TaskSerializer(task).data, status.HTTP_201_CREATED)
+
+
+class TaskDetail(AsyncAPIView):
+    '''
+    Async version of views.TaskDetail
+
+    - GET "/task/<id>
+    - DELETE "/task/<id>
+    '''
+
+    async def get(self, request, pk):
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            revision = await Task.objects.filter(pk=pk).values_list('revision', flat=True).afirst()
+            if revision is not None:
+                response = not_modified(request, task_etag(pk, revision))
+                if response is not None:
+                    return response
+
+        try:
+            task = await Task.objects.prefetch_related('assignees').aget(pk=pk)
+        except Task.DoesNotExist:
+            return self.not_found()
+        return set_etag(self.respond(TaskSerializer(task).data), task_etag(task.pk, task.revision))
+
+    async def delete(self, request, pk):
+        task = await Task.objects.filter(pk=pk).afirst()
+        if task is None:
+            return self.not_found()
+        await delete_task(task)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class DueDate(AsyncAPIView):
+    '''
+    Async version of views.DueDate
+
+    - POST "/due-date/<id>"
+    - GET "/due-date/<id>"
+    '''
+
+    async def post(self, request, pk):
+        dueDate = self.parse(request)["due_date"]
+
+        try:
+            updated = await aupdate_tasks([(pk, {'due_date': dueDate})])
+        except ValidationError:
+            updated = {}
+        if not updated:
+            # task at id not found or invalid due date
+            return self.respond("A problem occured when trying to add a due date", status.HTTP_400_BAD_REQUEST)
+        return self.respond("A Due Date has been assigned to the task!")
+
+    async def get(self, request, pk):
+        try:
+            # find task and return due date
+            task = await Task.objects.filter(id=pk).afirst()
+            etag = task_etag(task.pk, task.revision)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            return set_etag(self.respond(task.due_date.strftime('%Y-%m-%d %H:%M')), etag)
+        except AttributeError:
+            # task at id not found or it has no due date
+            return self.respond(None, status.HTTP_400_BAD_REQUEST)
+
+
+class assignUsersToTask(AsyncAPIView):
+    '''
+    Async version of views.assignUsersToTask
+
+    - PUT "assignees/<id>"
+    '''
+
+    async def put(self, request, pk):
+        try:
+            assignees = get_list(self.parse(request), 'assignees')
+        except (TypeError, ValueError):
+            return self.respond('Failed to add user(s)', status.HTTP_400_BAD_REQUEST)
+
+        through = Task.assignees.through
+        duplicate_users = [
+            username async for username in
+            through.objects.filter(task_id=pk, users_id__in=assignees)
+            .order_by('id').values_list('users_id', flat=True)]
+        if duplicate_users:
+            return self.respond(
+                f'User(s) {duplicate_users} are already assigned to this task',
+                status.HTTP_400_BAD_REQUEST)
+
+        # transactions are not supported by the async ORM,
+        # so the bulk insert runs in a thread
+        try:
+            guilds = await sync_to_async(assign_users)([pk], assignees)
+        except MissingTasks:
+            return self.respond('Failed to add user(s)', status.HTTP_400_BAD_REQUEST)
+        await sync_to_async(task_list_cache.invalidate)(guilds)
+        return self.respond("Added User(s)")
+
+
+class reminder(AsyncAPIView):
+    '''
+    Async version of views.reminder
+
+    - PUT "reminder/<id>
+    '''
+
+    async def put(self, request, pk):
+        try:
+            reminder_date = self.parse(request)['reminder']
+            if not await aupdate_tasks([(pk, {'reminder': reminder_date})]):
+                raise Task.DoesNotExist
+        except Exception:
+            # could not find task at id
+            return self.respond("Reminder was not set or Invalid format", status.HTTP_400_BAD_REQUEST)
+
+        return self.respond("Reminder has been set")
@@ -0,0 +1,108 @@
+'''
+Read-through cache for task listings
+
+Rendered listings are cached per guild under a version token. Every write
+to a task replaces the version token of its guild (and of the listing of
+all guilds) once the write is committed, so entries cached under the old
+token are never read again and are left to expire or be evicted by the
+cache backend. A token that was evicted is replaced by a new random one,
+which can never bring back old entries.
+
+The cache uses the "tasks" entry of the CACHES setting, local memory
+caches are per process so use a shared backend such as the file based
+cache when running more than one process. Enabled with the
+TASK_LIST_CACHE setting
+'''
+import hashlib
+import threading
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'tasks'
+
+# version token of the listings that are not filtered by guild
+ALL_GUILDS = 'all'
+
+
+class TaskListCache:
+
+    def __init__(self, alias=CACHE_ALIAS):
+        self.alias = alias
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'TASK_LIST_CACHE', False)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version_key(self, guild):
+        return f'tasks:version:{guild}'
+
+    def version(self, guild):
+        '''the current version token of a guild'''
+        key = self.version_key(guild)
+        version = self.cache.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not self.cache.add(key, version, timeout=None):
+                # another request created the token first
+                version = self.cache.get(key, version)
+        return version
+
+    def key(self, guild, url):
+        '''
+        the cache key of a listing, get it before reading the tasks so
+        that a listing read during a write is stored under the old version.
+        The guild is normalised like the stored ints ("01" is guild 1), None
+        if it isn't a valid guild so the listing isn't cached
+        '''
+        if guild is None:
+            guild = ALL_GUILDS
+        else:
+            try:
+                guild = str(int(guild))
+            except ValueError:
+                return None
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        return f'tasks:list:{guild}:{self.version(guild)}:{digest}'
+
+    def get(self, key):
+        content = self.cache.get(key)
+        with self.lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return content
+
+    def set(self, key, content):
+        self.cache.set(key, content)
+
+    def invalidate(self, guilds):
+        '''replace the version tokens of the guilds once the current transaction commits'''
+        names = {ALL_GUILDS} | {str(guild) for guild in guilds if guild is not None}
+
+        def bump():
+            self.cache.set_many({self.version_key(name): uuid.uuid4().hex for name in names}, timeout=None)
+
+        if self.enabled:
+            transaction.on_commit(bump)
+
+    def stats(self):
+        with self.lock:
+            return {'enabled': self.enabled, 'hits': self.hits, 'misses': self.misses}
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+
+task_list_cache = TaskListCache()
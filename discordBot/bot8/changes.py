@@ -0,0 +1,63 @@
+'''
+Change log of the tasks
+
+Every write to a task appends a TaskChange row in the same transaction as
+the write. The change feed reads the log after a sequence number and
+collapses it to the tasks that were created or changed and the tasks that
+were deleted, so a client that keeps a copy of the tasks only downloads
+what changed since it last synced.
+
+Sequence numbers must be visible in order for a feed to never skip one,
+on PostgreSQL the writes to the log are serialized with a transaction
+level advisory lock. sqlite already serializes all writes
+'''
+from django.db import connection
+from .models import TaskChange
+
+# key of the advisory lock held while writing to the log on PostgreSQL
+CHANGE_LOG_LOCK = 0x626f7438
+
+
+def log_changes(op, tasks):
+    '''
+    append a change to the log for every (task id, guild) pair,
+    should be called inside the transaction of the write
+    '''
+    changes = [TaskChange(task_id=task_id, guild=guild, op=op) for task_id, guild in tasks]
+    if not changes:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOG_LOCK])
+    TaskChange.objects.bulk_create(changes)
+
+
+def latest_seq():
+    '''the sequence number of the last change, 0 if there are none'''
+    return TaskChange.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+
+
+def changes_since(since, guild=None, limit=1000):
+    '''
+    the changes after the sequence number, at most limit log entries.
+    Returns the sequence number to continue from, whether there are more
+    changes, and the ids of the changed and of the deleted tasks
+    '''
+    queryset = TaskChange.objects.filter(seq__gt=since).order_by('seq')
+    if guild is not None:
+        queryset = queryset.filter(guild=guild)
+    entries = list(queryset.values_list('seq', 'task_id', 'op')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    # only the last change of a task matters
+    last_ops = {}
+    for _, task_id, op in entries:
+        last_ops.pop(task_id, None)
+        last_ops[task_id] = op
+    # archived tasks are no longer listed, so they are reported as deleted
+    removed = (TaskChange.DELETE, TaskChange.ARCHIVE)
+    changed = [task_id for task_id, op in last_ops.items() if op not in removed]
+    deleted = [task_id for task_id, op in last_ops.items() if op in removed]
+    next_seq = entries[-1][0] if entries else since
+    return next_seq, more, changed, deleted
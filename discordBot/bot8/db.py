@@ -0,0 +1,20 @@
+'''
+Database connection setup
+
+The SQLITE_PRAGMAS setting is a dict of pragmas that are set on every new
+sqlite connection, ex {'journal_mode': 'WAL', 'busy_timeout': 20000}.
+See discordbot/production_settings.py
+'''
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    '''connection_created handler that sets the SQLITE_PRAGMAS on a new connection'''
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
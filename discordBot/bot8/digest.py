@@ -0,0 +1,234 @@
+'''
+Upcoming deadline digest
+
+The digest of a guild has the number of its open tasks that are overdue,
+due today, due in the 6 days after today ("week") and due later, with
+the first tasks of every bucket in listing order. Buckets are whole days
+in TIME_ZONE, overdue tasks were due before today. Tasks without a due
+date, completed tasks and recurring tasks are left out. The due date of
+a recurring task is the start of its rule rather than a deadline, its
+occurrences are listed by the listings of a time window, see
+bot8/recurrence.py
+
+The database puts the tasks in buckets with a CASE on the due date and
+numbers the tasks of every bucket with a window function, so the digest
+of many guilds is two queries per chunk of guilds.
+
+With the TASK_DIGEST_SUMMARY setting on, the counts are read from the
+GuildDigest table instead, one row per guild. A row has the bounds of the
+buckets of a day and the counts for them, and triggers on the task table
+add and remove every written task to the counts of its guild's row,
+comparing its due date to the row's bounds, so bulk writes are counted
+too. The first digest of a guild on a new day counts its tasks again
+for the new bounds. migrate installs the triggers again when the setting
+is on and drops them when it is off, emptying the summary either way so
+rows counted by older triggers aren't kept. The rows are rebuilt as they
+are read
+'''
+import datetime
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+from django.db.models import Case, CharField, Count, F, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .models import GuildDigest, Task
+from .recurrence import recurring
+from .rows import task_rows, task_row_data
+
+BUCKETS = ('overdue', 'today', 'week', 'later')
+SUMMARY_TABLE = 'bot8_guilddigest'
+
+# a task counted in the summary, like open_tasks
+OPEN = ("{row}.guild IS NOT NULL AND {row}.due_date IS NOT NULL AND {row}.completed_at IS NULL"
+        " AND COALESCE({row}.recurrence, '') = ''")
+
+# adds ("+") or removes ("-") a task from the counts of its guild
+COUNT = f'''UPDATE {SUMMARY_TABLE} SET
+        overdue = overdue {{sign}} CAST({{row}}.due_date < day_start AS INTEGER),
+        today = today {{sign}} CAST({{row}}.due_date >= day_start AND {{row}}.due_date < day_end AS INTEGER),
+        week = week {{sign}} CAST({{row}}.due_date >= day_end AND {{row}}.due_date < week_end AS INTEGER),
+        later = later {{sign}} CAST({{row}}.due_date >= week_end AS INTEGER)
+    WHERE guild = {{row}}.guild AND {OPEN}'''
+
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {SUMMARY_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {SUMMARY_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {SUMMARY_TABLE}_update',
+]
+
+# replaces the triggers of an older definition
+SQLITE_INSTALL = SQLITE_UNINSTALL + [
+    f'''CREATE TRIGGER {SUMMARY_TABLE}_insert AFTER INSERT ON bot8_task BEGIN
+        {COUNT.format(sign='+', row='new')};
+    END''',
+    f'''CREATE TRIGGER {SUMMARY_TABLE}_delete AFTER DELETE ON bot8_task BEGIN
+        {COUNT.format(sign='-', row='old')};
+    END''',
+    f'''CREATE TRIGGER {SUMMARY_TABLE}_update AFTER UPDATE OF due_date, guild, completed_at, recurrence ON bot8_task BEGIN
+        {COUNT.format(sign='-', row='old')};
+        {COUNT.format(sign='+', row='new')};
+    END''',
+]
+
+POSTGRES_INSTALL = [
+    f'''CREATE OR REPLACE FUNCTION {SUMMARY_TABLE}_count() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            {COUNT.format(sign='-', row='OLD')};
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            {COUNT.format(sign='+', row='NEW')};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql''',
+    f'DROP TRIGGER IF EXISTS {SUMMARY_TABLE}_count ON bot8_task',
+    f'''CREATE TRIGGER {SUMMARY_TABLE}_count AFTER INSERT OR DELETE OR UPDATE OF due_date, guild, completed_at, recurrence
+        ON bot8_task FOR EACH ROW EXECUTE FUNCTION {SUMMARY_TABLE}_count()''',
+]
+
+POSTGRES_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {SUMMARY_TABLE}_count ON bot8_task',
+    f'DROP FUNCTION IF EXISTS {SUMMARY_TABLE}_count()',
+]
+
+
+def summary_enabled():
+    return getattr(settings, 'TASK_DIGEST_SUMMARY', False)
+
+
+def install(connection):
+    '''
+    install the summary triggers, replacing the installed ones, and
+    drop the rows they may have counted differently
+    '''
+    statements = {'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRES_INSTALL}.get(connection.vendor)
+    if statements is None:
+        return
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f'DELETE FROM {SUMMARY_TABLE}')
+
+
+def uninstall(connection):
+    '''drop the summary triggers and empty the summary'''
+    statements = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f'DELETE FROM {SUMMARY_TABLE}')
+
+
+def install_after_migrate(sender, using, **kwargs):
+    '''post_migrate handler that installs or drops the triggers to match the setting'''
+    from django.db import connections
+    connection = connections[using]
+    if SUMMARY_TABLE not in connection.introspection.table_names():
+        return
+    if summary_enabled():
+        install(connection)
+    else:
+        uninstall(connection)
+
+
+def day_bounds(now=None):
+    '''the starts of today, of tomorrow and of the day after the week, in TIME_ZONE'''
+    tz = timezone.get_default_timezone()
+    today = timezone.localtime(now or timezone.now(), tz).date()
+    return [
+        timezone.make_aware(datetime.datetime.combine(today + datetime.timedelta(days=days), datetime.time()), tz)
+        for days in (0, 1, 7)]
+
+
+def bucket_case(bounds):
+    '''the bucket of the due date as a CASE expression'''
+    return Case(
+        *[When(due_date__lt=bound, then=Value(bucket)) for bucket, bound in zip(BUCKETS, bounds)],
+        default=Value(BUCKETS[-1]), output_field=CharField())
+
+
+def bucket_of(due_date, bounds):
+    for bucket, bound in zip(BUCKETS, bounds):
+        if due_date < bound:
+            return bucket
+    return BUCKETS[-1]
+
+
+def _chunks(guilds, connection=default_connection):
+    '''the guilds in chunks under the number of parameters a query can have'''
+    # a few parameters are left for the bounds and the limit
+    size = connection.features.max_query_params
+    size = size - 10 if size else len(guilds) or 1
+    for start in range(0, len(guilds), size):
+        yield guilds[start:start + size]
+
+
+def open_tasks(guilds):
+    return Task.objects.filter(~recurring(), guild__in=guilds, due_date__isnull=False, completed_at__isnull=True)
+
+
+def task_counts(guilds, bounds):
+    '''{guild: {bucket: count}} counted from the tasks'''
+    counts = {}
+    for chunk in _chunks(guilds):
+        rows = (open_tasks(chunk).annotate(bucket=bucket_case(bounds))
+                .values_list('guild', 'bucket').annotate(count=Count('id')).order_by())
+        for guild, bucket, count in rows:
+            counts.setdefault(guild, {})[bucket] = count
+    return counts
+
+
+def refresh_summary(guilds, bounds):
+    '''count the tasks of the guilds for the bounds and store them in the summary, returns the counts'''
+    bound_values = dict(zip(('day_start', 'day_end', 'week_end'), bounds))
+    with transaction.atomic():
+        if default_connection.vendor == 'postgresql':
+            # tasks written while counting wait, the ones written before are counted
+            with default_connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {SUMMARY_TABLE} IN SHARE ROW EXCLUSIVE MODE')
+        # on sqlite the first write holds off the other writers until the counts are stored
+        for chunk in _chunks(guilds):
+            GuildDigest.objects.filter(guild__in=chunk).delete()
+        counts = task_counts(guilds, bounds)
+        GuildDigest.objects.bulk_create([
+            GuildDigest(guild=guild, **bound_values, **{bucket: counts.get(guild, {}).get(bucket, 0) for bucket in BUCKETS})
+            for guild in guilds], batch_size=1000)
+    return counts
+
+
+def summary_counts(guilds, bounds):
+    '''{guild: {bucket: count}} read from the summary, rows of another day are refreshed'''
+    counts = {}
+    for chunk in _chunks(guilds):
+        rows = GuildDigest.objects.filter(guild__in=chunk, day_start=bounds[0]).values_list('guild', *BUCKETS)
+        for guild, *values in rows:
+            counts[guild] = dict(zip(BUCKETS, values))
+    stale = [guild for guild in guilds if guild not in counts]
+    if stale:
+        counts.update(refresh_summary(stale, bounds))
+    return counts
+
+
+def first_tasks(guilds, bounds, limit):
+    '''{guild: {bucket: [TaskRow]}} of the first open tasks of every bucket, in listing order'''
+    tasks = {}
+    for chunk in _chunks(guilds):
+        queryset = open_tasks(chunk).annotate(rank=Window(
+            RowNumber(), partition_by=[F('guild'), bucket_case(bounds)],
+            order_by=[F('due_date').asc(), F('id').asc()])).filter(rank__lte=limit)
+        for row in task_rows(queryset.order_by('guild', 'due_date', 'id')):
+            tasks.setdefault(row.guild, {}).setdefault(bucket_of(row.due_date, bounds), []).append(row)
+    return tasks
+
+
+def digest(guilds, limit, now=None):
+    '''the digest of every guild, in the order of the guilds'''
+    bounds = day_bounds(now)
+    counts = (summary_counts if summary_enabled() else task_counts)(guilds, bounds)
+    tasks = first_tasks(guilds, bounds, limit) if limit else {}
+    return [{
+        'guild': guild,
+        'counts': {bucket: counts.get(guild, {}).get(bucket, 0) for bucket in BUCKETS},
+        'tasks': {bucket: [task_row_data(row) for row in tasks.get(guild, {}).get(bucket, [])] for bucket in BUCKETS},
+    } for guild in guilds]
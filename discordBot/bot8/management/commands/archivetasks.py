@@ -0,0 +1,26 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from bot8.archive import archive_completed, ARCHIVE_AFTER, ARCHIVE_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Move the tasks completed a while ago to the archive table, see bot8/archive.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=ARCHIVE_AFTER.days,
+                            help='archive the tasks completed more than this many days ago')
+        parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE,
+                            help='tasks archived by one transaction')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--days can not be negative and --chunk-size must be positive')
+        before = timezone.now() - timedelta(days=options['days'])
+
+        total = 0
+        for archived in archive_completed(before, options['chunk_size']):
+            total += archived
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Archived {total} tasks')
+        self.stdout.write(f'Archived {total} tasks completed before {before.isoformat()}')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from bot8.assignments import fix_stale_assignees, stale_assignees
+
+
+class Command(BaseCommand):
+    help = ('Check that the due dates and guilds copied to the assignee rows match their tasks, '
+            'see bot8/assignments.py')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='copy the task columns to the stale rows')
+
+    def handle(self, *args, **options):
+        if options['fix']:
+            self.stdout.write(f'Fixed {fix_stale_assignees()} stale assignee rows')
+            return
+
+        stale = stale_assignees().order_by('task_id', 'users_id')
+        if options['verbosity'] > 1:
+            for row in stale.values('task_id', 'users_id', 'due_date', 'guild', 'task__due_date', 'task__guild'):
+                self.stdout.write(
+                    f"Task {row['task_id']} of {row['users_id']}: "
+                    f"due date {row['due_date']} / {row['task__due_date']}, guild {row['guild']} / {row['task__guild']}")
+        count = stale.count()
+        if count:
+            raise CommandError(f'{count} assignee rows are stale, run checkassignees --fix to fix them')
+        self.stdout.write('The assignee rows match their tasks')
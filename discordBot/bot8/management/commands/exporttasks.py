@@ -0,0 +1,31 @@
+import sys
+from django.core.management.base import BaseCommand
+from bot8.transfer import export_chunks, gzip_chunks, EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Write the tasks of a guild, or of every guild, as NDJSON, see bot8/transfer.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guild', type=int, help='only export the tasks of this guild')
+        parser.add_argument('--output', '-o', default='-',
+                            help='file to write to, "-" for stdout. Files ending in .gz are compressed')
+        parser.add_argument('--gzip', action='store_true', help='compress the export with gzip')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='tasks read from the database at a time')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        chunks = export_chunks(options['guild'], options['chunk_size'])
+        if compress:
+            chunks = gzip_chunks(chunks)
+
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            with open(output, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
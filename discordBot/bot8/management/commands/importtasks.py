@@ -0,0 +1,31 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from bot8.transfer import import_lines, open_import, InvalidImport, KEEP_GUILD, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Create the tasks and users of an NDJSON export, see bot8/transfer.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='export file, gzip compressed or not, "-" for stdin')
+        parser.add_argument('--guild', type=int, help='move the imported tasks to this guild')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='records written by one transaction')
+        parser.add_argument('--gzip', action='store_true',
+                            help='the input is gzip compressed, files are detected without it but stdin is not')
+
+    def handle(self, *args, **options):
+        guild = options['guild'] if options['guild'] is not None else KEEP_GUILD
+        path = options['input']
+        f = open(path, 'rb') if path != '-' else sys.stdin.buffer
+        try:
+            # stdin can't be sniffed
+            compressed = True if options['gzip'] else (False if path == '-' else None)
+            lines = open_import(f, compressed)
+            imported = import_lines(lines, guild, options['batch_size'])
+        except InvalidImport as e:
+            raise CommandError(f'{e}, imported {e.imported["tasks"]} tasks before it')
+        finally:
+            if f is not sys.stdin.buffer:
+                f.close()
+        self.stdout.write(f'Imported {imported["tasks"]} tasks and {imported["users"]} users')
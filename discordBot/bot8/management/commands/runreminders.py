@@ -0,0 +1,34 @@
+import signal
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from bot8.reminders import ReminderScheduler, get_sink
+
+
+class Command(BaseCommand):
+    help = 'Deliver task reminders to the configured REMINDER_SINK as they become due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookahead', type=int, default=3600,
+                            help='seconds ahead of now that reminders are loaded')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='most reminders loaded by one query')
+        parser.add_argument('--refresh-interval', type=int, default=60,
+                            help='seconds between reloads of upcoming reminders')
+        parser.add_argument('--catchup', type=int, default=86400,
+                            help='seconds a missed reminder is still delivered for')
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(
+            get_sink(),
+            lookahead=timedelta(seconds=options['lookahead']),
+            batch_size=options['batch_size'],
+            refresh_interval=options['refresh_interval'],
+            catchup=timedelta(seconds=options['catchup']))
+
+        # stop cleanly after the current delivery
+        signal.signal(signal.SIGTERM, lambda *args: scheduler.stop())
+        self.stdout.write('Delivering reminders, press CTRL-C to stop')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,54 @@
+import argparse
+import os
+import socket
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from bot8.prefork import Generation, Supervisor
+
+
+class Command(BaseCommand):
+    help = 'Serve the project with pre-forked workers, SIGHUP reloads without downtime, see bot8/prefork.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='worker processes, one per core by default')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='requests a worker serves at once')
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='seconds without a heartbeat after which a worker is killed and replaced')
+        parser.add_argument('--graceful-timeout', type=float, default=30,
+                            help='seconds a stopping worker has to finish its requests')
+        parser.add_argument('--health-port', type=int,
+                            help='serve GET /health with the status of every worker on this port')
+        # run a generation, passed by the supervisor
+        parser.add_argument('--generation', type=int, help=argparse.SUPPRESS)
+        parser.add_argument('--fd', type=int, help=argparse.SUPPRESS)
+        parser.add_argument('--status-dir', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError('serve needs os.fork, use runserver or another server on this platform')
+        if options['workers'] < 1 or options['threads'] < 1:
+            raise CommandError('--workers and --threads must be positive')
+        if options['generation'] is not None:
+            Generation(
+                socket.socket(fileno=options['fd']), options['generation'], options['workers'], options['threads'],
+                options['status_dir'], options['timeout'], options['graceful_timeout']).run()
+            return
+
+        # generations run in new processes so a reload loads the code again
+        manage = os.path.join(getattr(settings, 'BASE_DIR', ''), 'manage.py')
+        command = [sys.executable, manage if os.path.exists(manage) else sys.argv[0], 'serve']
+        supervisor = Supervisor(
+            command, options['host'], options['port'], options['workers'], options['threads'],
+            options['timeout'], options['graceful_timeout'], options['health_port'])
+        address, health_address = supervisor.bind()
+        self.stdout.write(f'Serving on http://{address[0]}:{address[1]} with {options["workers"]} workers')
+        if health_address:
+            self.stdout.write(f'Worker health on http://{health_address[0]}:{health_address[1]}/health')
+        self.stdout.write('SIGHUP reloads, CTRL-C stops')
+        self.stdout.flush()
+        supervisor.run()
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot8', '0002_task_guild'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['guild', 'due_date', 'id'], name='task_guild_due_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['reminder'], name='task_reminder_idx'),
+        ),
+        # the assignees through table is auto created so its index is
+        # managed here instead of on a model, (users_id, task_id) covers
+        # listing the tasks of a user without reading the table itself
+        migrations.RunSQL(
+            sql='CREATE INDEX task_assignees_user_task_idx ON bot8_task_assignees (users_id, task_id)',
+            reverse_sql='DROP INDEX task_assignees_user_task_idx',
+        ),
+    ]
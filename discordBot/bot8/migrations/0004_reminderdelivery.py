@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot8', '0003_task_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDelivery',
+            fields=[
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reminder_delivery', serialize=False, to='bot8.task')),
+                ('reminder', models.DateTimeField()),
+                ('delivered_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot8', '0004_reminderdelivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuildRevision',
+            fields=[
+                ('guild', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('revision', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='revision',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
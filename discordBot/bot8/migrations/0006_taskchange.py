@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot8', '0005_task_revisions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('task_id', models.BigIntegerField()),
+                ('guild', models.IntegerField(null=True)),
+                ('op', models.CharField(choices=[('create', 'create'), ('update', 'update'), ('assign', 'assign'), ('delete', 'delete')], max_length=6)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['guild', 'seq'], name='taskchange_guild_seq_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot8', '0006_taskchange'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='users',
+            options={'ordering': ['username']},
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from bot8.search import install
+    install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from bot8.search import uninstall
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    '''the full text index of task titles, see bot8/search.py'''
+
+    dependencies = [
+        ('bot8', '0007_users_ordering'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
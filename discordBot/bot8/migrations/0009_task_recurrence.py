@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot8', '0008_task_title_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='recurrence',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.CreateModel(
+            name='TaskOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence', models.DateTimeField()),
+                ('due_date', models.DateTimeField(null=True)),
+                ('completed', models.BooleanField(default=False)),
+                ('cancelled', models.BooleanField(default=False)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='bot8.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['task', 'due_date'], name='taskoccurrence_due_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('task', 'occurrence'), name='taskoccurrence_task_occurrence_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot8', '0009_task_recurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=60)),
+                ('due_date', models.DateTimeField(null=True)),
+                ('reminder', models.DateTimeField(null=True)),
+                ('guild', models.IntegerField(null=True)),
+                ('recurrence', models.CharField(blank=True, max_length=200, null=True)),
+                ('completed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='taskchange',
+            name='op',
+            field=models.CharField(choices=[('create', 'create'), ('update', 'update'), ('assign', 'assign'), ('delete', 'delete'), ('archive', 'archive')], max_length=7),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['completed_at'], name='task_completed_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='assignees',
+            field=models.ManyToManyField(blank=True, related_name='archived_task', to='bot8.users'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['guild', 'due_date', 'id'], name='archivedtask_guild_due_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+def uninstall(apps, schema_editor):
+    from bot8.digest import uninstall
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    '''the digest summary, its triggers are installed after migrate, see bot8/digest.py'''
+
+    dependencies = [
+        ('bot8', '0010_task_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuildDigest',
+            fields=[
+                ('guild', models.IntegerField(primary_key=True, serialize=False)),
+                ('day_start', models.DateTimeField()),
+                ('day_end', models.DateTimeField()),
+                ('week_end', models.DateTimeField()),
+                ('overdue', models.IntegerField(default=0)),
+                ('today', models.IntegerField(default=0)),
+                ('week', models.IntegerField(default=0)),
+                ('later', models.IntegerField(default=0)),
+            ],
+        ),
+        # the triggers are dropped before the table
+        migrations.RunPython(migrations.RunPython.noop, uninstall),
+    ]
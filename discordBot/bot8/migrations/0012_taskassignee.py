@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_task_columns(apps, schema_editor):
+    '''fill the due dates and guilds of the existing assignee rows'''
+    Task = apps.get_model('bot8', 'Task')
+    TaskAssignee = apps.get_model('bot8', 'TaskAssignee')
+    task = Task.objects.filter(id=OuterRef('task_id'))
+    TaskAssignee.objects.update(
+        due_date=Subquery(task.values('due_date')[:1]),
+        guild=Subquery(task.values('guild')[:1]))
+
+
+class Migration(migrations.Migration):
+    '''
+    Task.assignees gets an explicit through model on the table django
+    created for it, so only the model state changes. The due date and
+    guild columns are then added to the table and filled from the tasks
+    '''
+
+    dependencies = [
+        ('bot8', '0011_guilddigest'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='TaskAssignee',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='bot8.task')),
+                        ('users', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='bot8.users')),
+                    ],
+                    options={
+                        'db_table': 'bot8_task_assignees',
+                        'unique_together': {('task', 'users')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='task',
+                    name='assignees',
+                    field=models.ManyToManyField(blank=True, related_name='task', through='bot8.TaskAssignee', to='bot8.users'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='taskassignee',
+            name='due_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='taskassignee',
+            name='guild',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(copy_task_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='taskassignee',
+            index=models.Index(fields=['users', 'due_date', 'task'], name='taskassignee_user_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskassignee',
+            index=models.Index(fields=['users', 'guild', 'due_date', 'task'], name='taskassignee_user_guild_idx'),
+        ),
+        # covered by taskassignee_user_due_idx, see 0003_task_indexes
+        migrations.RunSQL(
+            sql='DROP INDEX task_assignees_user_task_idx',
+            reverse_sql='CREATE INDEX task_assignees_user_task_idx ON bot8_task_assignees (users_id, task_id)',
+        ),
+    ]
@@ -9,6 +9,10 @@ class Users(models.Model):
     username = models.CharField(primary_key=True, max_length=60)
     servername = models.CharField(null=True, max_length=100)
 
+    class Meta:
+        # assignees are listed in username order
+        ordering = ['username']
+
     def __str__(self):
         return self.username
     
@@ -20,13 +24,180 @@ class Task(models.Model):
     '''
     title = models.CharField(max_length=60)
     due_date = models.DateTimeField(null=True)
-    assignees = models.ManyToManyField(Users, blank=True, related_name='task')
+    assignees = models.ManyToManyField(Users, blank=True, related_name='task', through='TaskAssignee')
     reminder = models.DateTimeField(null=True)
     guild = models.IntegerField(null=True)
+    # incremented by every write to the task, see bot8/revisions.py
+    revision = models.PositiveIntegerField(default=1, editable=False)
+    # repeats the task from its due date, see bot8/recurrence.py
+    recurrence = models.CharField(null=True, blank=True, max_length=200)
+    # set when the task is completed, see bot8/archive.py
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # guild listings ordered by due date, see TaskList
+            models.Index(fields=['guild', 'due_date', 'id'], name='task_guild_due_date_idx'),
+            # range scans for upcoming reminders
+            models.Index(fields=['reminder'], name='task_reminder_idx'),
+            # completed tasks to archive
+            models.Index(fields=['completed_at'], name='task_completed_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class TaskAssignee(models.Model):
+    '''
+    A user assigned to a task, with copies of the task's due
+    date and guild so the tasks of a user can be listed from
+    this table's index alone. See bot8/assignments.py
+    '''
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='assignments')
+    users = models.ForeignKey(Users, on_delete=models.CASCADE, related_name='assignments')
+    due_date = models.DateTimeField(null=True)
+    guild = models.IntegerField(null=True)
+
+    class Meta:
+        # the table of the through model django created for Task.assignees
+        db_table = 'bot8_task_assignees'
+        unique_together = [('task', 'users')]
+        indexes = [
+            # listings of a user ordered by due date, see list_tasks
+            models.Index(fields=['users', 'due_date', 'task'], name='taskassignee_user_due_idx'),
+            models.Index(fields=['users', 'guild', 'due_date', 'task'], name='taskassignee_user_guild_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.users_id} @ {self.task_id}'
+
+
+class ArchivedTask(models.Model):
+    '''
+    A completed task moved out of the task table by the
+    archiving job, it keeps the id it had as a task.
+    See bot8/archive.py
+    '''
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=60)
+    due_date = models.DateTimeField(null=True)
+    assignees = models.ManyToManyField(Users, blank=True, related_name='archived_task')
+    reminder = models.DateTimeField(null=True)
+    guild = models.IntegerField(null=True)
+    recurrence = models.CharField(null=True, blank=True, max_length=200)
+    completed_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # guild listings with the archived tasks, see TaskList
+            models.Index(fields=['guild', 'due_date', 'id'], name='archivedtask_guild_due_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class TaskOccurrence(models.Model):
+    '''
+    An occurrence of a recurring task that was moved, completed
+    or cancelled. Occurrences that are left as the rule gives
+    them are never stored, see bot8/recurrence.py
+    '''
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='occurrences')
+    # the time the recurrence rule gives the occurrence
+    occurrence = models.DateTimeField()
+    # the time the occurrence was moved to, null if it wasn't moved
+    due_date = models.DateTimeField(null=True)
+    completed = models.BooleanField(default=False)
+    cancelled = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'occurrence'], name='taskoccurrence_task_occurrence_uniq'),
+        ]
+        indexes = [
+            # occurrences moved into a listing window
+            models.Index(fields=['task', 'due_date'], name='taskoccurrence_due_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task_id} @ {self.occurrence}'
+
+
+class GuildDigest(models.Model):
+    '''
+    Number of open tasks of a guild in every digest bucket of
+    the day starting at day_start, kept up to date by triggers
+    on the task table when the TASK_DIGEST_SUMMARY setting is
+    on. See bot8/digest.py
+    '''
+    guild = models.IntegerField(primary_key=True)
+    # the bounds of the buckets
+    day_start = models.DateTimeField()
+    day_end = models.DateTimeField()
+    week_end = models.DateTimeField()
+    overdue = models.IntegerField(default=0)
+    today = models.IntegerField(default=0)
+    week = models.IntegerField(default=0)
+    later = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.guild} @ {self.day_start}'
+
+
+class ReminderDelivery(models.Model):
+    '''
+    The last reminder of a task that was delivered.
+    A task's reminder is pending until a delivery
+    with the same reminder time is recorded
+    '''
+    task = models.OneToOneField(Task, primary_key=True, on_delete=models.CASCADE, related_name='reminder_delivery')
+    reminder = models.DateTimeField()
+    delivered_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.task_id} @ {self.reminder}'
 
 
+class GuildRevision(models.Model):
+    '''
+    Change counter of the task listings of a guild,
+    incremented by every write to one of its tasks.
+    Tasks without a guild are counted under "none"
+    '''
+    guild = models.CharField(primary_key=True, max_length=20)
+    revision = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.guild} @ {self.revision}'
+
+
+class TaskChange(models.Model):
+    '''
+    An entry of the append-only log of writes to tasks,
+    written in the same transaction as the write.
+    Read by the change feed, see bot8/changes.py
+    '''
+    CREATE = 'create'
+    UPDATE = 'update'
+    ASSIGN = 'assign'
+    DELETE = 'delete'
+    ARCHIVE = 'archive'
+    OPS = [(CREATE, 'create'), (UPDATE, 'update'), (ASSIGN, 'assign'), (DELETE, 'delete'), (ARCHIVE, 'archive')]
+
+    seq = models.BigAutoField(primary_key=True)
+    # not a foreign key since deleted tasks stay in the log
+    task_id = models.BigIntegerField()
+    guild = models.IntegerField(null=True)
+    op = models.CharField(max_length=7, choices=OPS)
+
+    class Meta:
+        indexes = [
+            # change feeds of a guild, see TaskChanges
+            models.Index(fields=['guild', 'seq'], name='taskchange_guild_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.seq} {self.op} {self.task_id}'
@@ -0,0 +1,126 @@
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TaskCursorPagination(BasePagination):
+    '''
+    Keyset (cursor) pagination for task listings
+
+    The queryset must already be ordered by due date (nulls last) and then
+    by id, which is the ordering used by TaskList. Each page is fetched with
+    a range condition on that ordering so that deep pages cost the same as
+    the first one. The condition is on the fields the queryset is ordered
+    by, so listings of a user range over the copies on the assignee rows.
+
+    Pagination is opt in, the full list is returned unless the request
+    provides a "limit" or "cursor" query parameter
+
+    - GET "/task?limit=<n>"
+        first page of <n> tasks
+    - GET "/task?limit=<n>&cursor=<cursor>"
+        the page after <cursor>, the cursor is taken from the "next" link
+        of the previous page
+    '''
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    default_limit = 100
+    max_limit = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def is_requested(self, request):
+        params = request.GET
+        return self.limit_query_param in params or self.cursor_query_param in params
+
+    def page_queryset(self, queryset, request):
+        '''the rows of the requested page, plus one to find out if there is a next page'''
+        self.request = request
+        self.limit = self.get_limit(request)
+
+        encoded = request.GET.get(self.cursor_query_param)
+        if encoded:
+            due_date, pk = self.decode_cursor(encoded)
+            queryset = self.filter_after(queryset, due_date, pk)
+        return queryset[:self.limit + 1]
+
+    def set_page(self, results):
+        '''keep the rows fetched from page_queryset, returns the rows of the page'''
+        self.has_next = len(results) > self.limit
+        self.page = results[:self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.GET[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        cursor = self.encode_cursor(last.due_date, last.pk)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def ordering_fields(queryset):
+        '''the names of the due date and id fields the queryset is ordered by'''
+        due_date, pk = queryset.query.order_by
+        return due_date.expression.name, pk
+
+    @classmethod
+    def filter_after(cls, queryset, due_date, pk):
+        '''only keep rows that come after (due_date, pk) in the task ordering'''
+        due_date_field, pk_field = cls.ordering_fields(queryset)
+        if due_date is None:
+            # already in the trailing block of tasks without a due date
+            return queryset.filter(**{f'{due_date_field}__isnull': True, f'{pk_field}__gt': pk})
+        return queryset.filter(
+            Q(**{f'{due_date_field}__gt': due_date})
+            | Q(**{due_date_field: due_date, f'{pk_field}__gt': pk})
+            | Q(**{f'{due_date_field}__isnull': True}))
+
+    def encode_cursor(self, due_date, pk):
+        position = [due_date.isoformat() if due_date is not None else None, pk]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, encoded):
+        try:
+            due_date, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            pk = int(pk)
+            if due_date is not None:
+                due_date = parse_datetime(due_date)
+                if due_date is None:
+                    raise ValueError(encoded)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return due_date, pk
+
@@ -0,0 +1,462 @@
+'''
+Pre-forking server, run it with "manage.py serve"
+
+The supervisor binds the listening socket and starts a generation of
+workers: a new python process that loads the project, warms it up (the
+WSGI application and its middleware, the URL resolver with the views it
+imports, DRF's renderers and parsers, a database connection that is
+closed again so it isn't shared) and then forks the workers. The workers
+share the warmed up memory copy-on-write, gc.freeze keeps the garbage
+collector from writing to it. They all accept connections on the
+listening socket, each with a few threads that keep their database
+connections between requests (see CONN_MAX_AGE). Like runserver's
+server without threading, every connection serves one request, so
+threads aren't held by idle keep-alive connections.
+
+SIGHUP reloads without downtime: the supervisor starts a new generation
+on the same socket, which loads the code and settings again, and once
+all its workers are serving stops the old one. A stopping worker stops
+accepting, finishes the requests it is serving and closes its
+connections, the connections waiting on the socket are accepted by the
+new workers, so no request is dropped. SIGTERM and SIGINT stop the
+server the same way. A generation replaces the workers that exit or stop
+sending heartbeats. Generations and workers whose parent is gone (the
+supervisor was killed) stop by themselves.
+
+Every worker writes its status to a file in the status directory every
+HEARTBEAT seconds, the supervisor serves them with --health-port:
+
+    GET /health
+        200 when every worker of the current generation is serving and
+        sent a heartbeat in the last timeout seconds, 503 otherwise
+        ex {"generation" : 2, "healthy" : true, "workers" : [{"pid" : 812,
+            "generation" : 2, "state" : "serving", "requests" : 1520,
+            "connections" : 3, "heartbeat_age" : 0.4, "healthy" : true, ...}]}
+
+Needs os.fork, so it only runs on unix
+'''
+import gc
+import json
+import logging
+import os
+import resource
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer, get_internal_wsgi_application
+
+logger = logging.getLogger(__name__)
+
+# seconds between the status writes of a worker
+HEARTBEAT = 1
+# seconds a client has to send its request
+REQUEST_TIMEOUT = 10
+# seconds a blocked accept waits before checking if the worker is stopping
+ACCEPT_TIMEOUT = 0.5
+# seconds a new generation has to start serving before a reload is given up
+READY_TIMEOUT = 60
+
+
+def warm_up():
+    '''load what the first requests of a worker would load, returns the WSGI application'''
+    from django.db import connections
+    from django.urls import get_resolver
+    from rest_framework.settings import api_settings
+
+    application = get_internal_wsgi_application()
+    # imports the views and compiles the url patterns
+    get_resolver().reverse_dict
+    # DRF imports its classes the first time they are used
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES',
+                 'DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES'):
+        getattr(api_settings, name)
+    # loads the database driver and checks the settings, the
+    # connections are closed so every worker opens its own
+    for connection in connections.all():
+        connection.ensure_connection()
+    connections.close_all()
+
+    # objects that are never freed are moved out of the collector's
+    # reach, so collections in the workers don't copy their pages
+    gc.collect()
+    gc.freeze()
+    return application
+
+
+def status_path(status_dir, pid):
+    return os.path.join(status_dir, f'{pid}.json')
+
+
+def read_statuses(status_dir):
+    '''the statuses written by the workers'''
+    statuses = []
+    for name in os.listdir(status_dir):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(status_dir, name)) as file:
+                statuses.append(json.load(file))
+        except (OSError, ValueError):
+            # removed or replaced while it was read
+            continue
+    return statuses
+
+
+class RequestHandler(WSGIRequestHandler):
+    '''runserver's request handler, counting the requests'''
+    timeout = REQUEST_TIMEOUT
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.raw_requestline:
+            self.server.worker.count('requests')
+
+
+class Worker:
+    '''A forked process serving the application on the listening socket with a few threads'''
+
+    def __init__(self, listener, application, generation, status_dir, threads):
+        self.listener = listener
+        self.generation = generation
+        self.status_dir = status_dir
+        self.threads = threads
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'connections': 0}
+
+        host, port = listener.getsockname()[:2]
+        self.server = WSGIServer((host, port), RequestHandler, bind_and_activate=False)
+        self.server.socket.close()
+        self.server.socket = listener
+        self.server.server_name = socket.getfqdn(host)
+        self.server.server_port = port
+        self.server.setup_environ()
+        self.server.set_app(application)
+        self.server.worker = self
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counts[name] += value
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # reloads are handled by the supervisor
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        self.started = time.time()
+        self.parent = os.getppid()
+        # the socket is shared by all workers, so it is polled and a worker
+        # that loses the race for a connection goes back to waiting
+        self.listener.settimeout(ACCEPT_TIMEOUT)
+
+        threads = [threading.Thread(target=self.accept, daemon=True) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        while not self.stopping.is_set():
+            self.write_status('serving')
+            time.sleep(HEARTBEAT)
+            if os.getppid() != self.parent:
+                self.stop()
+        self.write_status('stopping')
+        for thread in threads:
+            thread.join()
+
+    def accept(self):
+        while not self.stopping.is_set():
+            try:
+                connection, address = self.listener.accept()
+            except (socket.timeout, BlockingIOError, InterruptedError):
+                continue
+            self.count('connections')
+            try:
+                RequestHandler(connection, address, self.server)
+            except OSError:
+                # the client went away or timed out
+                pass
+            except Exception:
+                self.server.handle_error(connection, address)
+            finally:
+                self.count('connections', -1)
+                self.server.shutdown_request(connection)
+
+    def write_status(self, state):
+        with self.lock:
+            status = dict(self.counts)
+        status.update({
+            'pid': os.getpid(),
+            'generation': self.generation,
+            'state': state,
+            'started': self.started,
+            'heartbeat': time.time(),
+            # kilobytes on linux, bytes on macos
+            'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+        path = status_path(self.status_dir, os.getpid())
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(status, file)
+        os.replace(f'{path}.tmp', path)
+
+
+class Generation:
+    '''
+    The process that warms up the project, forks the workers and replaces
+    the ones that exit or hang until it is stopped
+    '''
+
+    def __init__(self, listener, number, workers, threads, status_dir, timeout, graceful_timeout):
+        self.listener = listener
+        self.number = number
+        self.worker_count = workers
+        self.threads = threads
+        self.status_dir = status_dir
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.workers = {}
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        parent = os.getppid()
+        self.application = warm_up()
+        while not self.stopping:
+            self.reap()
+            while len(self.workers) < self.worker_count and not self.stopping:
+                self.spawn()
+            self.kill_hung()
+            time.sleep(HEARTBEAT)
+            if os.getppid() != parent:
+                self.stop()
+        self.stop_workers()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                Worker(self.listener, self.application, self.number, self.status_dir, self.threads).run()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.time()
+
+    def reap(self):
+        '''forget the workers that exited'''
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            if self.workers.pop(pid, None) is not None and not self.stopping:
+                logger.warning('Worker %s of generation %s exited with status %s', pid, self.number, status)
+            try:
+                os.remove(status_path(self.status_dir, pid))
+            except FileNotFoundError:
+                pass
+
+    def kill_hung(self):
+        '''kill the workers without a heartbeat in the last timeout seconds, they are replaced once reaped'''
+        now = time.time()
+        heartbeats = {status['pid']: status['heartbeat'] for status in read_statuses(self.status_dir)}
+        for pid, started in self.workers.items():
+            if now - heartbeats.get(pid, started) > self.timeout:
+                logger.warning('Killing worker %s of generation %s, it has no heartbeat', pid, self.number)
+                os.kill(pid, signal.SIGKILL)
+
+    def stop_workers(self):
+        '''stop the workers, killing the ones still serving after the graceful timeout'''
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers:
+            os.kill(pid, signal.SIGKILL)
+        while self.workers:
+            self.reap()
+            time.sleep(0.1)
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/health':
+            self.send_error(404)
+            return
+        health = self.server.supervisor.health()
+        body = json.dumps(health).encode()
+        self.send_response(200 if health['healthy'] else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Supervisor:
+    '''
+    Runs a generation process at a time on the listening socket, starting a
+    new one on SIGHUP and stopping the old one once the new one serves.
+    command is the management command that runs a generation
+    '''
+
+    def __init__(self, command, host, port, workers, threads=4, timeout=30, graceful_timeout=30,
+                 health_port=None, backlog=2048):
+        self.command = command
+        self.address = (host, port)
+        self.worker_count = workers
+        self.threads = threads
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.health_port = health_port
+        self.backlog = backlog
+        self.number = 0
+        # generations that were sent SIGTERM, with the time they are killed at
+        self.retiring = []
+        self.stopping = False
+        self.reloading = False
+
+    def bind(self):
+        '''bind the listening socket and the health server, returns their addresses'''
+        self.listener = socket.create_server(self.address, backlog=self.backlog)
+        self.listener.set_inheritable(True)
+        self.status_dir = tempfile.mkdtemp(prefix='bot8-serve-')
+        self.health_server = None
+        if self.health_port is not None:
+            self.health_server = ThreadingHTTPServer((self.address[0], self.health_port), HealthHandler)
+            self.health_server.daemon_threads = True
+            self.health_server.supervisor = self
+            threading.Thread(target=self.health_server.serve_forever, daemon=True).start()
+        return self.listener.getsockname(), self.health_server and self.health_server.server_address
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def reload(self, *args):
+        self.reloading = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        try:
+            self.current = None
+            self.replace()
+            while not self.stopping:
+                if self.reloading:
+                    self.reloading = False
+                    logger.info('Reloading')
+                    self.replace()
+                elif self.current.poll() is not None:
+                    logger.warning('Generation %s exited with status %s', self.current.number, self.current.returncode)
+                    self.current = None
+                    self.replace()
+                self.retire()
+                time.sleep(0.2)
+        finally:
+            if self.current is not None:
+                self.terminate(self.current)
+            while self.retiring:
+                self.retire()
+                time.sleep(0.1)
+            self.close()
+
+    def start_generation(self):
+        self.number += 1
+        fd = self.listener.fileno()
+        process = subprocess.Popen(self.command + [
+            '--generation', str(self.number), '--fd', str(fd), '--status-dir', self.status_dir,
+            '--workers', str(self.worker_count), '--threads', str(self.threads),
+            '--timeout', str(self.timeout), '--graceful-timeout', str(self.graceful_timeout),
+        ], pass_fds=[fd])
+        process.number = self.number
+        return process
+
+    def replace(self):
+        '''
+        start a new generation and stop the current one once all the new
+        workers serve, the current one is kept if the new one fails to start
+        '''
+        while not self.stopping:
+            process = self.start_generation()
+            if self.wait_serving(process):
+                if self.current is not None:
+                    self.terminate(self.current)
+                self.current = process
+                return
+            logger.error('Generation %s did not start serving', process.number)
+            self.terminate(process)
+            if self.current is not None:
+                return
+            # nothing else serves, keep trying
+            time.sleep(1)
+
+    def wait_serving(self, process):
+        '''wait until all the workers of the generation serve, False if it exits or takes too long'''
+        deadline = time.monotonic() + READY_TIMEOUT
+        while self.serving(process.number) < self.worker_count:
+            if process.poll() is not None or time.monotonic() > deadline or self.stopping:
+                return False
+            self.retire()
+            time.sleep(0.1)
+        return True
+
+    def terminate(self, process):
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+        # the generation kills its workers after graceful_timeout, it is killed a bit later
+        self.retiring.append((process, time.monotonic() + self.graceful_timeout + 5))
+
+    def retire(self):
+        '''forget the stopped generations, killing the ones that are late'''
+        retiring = []
+        for process, deadline in self.retiring:
+            if process.poll() is not None:
+                continue
+            if time.monotonic() > deadline:
+                process.kill()
+            retiring.append((process, deadline))
+        self.retiring = retiring
+
+    def serving(self, number):
+        '''the number of serving workers of the generation'''
+        return len([
+            status for status in read_statuses(self.status_dir)
+            if status['generation'] == number and status['state'] == 'serving'])
+
+    def health(self):
+        now = time.time()
+        current = self.current.number if self.current is not None else None
+        statuses = sorted(read_statuses(self.status_dir), key=lambda status: (status['generation'], status['pid']))
+        for status in statuses:
+            status['heartbeat_age'] = round(now - status['heartbeat'], 3)
+            status['healthy'] = status['state'] == 'serving' and status['heartbeat_age'] < self.timeout
+        healthy = [status for status in statuses if status['generation'] == current and status['healthy']]
+        return {'generation': current, 'healthy': len(healthy) >= self.worker_count, 'workers': statuses}
+
+    def close(self):
+        if self.health_server is not None:
+            self.health_server.shutdown()
+            self.health_server.server_close()
+        self.listener.close()
+        shutil.rmtree(self.status_dir, ignore_errors=True)
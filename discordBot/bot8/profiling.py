@@ -0,0 +1,262 @@
+'''
+Request profiling
+
+ProfilingMiddleware records for every route: the number of requests,
+their wall time, the number and time of database queries, the time spent
+serializing and the size of the responses. The totals are served in the
+Prometheus text format by GET "/metrics". Serialization time is the time
+spent in the view that isn't spent on queries plus the time rendering the
+response, which for the task views is the serializer and JSON renderer.
+Query time is the time executing queries, sqlite reads rows while they
+are fetched so part of its work counts as serialization. Streamed
+responses are measured until streaming starts.
+
+A request can also be profiled with cProfile, when it is picked at the
+sampling rate or has the profiling header set to the profiling token
+(without a token the header is ignored, so clients can't fill the disk
+with profiles). The profile is dumped in the profiling directory, read it
+with "python -m pstats <file>". Under ASGI the profile has everything the
+event loop ran during the request, the queries of the async ORM run in
+the request's thread and are counted there.
+
+Configured with the PROFILING setting. When it is disabled the middleware
+removes itself when the server starts, so it costs nothing. The middleware
+is sync and async, so it doesn't move async views to a thread. Metrics are
+kept per process
+'''
+import cProfile
+import hmac
+import random
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# upper bounds of the request duration histogram in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def profiling_settings():
+    return getattr(settings, 'PROFILING', {})
+
+
+class RouteMetrics:
+    '''totals per (method, route, status) of the profiled requests'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+
+    def record(self, method, route, status, sample):
+        with self.lock:
+            totals = self.routes.get((method, route, status))
+            if totals is None:
+                totals = self.routes[(method, route, status)] = {
+                    'requests': 0, 'seconds': 0.0, 'queries': 0, 'db_seconds': 0.0,
+                    'serialize_seconds': 0.0, 'response_bytes': 0,
+                    'buckets': [0] * len(DURATION_BUCKETS)}
+            totals['requests'] += 1
+            totals['seconds'] += sample.seconds
+            totals['queries'] += sample.queries
+            totals['db_seconds'] += sample.db_seconds
+            totals['serialize_seconds'] += sample.serialize_seconds
+            totals['response_bytes'] += sample.response_bytes
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if sample.seconds <= bound:
+                    totals['buckets'][i] += 1
+
+    def prometheus(self):
+        '''the totals in the Prometheus text exposition format'''
+        with self.lock:
+            routes = sorted((key, dict(totals, buckets=list(totals['buckets']))) for key, totals in self.routes.items())
+
+        counters = [
+            ('bot8_requests_total', 'requests', 'Requests handled'),
+            ('bot8_db_queries_total', 'queries', 'Database queries run by requests'),
+            ('bot8_db_seconds_total', 'db_seconds', 'Seconds spent on database queries'),
+            ('bot8_serialize_seconds_total', 'serialize_seconds', 'Seconds spent serializing and rendering'),
+            ('bot8_response_bytes_total', 'response_bytes', 'Bytes of response bodies'),
+        ]
+        lines = []
+        for name, field, description in counters:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for key, totals in routes:
+                lines.append(f'{name}{{{labels(*key)}}} {totals[field]}')
+
+        name = 'bot8_request_duration_seconds'
+        lines.append(f'# HELP {name} Wall time of requests')
+        lines.append(f'# TYPE {name} histogram')
+        for key, totals in routes:
+            for bound, count in zip(DURATION_BUCKETS, totals['buckets']):
+                lines.append(f'{name}_bucket{{{labels(*key)},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels(*key)},le="+Inf"}} {totals["requests"]}')
+            lines.append(f'{name}_sum{{{labels(*key)}}} {totals["seconds"]}')
+            lines.append(f'{name}_count{{{labels(*key)}}} {totals["requests"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def labels(method, route, status):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{route}",status="{status}"'
+
+
+route_metrics = RouteMetrics()
+
+
+class Sample:
+    '''measurements of a single request'''
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.view_started = None
+        self.view_ended = None
+        self.render_ended = None
+        self.serialize_seconds = 0.0
+        self.response_bytes = 0
+
+    def query(self, execute, sql, params, many, context):
+        '''database execute wrapper that counts and times queries'''
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+
+def time_rendering(sample, response):
+    '''DRF responses are rendered after the view returns'''
+    sample.view_ended = time.perf_counter()
+
+    def rendered(response):
+        sample.render_ended = time.perf_counter()
+    response.add_post_render_callback(rendered)
+    return response
+
+
+class ProfilingMiddleware:
+    '''
+    Records per route metrics and dumps cProfile profiles,
+    see the module docstring
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = profiling_settings()
+        if not options.get('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = options.get('SAMPLE_RATE', 0.0)
+        self.header = options.get('HEADER', 'HTTP_X_PROFILE')
+        self.token = options.get('TOKEN', '')
+        self.directory = Path(options.get('DIR', settings.BASE_DIR / 'profiles'))
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # django runs sync hooks of an async middleware in a thread
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sample, profiler = self.begin(request)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.count_queries(stack, sample)
+            profiler = self.enable(profiler)
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        return self.end(request, response, sample, profiler, start)
+
+    async def __acall__(self, request):
+        sample, profiler = self.begin(request)
+        start = time.perf_counter()
+        stack = ExitStack()
+        # the same thread as the queries of the request's async ORM calls
+        await sync_to_async(self.count_queries)(stack, sample)
+        try:
+            profiler = self.enable(profiler)
+            try:
+                response = await self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        finally:
+            await sync_to_async(stack.close)()
+        return self.end(request, response, sample, profiler, start)
+
+    def begin(self, request):
+        '''the sample of the request and its profiler, None unless it is profiled'''
+        sample = Sample()
+        request._profiling_sample = sample
+        return sample, cProfile.Profile() if self.should_profile(request) else None
+
+    def count_queries(self, stack, sample):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(sample.query))
+
+    def enable(self, profiler):
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # another profiler is already running in this thread
+                return None
+        return profiler
+
+    def end(self, request, response, sample, profiler, start):
+        '''record the request started at start and dump its profile'''
+        sample.seconds = time.perf_counter() - start
+        if sample.view_started is not None:
+            view_ended = sample.view_ended or start + sample.seconds
+            render_ended = sample.render_ended or view_ended
+            # time waiting on queries is not serialization
+            sample.serialize_seconds = max(0.0, render_ended - sample.view_started - sample.db_seconds)
+        if not response.streaming:
+            sample.response_bytes = len(response.content)
+
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        route_metrics.record(request.method, route, response.status_code, sample)
+        if profiler is not None:
+            self.dump(profiler, request, route)
+        return response
+
+    def should_profile(self, request):
+        value = request.META.get(self.header)
+        if self.token and value and hmac.compare_digest(value.encode(), self.token.encode()):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profiling_sample.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        return time_rendering(request._profiling_sample, response)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        request._profiling_sample.view_started = time.perf_counter()
+
+    async def aprocess_template_response(self, request, response):
+        return time_rendering(request._profiling_sample, response)
+
+    def dump(self, profiler, request, route):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{route or "root"}-{random.randrange(1 << 16):04x}.prof'
+        profiler.dump_stats(self.directory / name.replace('/', '_').replace('<', '').replace('>', '').replace(':', '_'))
@@ -0,0 +1,290 @@
+'''
+Recurring tasks
+
+A task with a recurrence rule repeats from its due date. Rules are a
+subset of the iCalendar RRULE (RFC 5545)
+
+    FREQ=DAILY|WEEKLY|MONTHLY|YEARLY   required
+    INTERVAL=<n>                       every <n> periods, 1 by default
+    BYDAY=MO,WE,...                    the days of the week, weekly rules only
+    COUNT=<n> or UNTIL=<date>          when the rule ends, never by default
+
+ex "FREQ=WEEKLY;BYDAY=MO,TH;COUNT=20"
+
+Occurrences are never stored. They are expanded when a listing asks for
+a time window, in the wall time of TIME_ZONE so they keep their hour
+across daylight saving changes. A monthly occurrence on a day that a
+month doesn't have is skipped, like in RFC 5545. An occurrence that is
+moved, completed or cancelled is stored as a TaskOccurrence override,
+keyed by the time the rule gives it. Completing a recurring task ends it,
+its occurrences after it was completed aren't listed.
+
+Listings of a window merge the occurrences of every recurring task into
+the due date ordering of the other tasks with heapq.merge, so only the
+occurrences that are listed are built
+'''
+import calendar
+import datetime
+import heapq
+from itertools import takewhile
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from .models import TaskOccurrence
+from .rows import iter_task_rows, task_rows, task_row_data
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+# rules with a count are expanded from their first occurrence
+MAX_COUNT = 10000
+# longest window a listing can expand
+MAX_WINDOW = datetime.timedelta(days=400)
+WINDOW_CHUNK_SIZE = 500
+
+_datetime = serializers.DateTimeField()
+
+
+class InvalidRule(ValueError):
+    '''Raised when a recurrence rule can't be parsed'''
+
+
+def _positive(name, value):
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise InvalidRule(f'{name} must be a positive integer')
+    return number
+
+
+def _until(value):
+    '''an UNTIL date or date-time, a date ends at the end of its day'''
+    formats = (('%Y%m%dT%H%M%SZ', datetime.timezone.utc), ('%Y%m%dT%H%M%S', None), ('%Y%m%d', None))
+    for format, tz in formats:
+        try:
+            until = datetime.datetime.strptime(value, format)
+        except ValueError:
+            continue
+        if format == '%Y%m%d':
+            until += datetime.timedelta(days=1, microseconds=-1)
+        return until.replace(tzinfo=tz) if tz else timezone.make_aware(until)
+    raise InvalidRule('UNTIL must be a date or a date-time')
+
+
+class Rule:
+    '''a parsed recurrence rule'''
+
+    def __init__(self, freq, interval=1, byday=(), count=None, until=None):
+        self.freq = freq
+        self.interval = interval
+        self.byday = tuple(byday)
+        self.count = count
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        text = text.strip()
+        if text.upper().startswith('RRULE:'):
+            text = text[len('RRULE:'):]
+        parts = {}
+        for part in filter(None, text.split(';')):
+            key, sep, value = part.partition('=')
+            key = key.strip().upper()
+            if not sep or key in parts:
+                raise InvalidRule(f'Invalid rule part "{part}"')
+            parts[key] = value.strip().upper()
+
+        unknown = set(parts) - {'FREQ', 'INTERVAL', 'BYDAY', 'COUNT', 'UNTIL'}
+        if unknown:
+            raise InvalidRule(f'Unsupported rule parts {sorted(unknown)}')
+        freq = parts.get('FREQ')
+        if freq not in FREQUENCIES:
+            raise InvalidRule(f'FREQ must be one of {", ".join(FREQUENCIES)}')
+        if 'COUNT' in parts and 'UNTIL' in parts:
+            raise InvalidRule('A rule can have a COUNT or an UNTIL, not both')
+
+        byday = ()
+        if 'BYDAY' in parts:
+            if freq != 'WEEKLY':
+                raise InvalidRule('BYDAY is only supported by weekly rules')
+            days = parts['BYDAY'].split(',')
+            if not all(day in WEEKDAYS for day in days):
+                raise InvalidRule(f'BYDAY days must be in {",".join(WEEKDAYS)}')
+            byday = sorted({WEEKDAYS.index(day) for day in days})
+
+        count = _positive('COUNT', parts['COUNT']) if 'COUNT' in parts else None
+        if count is not None and count > MAX_COUNT:
+            raise InvalidRule(f'COUNT can be at most {MAX_COUNT}')
+        return cls(
+            freq, _positive('INTERVAL', parts.get('INTERVAL', '1')), byday, count,
+            _until(parts['UNTIL']) if 'UNTIL' in parts else None)
+
+    def __str__(self):
+        parts = [f'FREQ={self.freq}']
+        if self.interval != 1:
+            parts.append(f'INTERVAL={self.interval}')
+        if self.byday:
+            parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in self.byday))
+        if self.count is not None:
+            parts.append(f'COUNT={self.count}')
+        if self.until is not None:
+            parts.append('UNTIL=' + self.until.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+        return ';'.join(parts)
+
+    def _first_period(self, start, after):
+        '''a period at or before the one of "after", in local wall times'''
+        if after is None or after <= start:
+            return 0
+        if self.freq == 'DAILY':
+            return (after - start).days // self.interval
+        if self.freq == 'WEEKLY':
+            return (after.date() - start.date()).days // (7 * self.interval)
+        months = (after.year - start.year) * 12 + after.month - start.month
+        return max(0, months // (self.interval * (12 if self.freq == 'YEARLY' else 1)) - 1)
+
+    def _period(self, start, k):
+        '''the local wall times of the k-th period, in order'''
+        if self.freq == 'DAILY':
+            return [start + datetime.timedelta(days=k * self.interval)]
+        if self.freq == 'WEEKLY':
+            week = start - datetime.timedelta(days=start.weekday()) + datetime.timedelta(weeks=k * self.interval)
+            return [week + datetime.timedelta(days=day) for day in self.byday or (start.weekday(),)]
+        month = start.year * 12 + start.month - 1 + k * self.interval * (12 if self.freq == 'YEARLY' else 1)
+        year, month = divmod(month, 12)
+        if start.day > calendar.monthrange(year, month + 1)[1]:
+            return []
+        return [start.replace(year=year, month=month + 1)]
+
+    def occurrences(self, start, after=None):
+        '''
+        the occurrences of the rule repeating from start, in order,
+        from the first one at or after "after". Never ends for rules
+        without a COUNT or an UNTIL. A task without a due date has no
+        start and no occurrences
+        '''
+        if start is None:
+            return
+        tz = timezone.get_default_timezone()
+        local = timezone.localtime(start, tz).replace(tzinfo=None)
+        # periods before the one of "after" can't be skipped when they are counted
+        skip_to = None if self.count is not None or after is None else (
+            timezone.localtime(after, tz).replace(tzinfo=None))
+        n = 0
+        k = self._first_period(local, skip_to)
+        while True:
+            try:
+                period = self._period(local, k)
+            except (OverflowError, ValueError):
+                # past the last year datetime supports
+                return
+            for wall_time in period:
+                if wall_time < local:
+                    # days of the first week before the start
+                    continue
+                n += 1
+                if self.count is not None and n > self.count:
+                    return
+                occurrence = timezone.make_aware(wall_time, tz)
+                if self.until is not None and occurrence > self.until:
+                    return
+                if after is None or occurrence >= after:
+                    yield occurrence
+            k += 1
+
+    def is_occurrence(self, start, time):
+        return next(self.occurrences(start, time), None) == time
+
+
+def recurring(prefix=''):
+    '''
+    a Q of the tasks that repeat, the lookups are prefixed with "prefix"
+    to filter the rows of another model by their task. A task with an
+    empty rule doesn't repeat, like one without a rule
+    '''
+    return Q(**{f'{prefix}recurrence__gt': ''})
+
+
+def parse_window(params):
+    '''
+    the (start, end) window of the "from" and "to" query parameters,
+    None when they aren't given. Raises ValueError when they are invalid
+    '''
+    if 'from' not in params and 'to' not in params:
+        return None
+    try:
+        start, end = parse_datetime(params.get('from', '')), parse_datetime(params.get('to', ''))
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        raise ValueError('from and to must both be date-times')
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if not start < end <= start + MAX_WINDOW:
+        raise ValueError(f'to must be after from and at most {MAX_WINDOW.days} days later')
+    return start, end
+
+
+def _item(row, due_date, occurrence, completed):
+    data = task_row_data(row)
+    data['due_date'] = _datetime.to_representation(due_date)
+    data['occurrence'] = _datetime.to_representation(occurrence)
+    data['completed'] = completed
+    return data
+
+
+def _occurrences(row, overrides, start, end):
+    '''the (key, item) pairs of the occurrences of a recurring task in the window, in order'''
+    rule = Rule.parse(row.recurrence)
+    last = end if row.completed_at is None else min(end, row.completed_at)
+
+    def expanded():
+        for occurrence in takewhile(lambda time: time < last, rule.occurrences(row.due_date, start)):
+            override = overrides.get(occurrence)
+            if override is None:
+                yield (occurrence, row.id, occurrence), _item(row, occurrence, occurrence, False)
+            elif not override.cancelled and override.due_date is None:
+                yield (occurrence, row.id, occurrence), _item(row, occurrence, occurrence, override.completed)
+
+    # occurrences moved into the window, the rule may have changed since they were moved
+    moved = sorted(
+        ((override.due_date, row.id, override.occurrence), _item(row, override.due_date, override.occurrence, override.completed))
+        for override in overrides.values()
+        if override.due_date is not None and not override.cancelled and start <= override.due_date < end
+        and rule.is_occurrence(row.due_date, override.occurrence))
+    return heapq.merge(expanded(), moved, key=lambda pair: pair[0])
+
+
+def _single(rows):
+    '''the (key, item) pairs of tasks listed once'''
+    for row in rows:
+        yield (row.due_date, row.id, row.due_date), _item(
+            row, row.due_date, row.due_date, row.completed_at is not None)
+
+
+def window_items(queryset, start, end, archived=None):
+    '''
+    the tasks of a listing queryset due in the [start, end) window with
+    the occurrences of its recurring tasks, as listing dicts in due date
+    order. Every item has the time the task or occurrence was due before
+    it was moved and whether it is completed. The tasks of the archived
+    queryset are listed once, on their due date, see bot8/archive.py
+    '''
+    moved_in = TaskOccurrence.objects.filter(task=OuterRef('pk'), due_date__gte=start, due_date__lt=end)
+    repeating = task_rows(queryset.filter(recurring()).filter(Q(due_date__lt=end) | Exists(moved_in)))
+
+    overrides = {}
+    in_window = Q(occurrence__gte=start, occurrence__lt=end) | Q(due_date__gte=start, due_date__lt=end)
+    for override in TaskOccurrence.objects.filter(in_window, task_id__in=[row.id for row in repeating]):
+        overrides.setdefault(override.task_id, {})[override.occurrence] = override
+
+    single = queryset.filter(~recurring(), due_date__gte=start, due_date__lt=end)
+    streams = [_single(iter_task_rows(single, WINDOW_CHUNK_SIZE))]
+    streams += [_occurrences(row, overrides.get(row.id, {}), start, end) for row in repeating]
+    if archived is not None:
+        archived = archived.filter(due_date__gte=start, due_date__lt=end)
+        streams.append(_single(iter_task_rows(archived, WINDOW_CHUNK_SIZE)))
+    return (item for _, item in heapq.merge(*streams, key=lambda pair: pair[0]))
@@ -0,0 +1,225 @@
+'''
+Reminder dispatch
+
+The scheduler keeps the upcoming reminders in a min-heap ordered by
+reminder time. The heap is filled from a range query on the reminder
+index that only covers a window ahead of the current time, so the
+scheduler never scans every task. It sleeps until the earliest reminder
+is due, delivers it to a sink and records the delivery.
+
+A reminder is recorded as delivered only after the sink accepted it, so
+delivery is at least once: if the process stops between delivering and
+recording, the reminder is delivered again on the next start.
+
+Run it with "python manage.py runreminders", or inside the ASGI process
+with start_worker()
+'''
+import heapq
+import json
+import logging
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Task, ReminderDelivery
+
+logger = logging.getLogger(__name__)
+
+# a reminder handed to a sink
+DueReminder = namedtuple('DueReminder', ['task_id', 'title', 'guild', 'reminder', 'assignees'])
+
+
+class LogSink:
+    '''Sink that writes reminders to the log'''
+
+    def deliver(self, reminder):
+        logger.info('Reminder for task %s "%s" at %s', reminder.task_id, reminder.title, reminder.reminder)
+
+
+class WebhookSink:
+    '''Sink that posts every reminder as json to a url'''
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, reminder):
+        # imported here, the api processes only load this module to
+        # wake the scheduler when a reminder is set, see reminder_changed
+        import urllib.request
+        body = json.dumps(reminder._asdict(), cls=JSONEncoder).encode()
+        request = urllib.request.Request(
+            self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        # any error response raises and the reminder is retried
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def get_sink():
+    '''build the sink configured by the REMINDER_SINK setting'''
+    config = getattr(settings, 'REMINDER_SINK', {})
+    sink_class = import_string(config.get('CLASS', 'bot8.reminders.LogSink'))
+    return sink_class(**config.get('OPTIONS', {}))
+
+
+def pending_reminders(start, end):
+    '''open tasks with an undelivered reminder between start and end, earliest first'''
+    delivered = ReminderDelivery.objects.filter(task=OuterRef('pk'), reminder=OuterRef('reminder'))
+    return (
+        Task.objects.filter(reminder__gte=start, reminder__lte=end, completed_at__isnull=True)
+        .exclude(Exists(delivered))
+        .order_by('reminder', 'id'))
+
+
+class ReminderScheduler:
+    '''
+    Delivers task reminders when they are due
+
+    - lookahead: how far ahead of now reminders are loaded
+    - batch_size: the most reminders loaded by one query
+    - refresh_interval: seconds between reloads, which pick up reminders
+        set by other processes (reminders set in this process wake the
+        scheduler straight away through notify)
+    - catchup: how old a missed reminder can be and still be delivered
+    - retry_delay: seconds before retrying a reminder the sink failed on
+    '''
+
+    def __init__(self, sink, lookahead=timedelta(hours=1), batch_size=500,
+                 refresh_interval=60, catchup=timedelta(days=1), retry_delay=30,
+                 clock=timezone.now):
+        self.sink = sink
+        self.lookahead = lookahead
+        self.batch_size = batch_size
+        self.refresh_interval = timedelta(seconds=refresh_interval)
+        self.catchup = catchup
+        self.retry_delay = timedelta(seconds=retry_delay)
+        self.clock = clock
+
+        # (time to deliver, task id, reminder time), the earliest is heap[0],
+        # the times only differ for reminders that are being retried
+        self.heap = []
+        self.queued = set()
+        self.more_pending = False
+        self.next_refresh = None
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+    def push(self, deliver_at, task_id, reminder):
+        self.queued.add((task_id, reminder))
+        heapq.heappush(self.heap, (deliver_at, task_id, reminder))
+
+    def load(self):
+        '''add the pending reminders of the lookahead window to the heap'''
+        now = self.clock()
+        rows = list(
+            pending_reminders(now - self.catchup, now + self.lookahead)
+            .values_list('id', 'reminder')[:self.batch_size])
+        for task_id, reminder in rows:
+            if (task_id, reminder) not in self.queued:
+                self.push(reminder, task_id, reminder)
+
+        # a full batch means there can be more reminders in the window,
+        # they are loaded once the loaded ones have been delivered
+        self.more_pending = len(rows) == self.batch_size
+        self.next_refresh = now + self.refresh_interval
+
+    def run_pending(self):
+        '''deliver every queued reminder that is due, returns how many were delivered'''
+        now = self.clock()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, task_id, reminder = heapq.heappop(self.heap)
+            self.queued.discard((task_id, reminder))
+            due.append((task_id, reminder))
+        if not due:
+            return 0
+
+        # skip reminders that were changed or removed and tasks completed since they were loaded,
+        # a changed reminder is picked up again by the next load
+        tasks = Task.objects.filter(id__in=[task_id for task_id, _ in due]).prefetch_related('assignees')
+        tasks = {task.id: task for task in tasks}
+        delivered = []
+        for task_id, when in due:
+            task = tasks.get(task_id)
+            if task is None or task.reminder != when or task.completed_at is not None:
+                continue
+            reminder = DueReminder(
+                task.id, task.title, task.guild, when,
+                [user.username for user in task.assignees.all()])
+            try:
+                self.sink.deliver(reminder)
+            except Exception:
+                logger.exception('Delivering the reminder of task %s failed', task_id)
+                self.push(now + self.retry_delay, task_id, when)
+                continue
+            delivered.append(ReminderDelivery(task_id=task_id, reminder=when, delivered_at=now))
+
+        self.record(delivered)
+        return len(delivered)
+
+    def record(self, deliveries):
+        ReminderDelivery.objects.bulk_create(
+            deliveries, update_conflicts=True, unique_fields=['task'],
+            update_fields=['reminder', 'delivered_at'])
+
+    def needs_load(self, now):
+        return now >= self.next_refresh or (self.more_pending and not self.heap)
+
+    def next_wakeup(self):
+        '''the time the scheduler has to wake up at next'''
+        if self.heap and self.heap[0][0] < self.next_refresh:
+            return self.heap[0][0]
+        return self.next_refresh
+
+    def notify(self):
+        '''wake the scheduler up to reload, called when a reminder is set'''
+        self.next_refresh = self.clock()
+        self.wakeup.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+    def run(self):
+        '''deliver reminders until stop is called'''
+        self.load()
+        while not self.stopped.is_set():
+            close_old_connections()
+            self.run_pending()
+            now = self.clock()
+            if self.needs_load(now):
+                self.load()
+                continue
+
+            delay = (self.next_wakeup() - now).total_seconds()
+            if delay > 0:
+                self.wakeup.wait(delay)
+            self.wakeup.clear()
+
+
+# the scheduler running in this process, if any
+_worker = None
+
+
+def start_worker(**kwargs):
+    '''run a scheduler in a background thread of this process'''
+    global _worker
+    if _worker is None:
+        _worker = ReminderScheduler(get_sink(), **kwargs)
+        threading.Thread(target=_worker.run, name='reminders', daemon=True).start()
+    return _worker
+
+
+def reminder_changed():
+    '''
+    let the scheduler in this process know that a reminder was set,
+    called once the writes that create tasks with reminders or change
+    reminders are committed
+    '''
+    if _worker is not None:
+        _worker.notify()
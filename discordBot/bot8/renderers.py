@@ -0,0 +1,44 @@
+'''
+JSON rendering with orjson
+
+FastJSONRenderer produces the same bytes as DRF's JSONRenderer with the
+default compact and unicode settings, encoded by orjson when it is
+installed (pip install orjson). Values orjson doesn't handle itself, such
+as datetimes, go through DRF's encoder so they are formatted the same
+'''
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+_renderer = JSONRenderer()
+
+
+def dumps(data):
+    '''data as compact JSON bytes, the same bytes as JSONRenderer'''
+    if orjson is None:
+        return _renderer.render(data)
+    content = orjson.dumps(
+        data, default=_encoder.default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    # escaped by JSONRenderer since they end lines in javascript
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    '''JSONRenderer that encodes with orjson, see the module docstring'''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
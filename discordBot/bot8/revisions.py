@@ -0,0 +1,90 @@
+'''
+Change counters for conditional GET requests
+
+Every write to a task increments the revision of the task and the
+revision of its guild's listings, in the same transaction as the write.
+ETags are built from these counters, so a request with a matching
+If-None-Match header gets a 304 after a single small query, without
+reading or serializing any tasks.
+
+- a task's ETag is its id and revision
+- a listing's ETag is the revision of the guild it is filtered by, or
+  the sum of the revisions of all guilds, with a hash of the query string
+
+Writes that don't go through the views (the admin, the shell) don't
+increment the counters, so clients can keep stale data until the next
+write to the same guild
+'''
+import hashlib
+from django.db.models import F, Sum
+from django.utils.cache import get_conditional_response, quote_etag
+from .models import GuildRevision, Task
+
+# counter of the tasks that have no guild
+NO_GUILD = 'none'
+
+
+def guild_name(guild):
+    return NO_GUILD if guild is None else str(guild)
+
+
+def bump(guilds, task_ids=()):
+    '''
+    increment the revisions of the tasks and of the guilds,
+    should be called inside the transaction of the write
+    '''
+    if task_ids:
+        Task.objects.filter(id__in=task_ids).update(revision=F('revision') + 1)
+
+    names = {guild_name(guild) for guild in guilds}
+    if names:
+        # the counters are created first so concurrent writes
+        # wait for each other on the increment
+        GuildRevision.objects.bulk_create(
+            [GuildRevision(guild=name) for name in names], ignore_conflicts=True)
+        GuildRevision.objects.filter(guild__in=names).update(revision=F('revision') + 1)
+
+
+def listing_revisions(guild):
+    '''
+    the counters a listing filtered by the guild parameter depends on,
+    None if the parameter isn't a valid guild
+    '''
+    queryset = GuildRevision.objects.all()
+    if guild is not None:
+        try:
+            queryset = queryset.filter(guild=str(int(guild)))
+        except ValueError:
+            return None
+    return queryset
+
+
+def listing_revision(guild):
+    queryset = listing_revisions(guild)
+    if queryset is None:
+        return None
+    return queryset.aggregate(revision=Sum('revision'))['revision'] or 0
+
+
+def listing_etag(request, revision):
+    '''
+    the ETag of a listing at the revision, every query string
+    and accepted media type gets its own
+    '''
+    variant = request.META.get('QUERY_STRING', '') + '|' + request.META.get('HTTP_ACCEPT', '')
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:16]
+    return quote_etag(f'{revision}-{digest}')
+
+
+def task_etag(pk, revision):
+    return quote_etag(f'{pk}-{revision}')
+
+
+def not_modified(request, etag):
+    '''a 304 response if the client already has the version with the ETag, otherwise None'''
+    return get_conditional_response(request, etag=etag)
+
+
+def set_etag(response, etag):
+    response['ETag'] = etag
+    return response
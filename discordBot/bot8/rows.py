@@ -0,0 +1,97 @@
+'''
+Fast read path for task listings
+
+TaskSerializer builds a model instance per task and walks its fields for
+every one of them. Listings instead read plain tuples with values_list,
+read the assignees of all the listed tasks with one query on the
+assignee table, and build the same dicts as TaskSerializer directly.
+task_row_data(row) is equal to TaskSerializer(task).data, so responses
+don't change. Archived tasks are read the same way, see bot8/archive.py
+'''
+from collections import namedtuple
+from django.db import connection
+from rest_framework import serializers
+from .models import Task
+
+TASK_COLUMNS = ('id', 'title', 'due_date', 'reminder', 'guild', 'recurrence', 'completed_at')
+
+
+class TaskRow(namedtuple('TaskRow', TASK_COLUMNS + ('assignees',))):
+    '''a listed task, with the attributes TaskCursorPagination reads'''
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+
+_datetime = serializers.DateTimeField()
+
+
+def task_row_data(row):
+    '''the row as TaskSerializer would serialize the task'''
+    return {
+        'id': row.id,
+        'title': row.title,
+        'due_date': _datetime.to_representation(row.due_date),
+        'reminder': _datetime.to_representation(row.reminder),
+        'guild': row.guild,
+        'recurrence': row.recurrence,
+        'completed_at': _datetime.to_representation(row.completed_at),
+        'assignees': row.assignees,
+    }
+
+
+def _values(queryset):
+    return queryset.prefetch_related(None).values_list(*TASK_COLUMNS)
+
+
+def _assignee_queries(task_ids, model=Task):
+    '''querysets of the (task id, username) pairs of the tasks of the model, in username order'''
+    through = model.assignees.through
+    task = f'{model._meta.model_name}_id'
+    # stay under the number of parameters a query can have
+    size = connection.features.max_query_params or len(task_ids) or 1
+    for start in range(0, len(task_ids), size):
+        yield (through.objects.filter(**{f'{task}__in': task_ids[start:start + size]})
+               .order_by(task, 'users_id').values_list(task, 'users_id'))
+
+
+def _rows(values, pairs):
+    assignees = {}
+    for task_id, username in pairs:
+        assignees.setdefault(task_id, []).append(username)
+    return [TaskRow(*value, assignees.get(value[0], [])) for value in values]
+
+
+def _with_assignees(values, model):
+    pairs = [pair for query in _assignee_queries([value[0] for value in values], model) for pair in query]
+    return _rows(values, pairs)
+
+
+def task_rows(queryset):
+    '''the tasks of the queryset as TaskRows, in the queryset's order'''
+    return _with_assignees(list(_values(queryset)), queryset.model)
+
+
+async def atask_rows(queryset):
+    '''task_rows with the async ORM'''
+    values = [value async for value in _values(queryset)]
+    task_ids = [value[0] for value in values]
+    pairs = [pair for query in _assignee_queries(task_ids, queryset.model) async for pair in query]
+    return _rows(values, pairs)
+
+
+def iter_task_rows(queryset, chunk_size):
+    '''
+    the tasks of the queryset as TaskRows read off the database cursor,
+    the assignees are read once per chunk of chunk_size tasks
+    '''
+    chunk = []
+    for value in _values(queryset).iterator(chunk_size=chunk_size):
+        chunk.append(value)
+        if len(chunk) >= chunk_size:
+            yield from _with_assignees(chunk, queryset.model)
+            chunk = []
+    if chunk:
+        yield from _with_assignees(chunk, queryset.model)
@@ -0,0 +1,132 @@
+'''
+Full text search on task titles
+
+On sqlite the titles are indexed by an FTS5 table kept up to date by
+triggers on the task table, so bulk inserts and updates are indexed too.
+On PostgreSQL they are indexed by a GIN index on their tsvector. Other
+databases, or a sqlite built without FTS5, fall back to a scan with
+icontains.
+
+Search text is split into words, a task matches when its title has every
+word, the last word can be the start of a longer word. Results are
+ranked by bm25 on sqlite and ts_rank on PostgreSQL, ties by id.
+
+install() is idempotent and run by the migration and after every migrate,
+since sqlite migrations that rebuild the task table drop its triggers
+'''
+import re
+from django.db import connection as default_connection
+from django.db.utils import OperationalError
+from .models import Task
+
+FTS_TABLE = 'bot8_task_fts'
+
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, content='bot8_task', content_rowid='id')",
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON bot8_task BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON bot8_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF title ON bot8_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END''',
+]
+
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS task_title_search_idx ON bot8_task USING GIN (to_tsvector('simple', title))",
+]
+
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS task_title_search_idx',
+]
+
+SQLITE_SEARCH = f'''
+    SELECT t.id FROM {FTS_TABLE} f JOIN bot8_task t ON t.id = f.rowid
+    WHERE {FTS_TABLE} MATCH %s {{guild}}
+    ORDER BY bm25({FTS_TABLE}), t.id LIMIT %s OFFSET %s'''
+
+POSTGRES_SEARCH = '''
+    SELECT t.id FROM bot8_task t, to_tsquery('simple', %s) q
+    WHERE to_tsvector('simple', t.title) @@ q {guild}
+    ORDER BY ts_rank(to_tsvector('simple', t.title), q) DESC, t.id LIMIT %s OFFSET %s'''
+
+
+def install(connection):
+    '''create the search index of the connection's database if it doesn't exist'''
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+            created = cursor.fetchone() is None
+            try:
+                for statement in SQLITE_INSTALL:
+                    cursor.execute(statement)
+            except OperationalError:
+                # sqlite was built without FTS5
+                return
+            if created:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for statement in POSTGRES_INSTALL:
+                cursor.execute(statement)
+
+
+def uninstall(connection):
+    statements = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_after_migrate(sender, using, **kwargs):
+    '''post_migrate handler that puts back triggers dropped by table rebuilds'''
+    from django.db import connections
+    install(connections[using])
+
+
+def search_words(text):
+    return re.findall(r'\w+', text)
+
+
+def has_fts(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def search_task_ids(text, guild=None, limit=20, offset=0, connection=default_connection):
+    '''the ids of the tasks with titles matching the text, best match first'''
+    words = search_words(text)
+    if not words:
+        return []
+    guild_filter = 'AND t.guild = %s' if guild is not None else ''
+    guild_params = [guild] if guild is not None else []
+
+    if connection.vendor == 'sqlite' and has_fts(connection):
+        # every word is quoted so the text can't be read as FTS5 query syntax
+        query = ' '.join(f'"{word}"' for word in words) + '*'
+        sql, params = SQLITE_SEARCH.format(guild=guild_filter), [query] + guild_params + [limit, offset]
+    elif connection.vendor == 'postgresql':
+        query = ' & '.join(words) + ':*'
+        sql, params = POSTGRES_SEARCH.format(guild=guild_filter), [query] + guild_params + [limit, offset]
+    else:
+        queryset = Task.objects.all()
+        for word in words:
+            queryset = queryset.filter(title__icontains=word)
+        if guild is not None:
+            queryset = queryset.filter(guild=guild)
+        return list(queryset.order_by('id').values_list('id', flat=True)[offset:offset + limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -1,11 +1,72 @@
 # serializer takes model and translates an object into a json response
 from rest_framework import serializers
 from .models import Task, Users
+from .recurrence import Rule, InvalidRule
+
+class RecurrenceValidation:
+    '''validation of the recurrence rule of a task, see bot8/recurrence.py'''
+
+    def validate_recurrence(self, value):
+        if not value:
+            return None
+        try:
+            # rules are stored in the same form however they were written
+            return str(Rule.parse(value))
+        except InvalidRule as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, data):
+        if data.get('recurrence') and not data.get('due_date'):
+            raise serializers.ValidationError({'recurrence': 'A recurring task needs a due date to start from'})
+        return data
+
+class TaskSerializer(RecurrenceValidation, serializers.ModelSerializer):
+    # declared since DRF makes a relation with a through model read-only,
+    # the views write the assignee rows with add_assignees
+    assignees = serializers.PrimaryKeyRelatedField(many=True, queryset=Users.objects.all(), required=False)
 
-class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
-        fields = ('__all__')
+        # in the order of the model's fields like before assignees was declared,
+        # the revision is sent in the ETag header
+        fields = ('id', 'title', 'due_date', 'reminder', 'guild', 'recurrence', 'completed_at', 'assignees')
+
+class TaskSpecSerializer(RecurrenceValidation, serializers.ModelSerializer):
+    '''
+    A full task as accepted by the batch endpoint,
+    assignees are given as usernames and don't have to exist yet
+    '''
+    assignees = serializers.ListField(
+        child=serializers.CharField(max_length=60), default=list)
+
+    class Meta:
+        model = Task
+        fields = ('title', 'due_date', 'reminder', 'guild', 'recurrence', 'completed_at', 'assignees')
+
+class TaskUpdateSerializer(serializers.Serializer):
+    '''
+    A change of the due date, reminder and/or completion
+    time of a task, as accepted by the batch endpoint
+    '''
+    id = serializers.IntegerField()
+    due_date = serializers.DateTimeField(allow_null=True, required=False)
+    reminder = serializers.DateTimeField(allow_null=True, required=False)
+    completed_at = serializers.DateTimeField(allow_null=True, required=False)
+
+    def validate(self, data):
+        if not {'due_date', 'reminder', 'completed_at'} & set(data):
+            raise serializers.ValidationError('due_date, reminder or completed_at is required')
+        return data
+
+class OccurrenceSerializer(serializers.Serializer):
+    '''
+    A change of an occurrence of a recurring task, identified
+    by the time its recurrence rule gives it
+    '''
+    occurrence = serializers.DateTimeField()
+    due_date = serializers.DateTimeField(allow_null=True, default=None)
+    completed = serializers.BooleanField(default=False)
+    cancelled = serializers.BooleanField(default=False)
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,35 @@
+from django.http import StreamingHttpResponse
+from .renderers import dumps
+from .rows import iter_task_rows, task_row_data
+
+# number of rows pulled from the database cursor at a time
+STREAM_CHUNK_SIZE = 500
+
+
+def stream_json_array(items, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Encode items as a JSON array one chunk at a time.
+    Only chunk_size serialized items are held in memory at once
+    '''
+    yield b'['
+    buffer = []
+    first = True
+    for item in items:
+        buffer.append(dumps(serialize(item)))
+        if len(buffer) >= chunk_size:
+            yield (b'' if first else b',') + b','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield (b'' if first else b',') + b','.join(buffer)
+    yield b']'
+
+
+def streaming_json_response(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Stream the tasks of a queryset as a JSON array straight off the
+    database cursor instead of building the whole list in memory
+    '''
+    rows = iter_task_rows(queryset, chunk_size)
+    content = stream_json_array(rows, task_row_data, chunk_size)
+    return StreamingHttpResponse(content, content_type='application/json')
@@ -0,0 +1,240 @@
+'''
+Rate limiting and admission control per guild
+
+GuildRateThrottle is a DRF throttle that gives every guild a token
+bucket: a guild can send BURST requests at once, then RATE requests per
+second. A request over the limit gets a 429 with a Retry-After header.
+Requests are counted against the guild of the "guild" query parameter or
+the X-Guild header, or against the client's address when they have
+neither or it isn't an integer.
+
+The buckets are kept by a store. MemoryStore keeps them in the process,
+so every worker process has its own buckets. CacheStore keeps them in a
+django cache shared by all the workers, such as redis or memcached. It
+reads and writes a bucket without a lock, so concurrent requests of a
+guild can get a few more requests through than the limit.
+
+Listings are expensive, so a guild can also only have
+MAX_CONCURRENT_LISTINGS listings reading the database at once in a
+process, see listing_slot. More are turned away with a 429 instead of
+waiting for a worker.
+
+Both are configured with the GUILD_THROTTLE setting and do nothing when
+it isn't enabled
+'''
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+# seconds a turned away listing is told to wait
+LISTING_RETRY_AFTER = 1
+
+
+def throttle_settings():
+    return getattr(settings, 'GUILD_THROTTLE', {})
+
+
+class MemoryStore:
+    '''
+    Token buckets of this process. Each bucket is stored as the time it
+    will be full again, the generic cell rate algorithm, and the buckets
+    not used for the longest time are dropped past max_keys
+    '''
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def take(self, key, rate, burst):
+        '''take a token from the bucket, returns 0 or the seconds until there is one'''
+        with self.lock:
+            now = time.monotonic()
+            wait, full_at = take_token(self.buckets.get(key, now), now, rate, burst)
+            if not wait:
+                self.buckets[key] = full_at
+                self.buckets.move_to_end(key)
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            return wait
+
+
+class CacheStore:
+    '''token buckets kept in a django cache shared by the processes'''
+
+    def __init__(self, alias='default', prefix='bot8-throttle'):
+        self.alias = alias
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        cache = caches[self.alias]
+        key = f'{self.prefix}:{key}'
+        now = time.time()
+        wait, full_at = take_token(cache.get(key, now), now, rate, burst)
+        if not wait:
+            cache.set(key, full_at, timeout=math.ceil(full_at - now) + 1)
+        return wait
+
+
+def take_token(full_at, now, rate, burst):
+    '''
+    the (seconds to wait, new full time) of a bucket that is full at
+    full_at, a bucket is full again burst / rate seconds after it was emptied
+    '''
+    full_at = max(full_at, now) + 1 / rate
+    over = full_at - now - burst / rate
+    if over > 0:
+        return over, None
+    return 0, full_at
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    '''the store of the GUILD_THROTTLE setting, built once per configuration'''
+    config = throttle_settings().get('STORE', {})
+    path = config.get('CLASS', 'bot8.throttling.MemoryStore')
+    options = config.get('OPTIONS', {})
+    key = (path, tuple(sorted(options.items())))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = import_string(path)(**options)
+    return store
+
+
+def request_guild(request):
+    '''
+    the guild of the query parameter or header, normalised like the
+    stored ints so "01" and "1" share their limits. None if there is
+    none or it isn't an integer
+    '''
+    guild = request.GET.get('guild') or request.META.get('HTTP_X_GUILD')
+    if not guild:
+        return None
+    try:
+        return str(int(guild))
+    except ValueError:
+        return None
+
+
+class GuildRateThrottle(BaseThrottle):
+    '''token bucket per guild, see the module docstring'''
+
+    def allow_request(self, request, view):
+        options = throttle_settings()
+        if not options.get('ENABLED'):
+            return True
+        guild = request_guild(request)
+        key = f'guild:{guild}' if guild is not None else f'ident:{self.get_ident(request)}'
+        self.wait_seconds = get_store().take(key, options.get('RATE', 20), options.get('BURST', 60))
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class ListingSlots:
+    '''number of listings of every guild reading the database in this process'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def acquire(self, guild, limit):
+        with self.lock:
+            count = self.in_flight.get(guild, 0)
+            if count >= limit:
+                return False
+            self.in_flight[guild] = count + 1
+            return True
+
+    def release(self, guild):
+        with self.lock:
+            count = self.in_flight.pop(guild) - 1
+            if count:
+                self.in_flight[guild] = count
+
+
+listing_slots = ListingSlots()
+
+
+class HeldContent:
+    '''streamed content that releases its listing slot once it is done or closed'''
+
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+    def close(self):
+        release, self.release = self.release, None
+        if release is not None:
+            release()
+        if hasattr(self.content, 'close'):
+            self.content.close()
+
+
+class AsyncHeldContent:
+    '''
+    HeldContent of an async iterator, it must not be iterable since
+    StreamingHttpResponse tries iter() before aiter()
+    '''
+
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        finally:
+            self.release, release = None, self.release
+            if release is not None:
+                release()
+
+
+@contextmanager
+def listing_slot(request):
+    '''
+    hold one of the listing slots of the request's guild, or raise
+    Throttled when they are all taken. Yields a function that keeps the
+    slot until the end of a streamed response's content, pass it the
+    content and use what it returns instead
+    '''
+    options = throttle_settings()
+    limit = options.get('MAX_CONCURRENT_LISTINGS') if options.get('ENABLED') else None
+    if not limit:
+        yield lambda content: content
+        return
+
+    guild = request_guild(request)
+    if not listing_slots.acquire(guild, limit):
+        raise Throttled(wait=LISTING_RETRY_AFTER)
+    held = []
+
+    def hold(content):
+        wrapper = AsyncHeldContent if hasattr(content, '__aiter__') else HeldContent
+        held.append(wrapper(content, lambda: listing_slots.release(guild)))
+        return held[-1]
+
+    try:
+        yield hold
+    finally:
+        if not held:
+            listing_slots.release(guild)
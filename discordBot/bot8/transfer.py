@@ -0,0 +1,200 @@
+'''
+Export and import of tasks as NDJSON
+
+An export is one JSON object per line: a header, the users, then the
+tasks with their assignees' usernames
+
+    {"type": "export", "version": 1, "guild": 5}
+    {"type": "user", "username": "user1#1234", "servername": null}
+    {"type": "task", "id": 7, "title": "task 1", "due_date": null, "reminder": null, "guild": 5, "recurrence": null, "completed_at": null, "assignees": ["user1#1234"]}
+
+Tasks are read off the database cursor in chunks, so exports use the same
+memory whatever the size of the guild. Imports read the lines in batches
+and write every batch with bulk inserts in its own transaction. Imported
+tasks get new ids, and existing users are left as they are. An invalid
+line stops the import, the batches before it stay imported.
+
+Exports aren't read in a single transaction, a task written during an
+export may be missing from it. Recurring tasks are exported with their
+rule, the overrides of their occurrences are not. Archived tasks are not
+exported
+'''
+import gzip
+import zlib
+from django.db import transaction
+from .assignments import add_assignees
+from .cache import task_list_cache
+from .changes import log_changes
+from .models import Task, TaskChange, Users
+from .reminders import reminder_changed
+from .renderers import dumps
+from .revisions import bump
+from .rows import iter_task_rows, task_row_data
+from .serializers import TaskSpecSerializer
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    import json
+    loads = json.loads
+
+FORMAT_VERSION = 1
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+GZIP_MAGIC = b'\x1f\x8b'
+
+# guild value of imports that keep the guilds of the tasks
+KEEP_GUILD = object()
+
+
+class InvalidImport(Exception):
+    '''Raised when a line of an import is not a valid record'''
+
+    def __init__(self, line, errors, imported):
+        self.line = line
+        self.errors = errors
+        self.imported = imported
+        super().__init__(f'Line {line}: {errors}')
+
+
+def export_chunks(guild=None, chunk_size=EXPORT_CHUNK_SIZE):
+    '''the export of the tasks of the guild, or of every task, as chunks of NDJSON lines'''
+    yield dumps({'type': 'export', 'version': FORMAT_VERSION, 'guild': guild}) + b'\n'
+
+    users = Users.objects.order_by('username')
+    tasks = Task.objects.order_by('id')
+    if guild is not None:
+        users = users.filter(task__guild=guild).distinct()
+        tasks = tasks.filter(guild=guild)
+
+    lines = []
+    for username, servername in users.values_list('username', 'servername').iterator(chunk_size=chunk_size):
+        lines.append(dumps({'type': 'user', 'username': username, 'servername': servername}))
+        if len(lines) >= chunk_size:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    for row in iter_task_rows(tasks, chunk_size):
+        lines.append(dumps({'type': 'task', **task_row_data(row)}))
+        if len(lines) >= chunk_size:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def gzip_chunks(chunks):
+    '''the chunks compressed as one gzip stream'''
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def open_import(fileobj, compressed=None):
+    '''
+    the lines of an import file, gzip files are decompressed.
+    When compressed is None the file must be seekable, it is
+    sniffed for the gzip header
+    '''
+    if compressed is None:
+        compressed = fileobj.read(2) == GZIP_MAGIC
+        fileobj.seek(0)
+    return gzip.GzipFile(fileobj=fileobj, mode='rb') if compressed else fileobj
+
+
+def _user(record):
+    username, servername = record.get('username'), record.get('servername')
+    if not isinstance(username, str) or not 0 < len(username) <= 60:
+        return None, {'username': 'must be a string of 1 to 60 characters'}
+    if servername is not None and (not isinstance(servername, str) or len(servername) > 100):
+        return None, {'servername': 'must be null or a string of at most 100 characters'}
+    return Users(username=username, servername=servername), None
+
+
+class Importer:
+    '''writes the records of an import in batches, see import_lines'''
+
+    def __init__(self, guild=KEEP_GUILD, batch_size=IMPORT_BATCH_SIZE):
+        self.guild = guild
+        self.batch_size = batch_size
+        self.users = []
+        self.tasks = []
+        self.imported = {'users': 0, 'tasks': 0}
+
+    def add(self, number, line):
+        try:
+            record = loads(line)
+        except ValueError:
+            raise InvalidImport(number, 'not valid JSON', self.imported)
+        kind = record.get('type') if isinstance(record, dict) else None
+
+        if kind == 'export':
+            if record.get('version') != FORMAT_VERSION:
+                raise InvalidImport(number, f'unsupported version {record.get("version")}', self.imported)
+        elif kind == 'user':
+            user, errors = _user(record)
+            if errors:
+                raise InvalidImport(number, errors, self.imported)
+            self.users.append(user)
+        elif kind == 'task':
+            self.tasks.append((number, record))
+        else:
+            raise InvalidImport(number, 'type must be "export", "user" or "task"', self.imported)
+
+        if len(self.users) + len(self.tasks) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # one serializer validates the whole batch
+        serializer = TaskSpecSerializer(data=[record for _, record in self.tasks], many=True)
+        if not serializer.is_valid():
+            # a list of errors per task, or a dict of the invalid tasks' errors in newer DRF versions
+            errors = serializer.errors
+            index, errors = min(errors.items()) if isinstance(errors, dict) else next(
+                (index, errors) for index, errors in enumerate(errors) if errors)
+            raise InvalidImport(self.tasks[index][0], errors, self.imported)
+        specs = serializer.validated_data
+        if self.guild is not KEEP_GUILD:
+            for spec in specs:
+                spec['guild'] = self.guild
+
+        with transaction.atomic():
+            # existing users keep their server name
+            Users.objects.bulk_create(self.users, ignore_conflicts=True)
+            tasks = Task.objects.bulk_create([
+                Task(**{key: value for key, value in spec.items() if key != 'assignees'})
+                for spec in specs])
+            add_assignees([
+                (task.id, username)
+                for task, spec in zip(tasks, specs)
+                for username in spec['assignees']],
+                {task.id: (task.due_date, task.guild) for task in tasks})
+            guilds = {task.guild for task in tasks}
+            bump(guilds)
+            log_changes(TaskChange.CREATE, [(task.id, task.guild) for task in tasks])
+            task_list_cache.invalidate(guilds)
+        if any(task.reminder is not None for task in tasks):
+            reminder_changed()
+
+        self.imported['users'] += len(self.users)
+        self.imported['tasks'] += len(tasks)
+        self.users = []
+        self.tasks = []
+
+
+def import_lines(lines, guild=KEEP_GUILD, batch_size=IMPORT_BATCH_SIZE):
+    '''
+    import NDJSON lines in the export format, with the tasks moved to
+    the guild unless it is KEEP_GUILD.
+    Returns the number of users read and of tasks created,
+    raises InvalidImport at the first invalid line
+    '''
+    importer = Importer(guild, batch_size)
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            importer.add(number, line)
+    importer.flush()
+    return importer.imported
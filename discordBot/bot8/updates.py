@@ -0,0 +1,120 @@
+'''
+Writes of the due dates, reminders and completion of tasks
+
+Every change is a single UPDATE of the changed fields that also
+increments the task's revision and returns its guild, so the task is
+never read. Databases without UPDATE ... RETURNING (sqlite before 3.35)
+read the guild by id first. A task that doesn't exist is simply not
+updated and reported as missing.
+
+A batch of changes is written in one transaction, with one guild
+revision increment and one change log insert for all of them. Changes of
+the same task are coalesced, the last value of a field wins. New due
+dates are copied to the assignee rows, see bot8/assignments.py
+
+The due date of a recurring task can't be removed, its occurrences
+repeat from it. Only changes that remove due dates read the tasks, to
+check they don't have a recurrence
+'''
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F
+from .assignments import copy_due_dates
+from .cache import task_list_cache
+from .changes import log_changes
+from .models import Task, TaskChange
+from .recurrence import recurring
+from .reminders import reminder_changed
+from .revisions import bump
+
+UPDATE_FIELDS = ('due_date', 'reminder', 'completed_at')
+
+
+class RecurringDueDate(ValidationError):
+    '''Raised when changes remove the due date of recurring tasks'''
+
+    def __init__(self, task_ids):
+        self.task_ids = task_ids
+        super().__init__(f'Task(s) {task_ids} repeat from their due date, it can not be removed')
+
+
+def can_return_from_update():
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert)
+
+
+def _update_returning(task_id, values):
+    '''the guild of the updated task as a 1-tuple, None if it doesn't exist'''
+    qn = connection.ops.quote_name
+    opts = Task._meta
+    sets = []
+    params = []
+    for name, value in values.items():
+        field = opts.get_field(name)
+        sets.append(f'{qn(field.column)} = %s')
+        params.append(field.get_db_prep_save(value, connection))
+    revision = qn(opts.get_field('revision').column)
+    sets.append(f'{revision} = {revision} + 1')
+    sql = (f'UPDATE {qn(opts.db_table)} SET {", ".join(sets)} '
+           f'WHERE {qn(opts.pk.column)} = %s RETURNING {qn(opts.get_field("guild").column)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [task_id])
+        return cursor.fetchone()
+
+
+def _update_by_id(task_id, values):
+    rows = list(Task.objects.filter(id=task_id).values_list('guild')[:1])
+    if not rows:
+        return None
+    Task.objects.filter(id=task_id).update(revision=F('revision') + 1, **values)
+    return rows[0]
+
+
+def coalesce(changes):
+    '''(task id, {field: value}) changes as {task id: {field: value}}, later values win'''
+    coalesced = {}
+    for task_id, values in changes:
+        coalesced.setdefault(task_id, {}).update(values)
+    return coalesced
+
+
+def update_tasks(changes):
+    '''
+    Write (task id, {field: value}) changes of UPDATE_FIELDS in one
+    transaction. Returns the {task id: guild} of the tasks that were
+    updated, the tasks that don't exist are left out.
+    Raises django's ValidationError for an invalid value and
+    RecurringDueDate for a removed due date before writing
+    '''
+    changes = coalesce(changes)
+    # values are converted before anything is written, so an invalid one fails the whole batch
+    for values in changes.values():
+        for name, value in values.items():
+            if name not in UPDATE_FIELDS:
+                raise ValueError(f'{name} can not be updated')
+            values[name] = Task._meta.get_field(name).to_python(value)
+
+    update = _update_returning if can_return_from_update() else _update_by_id
+    updated = {}
+    with transaction.atomic():
+        removed = [task_id for task_id, values in changes.items() if 'due_date' in values and values['due_date'] is None]
+        if removed:
+            repeating = list(Task.objects.filter(recurring(), id__in=removed).values_list('id', flat=True))
+            if repeating:
+                raise RecurringDueDate(sorted(repeating))
+        for task_id, values in changes.items():
+            row = update(task_id, values)
+            if row is not None:
+                updated[task_id] = row[0]
+        copy_due_dates({
+            task_id: changes[task_id]['due_date'] for task_id in updated if 'due_date' in changes[task_id]})
+        if updated:
+            guilds = set(updated.values())
+            bump(guilds)
+            log_changes(TaskChange.UPDATE, list(updated.items()))
+            task_list_cache.invalidate(guilds)
+
+    # completing or reopening a task removes or puts back its reminder
+    if any({'reminder', 'completed_at'} & set(changes[task_id]) for task_id in updated):
+        reminder_changed()
+    return updated
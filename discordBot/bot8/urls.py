@@ -1,10 +1,22 @@
 from django.urls import path
-from .views import TaskList, DueDate, assignUsersToTask, reminder, TaskDetail
+from .views import TaskList, TaskBatch, TaskDashboard, TaskDigest, TaskCacheStats, TaskChanges, TaskSearch, TaskExport, TaskImport, TaskOccurrences, TaskComplete, Metrics, DueDate, assignUsersToTask, assignUsersToTasks, reminder, TaskDetail
 
 urlpatterns = [
     path('task', TaskList.as_view()),
+    path('task/batch', TaskBatch.as_view()),
+    path('task/dashboard', TaskDashboard.as_view()),
+    path('task/digest', TaskDigest.as_view()),
+    path('task/cache', TaskCacheStats.as_view()),
+    path('task/changes', TaskChanges.as_view()),
+    path('task/search', TaskSearch.as_view()),
+    path('task/export', TaskExport.as_view()),
+    path('task/import', TaskImport.as_view()),
     path('task/<int:pk>', TaskDetail.as_view()),
+    path('task/<int:pk>/occurrence', TaskOccurrences.as_view()),
+    path('task/<int:pk>/complete', TaskComplete.as_view()),
     path('due-date/<int:pk>', DueDate.as_view()),
+    path('assignees', assignUsersToTasks.as_view()),
     path('assignees/<int:pk>', assignUsersToTask.as_view()),
+    path('metrics', Metrics.as_view()),
     path('reminder/<int:pk>',reminder.as_view()),
 ]
\ No newline at end of file
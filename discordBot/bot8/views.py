@@ -1,11 +1,62 @@
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import F
-from .serializers import TaskSerializer
-from .models import Task, Users
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .serializers import TaskSerializer, TaskSpecSerializer, TaskUpdateSerializer, OccurrenceSerializer
+from .models import Task, TaskAssignee, TaskChange, TaskOccurrence, Users
+from .pagination import TaskCursorPagination
+from .rows import task_rows, task_row_data, iter_task_rows
+from .streaming import streaming_json_response, stream_json_array, STREAM_CHUNK_SIZE
+from .archive import archived_tasks, include_archived, merge_rows, page_rows
+from .digest import digest, day_bounds
+from .recurrence import parse_window, window_items, recurring, Rule
+from .cache import task_list_cache
+from .changes import log_changes, changes_since, latest_seq
+from .search import search_task_ids
+from .updates import update_tasks, RecurringDueDate
+from .transfer import export_chunks, gzip_chunks, import_lines, open_import, InvalidImport, KEEP_GUILD
+from .profiling import profiling_settings, route_metrics
+from .throttling import listing_slot
+from .reminders import reminder_changed
+from .revisions import bump, listing_revision, listing_etag, task_etag, not_modified, set_etag
+from .assignments import assign_users, assigned_usernames, add_assignees, MissingTasks
 import datetime
-import pytz
+from itertools import islice
+
+def get_list(data, key):
+    '''get a list value from form data or a json body'''
+    if hasattr(data, 'getlist'):
+        return data.getlist(key)
+    value = data.get(key, [])
+    if not isinstance(value, list):
+        raise TypeError(f'{key} must be a list')
+    return value
+
+def list_tasks(user=None, guild=None):
+    '''tasks in listing order, optionally only those of a user and/or guild'''
+    if user is not None:
+        # if the user parameter has been provided, only show tasks assigned to
+        # the user, read in the order of the assignee index with the copies of
+        # the due date and guild on the assignee rows, see bot8/assignments.py
+        queryset = Task.objects.filter(assignments__users=user).alias(
+            assigned_due_date=F('assignments__due_date'),
+            assigned_task=F('assignments__task_id'),
+            assigned_guild=F('assignments__guild'))
+        if guild is not None:
+            queryset = queryset.filter(assigned_guild=guild)
+        return queryset.order_by(F('assigned_due_date').asc(nulls_last=True), 'assigned_task')
+
+    # order tasks by due date with null due dates listed last,
+    # ties are broken by id so the ordering can be paginated
+    queryset = Task.objects.all().order_by(F('due_date').asc(nulls_last=True), 'id')
+    if guild is not None:
+        queryset = queryset.filter(guild=guild)
+    return queryset
 
 class TaskList(generics.ListCreateAPIView):
     '''
@@ -20,34 +71,633 @@ class TaskList(generics.ListCreateAPIView):
         
     - GET "/task?user=<username>
         list all tasks assigned to <username> sorted by due date
+
+    - GET "/task?limit=<n>&cursor=<cursor>"
+        list tasks one page at a time, see TaskCursorPagination
+
+    - GET "/task?stream=true"
+        stream the list as it is read from the database
+
+    - GET "/task?from=<date-time>&to=<date-time>"
+        list the tasks due in the window, with every occurrence of the
+        recurring tasks in it, sorted by due date. Occurrences have the
+        due date of the occurrence, the time the rule gives it and whether
+        it is completed. Works with user, guild and stream, "limit" lists
+        the first <n> tasks. See bot8/recurrence.py
+        ex [{"id" : 4, ..., "due_date" : "2023-03-27T09:00:00Z", "recurrence" : "FREQ=WEEKLY",
+             "occurrence" : "2023-03-27T09:00:00Z", "completed" : false}]
+
+    - GET "/task?include_archived=true"
+        also list the archived tasks, in the same order. Works with every
+        other parameter, see bot8/archive.py
+
+    json listings are cached per guild when the TASK_LIST_CACHE setting is on,
+    see bot8/cache.py
+
+    listings have an ETag, a request with a matching If-None-Match header
+    gets a 304 without the tasks being read, see bot8/revisions.py
+
+    a guild can only have a few listings reading the database at once when
+    the GUILD_THROTTLE setting is on, see bot8/throttling.py
     '''
     serializer_class = TaskSerializer
+    pagination_class = TaskCursorPagination
+
+    def get(self, request, *args, **kwargs):
+        # the revision is read before the tasks, so the
+        # ETag is never newer than the listing it is sent with
+        revision = listing_revision(request.query_params.get('guild'))
+        if revision is None:
+            return self.list(request, *args, **kwargs)
+
+        etag = listing_etag(request, revision)
+        response = not_modified(request, etag)
+        if response is None:
+            response = self.list(request, *args, **kwargs)
+        return set_etag(response, etag)
 
     def get_queryset(self):
         user = self.request.query_params.get('user')
         guild = self.request.query_params.get('guild')
-        
-        # order tasks by due date with null due dates listed last
-        queryset = Task.objects.all().order_by(F('due_date').asc(nulls_last=True))
-        
-        # if the user parameter has been provided, only show
-        # tasks assigned to the user
-        if user is not None:
-            queryset = queryset.filter(assignees=user)
-        if guild is not None:
-            queryset = queryset.filter(guild=guild)
-        return queryset
-    
+        return list_tasks(user, guild)
+
+    def get_archived(self):
+        '''the archived tasks of the listing, None unless they are included'''
+        params = self.request.query_params
+        if not include_archived(params):
+            return None
+        return archived_tasks(params.get('user'), params.get('guild'))
+
+    def list(self, request, *args, **kwargs):
+        try:
+            window = parse_window(request.query_params)
+        except ValueError as e:
+            return Response(data=str(e), status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        archived = self.get_archived()
+        if request.query_params.get('stream') in ('1', 'true'):
+            # the slot is held until the whole listing is streamed
+            with listing_slot(request) as hold:
+                if window is not None:
+                    items = self.window_items(request, queryset, window, archived)
+                    response = StreamingHttpResponse(stream_json_array(items, lambda item: item), content_type='application/json')
+                elif archived is not None:
+                    rows = merge_rows(iter_task_rows(queryset, STREAM_CHUNK_SIZE), iter_task_rows(archived, STREAM_CHUNK_SIZE))
+                    response = StreamingHttpResponse(stream_json_array(rows, task_row_data), content_type='application/json')
+                else:
+                    response = streaming_json_response(queryset)
+                response.streaming_content = hold(response.streaming_content)
+            return response
+        if not task_list_cache.enabled or request.accepted_renderer.format != 'json':
+            return self.list_rows(request, queryset, window, archived)
+
+        # the rendered listing is cached, so a hit skips serializing and rendering
+        key = task_list_cache.key(request.query_params.get('guild'), request.build_absolute_uri())
+        if key is None:
+            return self.list_rows(request, queryset, window, archived)
+        content = task_list_cache.get(key)
+        if content is None:
+            response = self.list_rows(request, queryset, window, archived)
+            content = request.accepted_renderer.render(
+                response.data, request.accepted_media_type, self.get_renderer_context())
+            task_list_cache.set(key, content)
+        return HttpResponse(content, content_type=request.accepted_renderer.media_type)
+
+    def list_rows(self, request, queryset, window=None, archived=None):
+        '''the listing read and serialized with the fast path of bot8/rows.py'''
+        with listing_slot(request):
+            if window is not None:
+                return Response(list(self.window_items(request, queryset, window, archived)))
+            paginator = self.paginator
+            if not paginator.is_requested(request):
+                rows = task_rows(queryset)
+                if archived is not None:
+                    rows = merge_rows(rows, task_rows(archived))
+                return Response([task_row_data(row) for row in rows])
+            if archived is not None:
+                page = paginator.set_page(page_rows(paginator, request, queryset, archived))
+            else:
+                page = paginator.set_page(task_rows(paginator.page_queryset(queryset, request)))
+            return paginator.get_paginated_response([task_row_data(row) for row in page])
+
+    def window_items(self, request, queryset, window, archived=None):
+        items = window_items(queryset, *window, archived)
+        if self.paginator.limit_query_param in request.query_params:
+            items = islice(items, self.paginator.get_limit(request))
+        return items
+
+    def perform_create(self, serializer):
+        assignees = serializer.validated_data.pop('assignees', [])
+        with transaction.atomic():
+            task = serializer.save()
+            add_assignees([(task.id, user.pk) for user in assignees], {task.id: (task.due_date, task.guild)})
+            bump([task.guild])
+            log_changes(TaskChange.CREATE, [(task.id, task.guild)])
+        task_list_cache.invalidate([task.guild])
+        if task.reminder is not None:
+            reminder_changed()
+
+
+class TaskBatch(APIView):
+    '''
+    View to create many tasks in one request
+
+    - POST "/task/batch"
+        create every task in the list in one transaction,
+        assignees are created if they don't exist yet
+        ex data = {"tasks" : [{"title" : "task 1", "guild" : 1, "assignees" : ["user1#1234"]},
+                              {"title" : "task 2", "due_date" : "2023-03-26T14:40:00Z"}]}
+
+        by default nothing is created if any task is invalid,
+        with "on_error" : "skip" the valid tasks are still created
+
+        the response has one result per task in the order they were sent
+        ex [{"status" : "created", "id" : 5}, {"status" : "invalid", "errors" : {...}}]
+        a task that was valid but not created because another one was
+        invalid has the status "skipped"
+
+    - PUT "/task/batch"
+        change the due dates, reminders and/or completion times of many tasks in one transaction,
+        with one UPDATE per task. Changes of the same task are merged, the
+        last value of a field wins. Nothing is changed if any change is invalid
+        ex data = {"tasks" : [{"id" : 4, "due_date" : "2023-03-26T14:40:00Z"},
+                              {"id" : 9, "due_date" : null, "reminder" : "2023-03-25T14:40:00Z"}]}
+
+        the due date of a recurring task can't be removed
+
+        the response has one result per change in the order they were sent,
+        tasks that don't exist are reported without failing the others
+        ex [{"status" : "updated", "id" : 4}, {"status" : "not_found", "id" : 9}]
+    '''
+    max_batch_size = 1000
+    error_modes = ('abort', 'skip')
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response(data='Invalid batch', status=status.HTTP_400_BAD_REQUEST)
+        specs = request.data.get('tasks')
+        on_error = request.data.get('on_error', 'abort')
+        if not isinstance(specs, list) or on_error not in self.error_modes:
+            return Response(data='Invalid batch', status=status.HTTP_400_BAD_REQUEST)
+        if len(specs) > self.max_batch_size:
+            return Response(
+                data=f'A batch can have at most {self.max_batch_size} tasks',
+                status=status.HTTP_400_BAD_REQUEST)
+
+        # validate every task before writing anything
+        serializers = [TaskSpecSerializer(data=spec) for spec in specs]
+        valid = [serializer.is_valid() for serializer in serializers]
+        results = [
+            None if is_valid else {'status': 'invalid', 'errors': serializer.errors}
+            for serializer, is_valid in zip(serializers, valid)]
+
+        if not all(valid) and on_error == 'abort':
+            results = [result or {'status': 'skipped'} for result in results]
+            return Response(data=results, status=status.HTTP_400_BAD_REQUEST)
+
+        to_create = [serializer for serializer, is_valid in zip(serializers, valid) if is_valid]
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create([
+                Task(**{key: value for key, value in serializer.validated_data.items() if key != 'assignees'})
+                for serializer in to_create])
+            add_assignees([
+                (task.id, username)
+                for task, serializer in zip(tasks, to_create)
+                for username in serializer.validated_data['assignees']],
+                {task.id: (task.due_date, task.guild) for task in tasks})
+            bump({task.guild for task in tasks})
+            log_changes(TaskChange.CREATE, [(task.id, task.guild) for task in tasks])
+            task_list_cache.invalidate({task.guild for task in tasks})
+        if any(task.reminder is not None for task in tasks):
+            reminder_changed()
+
+        created = iter(tasks)
+        results = [result or {'status': 'created', 'id': next(created).id} for result in results]
+        return Response(
+            data=results,
+            status=status.HTTP_201_CREATED if all(valid) else status.HTTP_207_MULTI_STATUS)
+
+    def put(self, request):
+        if not isinstance(request.data, dict):
+            return Response(data='Invalid batch', status=status.HTTP_400_BAD_REQUEST)
+        specs = request.data.get('tasks')
+        if not isinstance(specs, list):
+            return Response(data='Invalid batch', status=status.HTTP_400_BAD_REQUEST)
+        if len(specs) > self.max_batch_size:
+            return Response(
+                data=f'A batch can have at most {self.max_batch_size} tasks',
+                status=status.HTTP_400_BAD_REQUEST)
+
+        serializers = [TaskUpdateSerializer(data=spec) for spec in specs]
+        if not all([serializer.is_valid() for serializer in serializers]):
+            results = [
+                {'status': 'invalid', 'errors': serializer.errors} if serializer.errors else {'status': 'skipped'}
+                for serializer in serializers]
+            return Response(data=results, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = [
+            (serializer.validated_data['id'],
+             {key: value for key, value in serializer.validated_data.items() if key != 'id'})
+            for serializer in serializers]
+        try:
+            updated = update_tasks(changes)
+        except RecurringDueDate as e:
+            results = [
+                {'status': 'invalid', 'errors': {'due_date': ['A recurring task needs a due date to start from']}}
+                if task_id in e.task_ids and 'due_date' in values and values['due_date'] is None
+                else {'status': 'skipped'}
+                for task_id, values in changes]
+            return Response(data=results, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [
+            {'status': 'updated' if task_id in updated else 'not_found', 'id': task_id}
+            for task_id, _ in changes]
+        return Response(
+            data=results,
+            status=status.HTTP_200_OK if len(updated) == len({task_id for task_id, _ in changes})
+            else status.HTTP_207_MULTI_STATUS)
+
+
+class TaskDashboard(APIView):
+    '''
+    View for the tasks of a user in every guild
+
+    - GET "/task/dashboard?user=<username>"
+        the tasks assigned to <username> grouped by guild in listing order,
+        with the number of tasks per guild, of open tasks that are overdue
+        or due in the next 24 hours and of tasks without a due date.
+        Recurring tasks are never overdue or due soon, their due date is
+        the start of their rule
+        ex {"user" : "user1#1234", "guilds" : [{"guild" : 1,
+            "counts" : {"total" : 3, "overdue" : 1, "due_soon" : 1, "no_due_date" : 0},
+            "tasks" : [{"id" : 4, ...}, ...]}]}
+
+    - GET "/task/dashboard?user=<username>&soon=<hours>&limit=<n>"
+        count tasks due in the next <hours> hours as due soon and
+        only return the first <n> tasks of every guild
+    '''
+
+    def get(self, request):
+        params = request.query_params
+        user = params.get('user')
+        try:
+            soon = datetime.timedelta(hours=float(params.get('soon', 24)))
+            limit = int(params['limit']) if 'limit' in params else None
+        except (ValueError, OverflowError):
+            return Response(data='Invalid soon or limit', status=status.HTTP_400_BAD_REQUEST)
+        if user is None or (limit is not None and limit < 0):
+            return Response(data='Invalid user or limit', status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        # counted from the assignee index, joined to the tasks by their primary
+        # key to leave completed and recurring tasks out of overdue and due soon
+        open_tasks = Q(task__completed_at__isnull=True) & ~recurring('task__')
+        counts = (
+            TaskAssignee.objects.filter(users=user).values('guild').order_by('guild')
+            .annotate(
+                total=Count('id'),
+                overdue=Count('id', filter=open_tasks & Q(due_date__lt=now)),
+                due_soon=Count('id', filter=open_tasks & Q(due_date__gte=now, due_date__lt=now + soon)),
+                no_due_date=Count('id', filter=Q(due_date__isnull=True))))
+
+        queryset = list_tasks(user)
+        if limit is not None:
+            # number the tasks of every guild in listing order and keep the first ones
+            queryset = queryset.annotate(rank=Window(
+                RowNumber(), partition_by=F('guild'),
+                order_by=[F('due_date').asc(nulls_last=True), F('id').asc()])).filter(rank__lte=limit)
+        tasks = {}
+        for row in task_rows(queryset):
+            tasks.setdefault(row.guild, []).append(task_row_data(row))
+
+        guilds = []
+        for count in counts:
+            guild = count.pop('guild')
+            guilds.append({'guild': guild, 'counts': count, 'tasks': tasks.get(guild, [])})
+        return Response(data={'user': user, 'guilds': guilds}, status=status.HTTP_200_OK)
+
+
+class TaskDigest(APIView):
+    '''
+    View for the upcoming deadlines of many guilds, see bot8/digest.py
+
+    - GET "/task/digest?guilds=<guild>,<guild>&limit=<n>"
+        the number of open tasks of every guild that are overdue, due today,
+        due in the next 6 days and due later, with the first <n> tasks of
+        every bucket (5 by default, 0 for the counts alone). Recurring tasks
+        are left out, their occurrences are listed by "/task?from=&to="
+        ex {"date" : "2023-03-27", "guilds" : [{"guild" : 1,
+            "counts" : {"overdue" : 1, "today" : 0, "week" : 2, "later" : 7},
+            "tasks" : {"overdue" : [{"id" : 4, ...}], "today" : [], "week" : [...], "later" : [...]}}]}
+    '''
+    default_limit = 5
+    max_limit = 50
+    max_guilds = 5000
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            guilds = list(dict.fromkeys(int(guild) for guild in params.get('guilds', '').split(',') if guild))
+            limit = int(params.get('limit', self.default_limit))
+        except ValueError:
+            return Response(data='Invalid guilds or limit', status=status.HTTP_400_BAD_REQUEST)
+        if not guilds or len(guilds) > self.max_guilds or not 0 <= limit <= self.max_limit:
+            return Response(
+                data=f'Give 1 to {self.max_guilds} guilds and a limit of 0 to {self.max_limit}',
+                status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        data = {
+            'date': timezone.localtime(day_bounds(now)[0]).date().isoformat(),
+            'guilds': digest(guilds, limit, now),
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
+
+class TaskCacheStats(APIView):
+    '''
+    View for the task listing cache counters of this process
+
+    - GET "/task/cache"
+        ex {"enabled" : true, "hits" : 120, "misses" : 14}
+    '''
+
+    def get(self, request):
+        return Response(data=task_list_cache.stats(), status=status.HTTP_200_OK)
+
+
+class Metrics(APIView):
+    '''
+    View for the request metrics of this process in the Prometheus text format,
+    only available when the PROFILING setting is enabled, see bot8/profiling.py
+
+    - GET "/metrics"
+    '''
+
+    def get(self, request):
+        if not profiling_settings().get('ENABLED'):
+            return Response(data='Profiling is not enabled', status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(route_metrics.prometheus(), content_type='text/plain; version=0.0.4')
+
+
+class TaskChanges(APIView):
+    '''
+    View for the tasks that changed since a sequence number of the change log,
+    see bot8/changes.py
+
+    - GET "/task/changes"
+        the current sequence number, to start syncing from after a full listing
+        ex {"next" : 57, "more" : false, "tasks" : [], "deleted" : []}
+
+    - GET "/task/changes?since=<seq>&guild=<guild>&limit=<n>"
+        the tasks that were created or changed (including their assignees)
+        and the ids of the tasks that were deleted or archived after <seq>, looking at
+        <n> log entries at most. Continue from "next", "more" is true
+        while there are more changes to read
+        ex {"next" : 61, "more" : false, "tasks" : [{"id" : 4, ...}], "deleted" : [7]}
+    '''
+    default_limit = 1000
+    max_limit = 10000
+
+    def get(self, request):
+        params = request.query_params
+        guild = params.get('guild')
+        try:
+            since = int(params['since']) if 'since' in params else None
+            limit = min(int(params.get('limit', self.default_limit)), self.max_limit)
+            guild = int(guild) if guild is not None else None
+        except ValueError:
+            return Response(data='Invalid since, limit or guild', status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or (since is not None and since < 0):
+            return Response(data='Invalid since, limit or guild', status=status.HTTP_400_BAD_REQUEST)
+
+        if since is None:
+            data = {'next': latest_seq(), 'more': False, 'tasks': [], 'deleted': []}
+            return Response(data=data, status=status.HTTP_200_OK)
+
+        next_seq, more, changed, deleted = changes_since(since, guild, limit)
+        tasks = task_rows(list_tasks().filter(id__in=changed)) if changed else []
+        # tasks deleted after the last change that was read
+        found = {task.id for task in tasks}
+        deleted += [task_id for task_id in changed if task_id not in found]
+
+        data = {
+            'next': next_seq,
+            'more': more,
+            'tasks': [task_row_data(task) for task in tasks],
+            'deleted': deleted,
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
+
+class TaskSearch(APIView):
+    '''
+    View to search tasks by title, see bot8/search.py
+
+    - GET "/task/search?q=<text>&guild=<guild>&limit=<n>&offset=<n>"
+        the tasks with every word of <text> in their title, best match
+        first, optionally only those of <guild>. "next" is the link to the
+        next page or null on the last page
+        ex {"next" : "/task/search?q=report&offset=20", "results" : [{"id" : 4, ...}]}
+    '''
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        params = request.query_params
+        text = params.get('q', '').strip()
+        guild = params.get('guild')
+        try:
+            limit = min(int(params.get('limit', self.default_limit)), self.max_limit)
+            offset = int(params.get('offset', 0))
+            guild = int(guild) if guild is not None else None
+        except ValueError:
+            return Response(data='Invalid limit, offset or guild', status=status.HTTP_400_BAD_REQUEST)
+        if not text:
+            return Response(data='Missing q', status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response(data='Invalid limit, offset or guild', status=status.HTTP_400_BAD_REQUEST)
+
+        # one more than the page, to know if there is a next page
+        ids = search_task_ids(text, guild, limit + 1, offset)
+        more = len(ids) > limit
+        ids = ids[:limit]
+        rows = {row.id: row for row in task_rows(Task.objects.filter(id__in=ids))} if ids else {}
+
+        next_link = None
+        if more:
+            query = params.copy()
+            query['offset'] = offset + limit
+            next_link = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+        data = {
+            'next': next_link,
+            'results': [task_row_data(rows[task_id]) for task_id in ids if task_id in rows],
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
+
+class TaskExport(APIView):
+    '''
+    View to download the tasks of a guild, see bot8/transfer.py
+
+    - GET "/task/export?guild=<guild>&gzip=true"
+        stream the users and tasks of <guild>, or of every guild without it,
+        as NDJSON. With gzip=true the export is a gzip file
+    '''
+
+    def get(self, request):
+        guild = request.query_params.get('guild')
+        try:
+            guild = int(guild) if guild is not None else None
+        except ValueError:
+            return Response(data='Invalid guild', status=status.HTTP_400_BAD_REQUEST)
+
+        name = f'tasks-{guild if guild is not None else "all"}.ndjson'
+        chunks = export_chunks(guild)
+        if request.query_params.get('gzip') in ('1', 'true'):
+            response = StreamingHttpResponse(gzip_chunks(chunks), content_type='application/gzip')
+            name += '.gz'
+        else:
+            response = StreamingHttpResponse(chunks, content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+
+
+class TaskImport(APIView):
+    '''
+    View to upload an export, see bot8/transfer.py
+
+    - POST "/task/import?guild=<guild>"
+        create the users and tasks of an NDJSON export sent as the body,
+        compressed with gzip when the Content-Encoding is gzip or the
+        Content-Type is application/gzip. The tasks are moved to <guild>
+        if it is given. The body is read in batches as it is received
+        ex {"users" : 12, "tasks" : 340}
+
+        at the first invalid line the import stops, the batches
+        before it stay imported
+        ex {"line" : 17, "errors" : {...}, "imported" : {"users" : 12, "tasks" : 0}}
+    '''
+
+    def post(self, request):
+        guild = request.query_params.get('guild')
+        try:
+            guild = int(guild) if guild is not None else KEEP_GUILD
+        except ValueError:
+            return Response(data='Invalid guild', status=status.HTTP_400_BAD_REQUEST)
+
+        # the body is read straight from the request, DRF doesn't parse it
+        stream = request.stream
+        if stream is None:
+            return Response(data='Missing export', status=status.HTTP_400_BAD_REQUEST)
+        compressed = (request.META.get('HTTP_CONTENT_ENCODING') == 'gzip'
+                      or request.content_type == 'application/gzip')
+        try:
+            imported = import_lines(open_import(stream, compressed), guild)
+        except InvalidImport as e:
+            data = {'line': e.line, 'errors': e.errors, 'imported': e.imported}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        except (OSError, EOFError):
+            return Response(data='Invalid gzip body', status=status.HTTP_400_BAD_REQUEST)
+        return Response(data=imported, status=status.HTTP_201_CREATED)
+
+
+class TaskOccurrences(APIView):
+    '''
+    View to change single occurrences of a recurring task, see bot8/recurrence.py
+
+    - PUT "/task/<id>/occurrence"
+        move, complete or cancel the occurrence of the task with id <id> that
+        the recurrence rule gives at "occurrence". Occurrences that are set
+        back to not moved, not completed and not cancelled aren't stored
+        ex data = {"occurrence" : "2023-03-27T09:00:00Z", "due_date" : "2023-03-28T09:00:00Z",
+                   "completed" : false, "cancelled" : false}
+    '''
+
+    def put(self, request, pk):
+        serializer = OccurrenceSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        task = Task.objects.filter(id=pk).values('guild', 'due_date', 'recurrence').first()
+        if task is None:
+            return Response(data='Task not found', status=status.HTTP_404_NOT_FOUND)
+        if not task['recurrence'] or not Rule.parse(task['recurrence']).is_occurrence(task['due_date'], data['occurrence']):
+            return Response(data='Not an occurrence of the task', status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if data['due_date'] is None and not data['completed'] and not data['cancelled']:
+                TaskOccurrence.objects.filter(task_id=pk, occurrence=data['occurrence']).delete()
+            else:
+                TaskOccurrence.objects.update_or_create(
+                    task_id=pk, occurrence=data['occurrence'],
+                    defaults={key: data[key] for key in ('due_date', 'completed', 'cancelled')})
+            bump([task['guild']], [pk])
+            log_changes(TaskChange.UPDATE, [(pk, task['guild'])])
+        task_list_cache.invalidate([task['guild']])
+        return Response(data='Occurrence updated', status=status.HTTP_200_OK)
+
+
+class TaskComplete(APIView):
+    '''
+    View to complete tasks, completed tasks are moved to the archive
+    by the archivetasks command, see bot8/archive.py
+
+    - PUT "/task/<id>/complete"
+        complete the task with id <id>, a recurring task has no more occurrences
+
+    - DELETE "/task/<id>/complete"
+        reopen the task with id <id>
+    '''
+
+    def put(self, request, pk):
+        if not update_tasks([(pk, {'completed_at': timezone.now()})]):
+            return Response(data='Task not found', status=status.HTTP_404_NOT_FOUND)
+        return Response(data='Task completed', status=status.HTTP_200_OK)
+
+    def delete(self, request, pk):
+        if not update_tasks([(pk, {'completed_at': None})]):
+            return Response(data='Task not found', status=status.HTTP_404_NOT_FOUND)
+        return Response(data='Task reopened', status=status.HTTP_200_OK)
+
 
 class TaskDetail(generics.RetrieveDestroyAPIView):
     '''
-    A view to delete a specific task
+    A view to get or delete a specific task
     
+    - GET "/task/<id>
+        get the task with id <id>
+
     - DELETE "/task/<id>
         deletes the task with id <id>
+
+    the task has an ETag, a request with a matching If-None-Match header gets a 304
     '''
     serializer_class = TaskSerializer
-    queryset = Task.objects.all()
+    queryset = Task.objects.all().prefetch_related('assignees')
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            # check the revision alone before reading the task and its assignees
+            revision = Task.objects.filter(pk=pk).values_list('revision', flat=True).first()
+            if revision is not None:
+                response = not_modified(request, task_etag(pk, revision))
+                if response is not None:
+                    return response
+
+        task = self.get_object()
+        response = Response(self.get_serializer(task).data)
+        return set_etag(response, task_etag(task.pk, task.revision))
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        with transaction.atomic():
+            instance.delete()
+            bump([instance.guild])
+            log_changes(TaskChange.DELETE, [(pk, instance.guild)])
+        task_list_cache.invalidate([instance.guild])
 
 class DueDate(APIView):
     '''
@@ -60,6 +710,7 @@ class DueDate(APIView):
     - GET "/due-date/<id>"
         get the due date from the task with id <id>
         returned in format "Y-M-D H:M"
+        has the same ETag as the task
     '''
     serializer_class = TaskSerializer
     queryset = Task.objects.all()
@@ -71,14 +722,13 @@ class DueDate(APIView):
         #d = datetime.datetime(Year, Month, Day, Hour, Minute, tzinfo = pytz.UTC)
         
         try:
-            # find task at id
-            task = Task.objects.filter(id=pk)[0]
-        except:
-            # task at id not found
+            # a single UPDATE of the due date, the task isn't read
+            updated = update_tasks([(pk, {'due_date': dueDate})])
+        except ValidationError:
+            updated = {}
+        if not updated:
+            # task at id not found or invalid due date
             return Response(data = "A problem occured when trying to add a due date", status =status.HTTP_400_BAD_REQUEST)
-        
-        task.due_date=dueDate
-        task.save()
         return Response (data="A Due Date has been assigned to the task!", status = status.HTTP_200_OK)
         
     
@@ -86,9 +736,13 @@ class DueDate(APIView):
         try:
             # find task and return due date
             task = Task.objects.filter(id=pk)[0]
+            etag = task_etag(task.pk, task.revision)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
             DD = task.due_date
             ND = DD.strftime('%Y-%m-%d %H:%M')
-            return Response (data = ND, status = status.HTTP_200_OK)
+            return set_etag(Response (data = ND, status = status.HTTP_200_OK), etag)
         except:
             # task at id not found
             return Response(data=None, status = status.HTTP_400_BAD_REQUEST)
@@ -106,37 +760,51 @@ class assignUsersToTask (APIView):
     def put(self, request, pk):
         try:
             # get the list of assignees from the data
-            assignees = request.data.getlist('assignees') # not request.data['assignees']
-            task = Task.objects.all().get(id=pk)
-            
+            assignees = get_list(request.data, 'assignees')
+
             # get a list of duplicate users who are already assigned to the task
-            duplicate_users = task.assignees.filter(pk__in=assignees)
+            duplicate_users = assigned_usernames(pk, assignees)
 
             # if there are duplicate users return an error
             if len(duplicate_users):
-                # get list of usernames of duplicate users
-                usernames = [user.username for user in duplicate_users]
                 return Response(
-                    data = f'User(s) {usernames} are already assigned to this task', 
+                    data = f'User(s) {duplicate_users} are already assigned to this task', 
                     status=status.HTTP_400_BAD_REQUEST)
-            
-            for assignee in assignees:
-                # try to find the user with the username
-                user = Users.objects.filter(username=assignee)
-                
-                # if the use exists then add them to the task
-                if len(user):
-                    task.assignees.add(user[0])
-                # if the user doesn't exist then create them and add to task
-                else:
-                    user = Users.objects.create(username=assignee)
-                    task.assignees.add(user)
+
+            # create any missing users and add them all in one transaction
+            guilds = assign_users([pk], assignees)
+            task_list_cache.invalidate(guilds)
 
             return Response(data="Added User(s)", status=status.HTTP_200_OK)
         
         except:  
             return Response(data='Failed to add user(s)', status=status.HTTP_400_BAD_REQUEST)
 
+class assignUsersToTasks (APIView):
+    '''
+    View to add the same users to many tasks at once
+
+    - PUT "assignees"
+        assign users to every task in the list of task ids,
+        users already assigned to one of the tasks are skipped
+        ex data = {"tasks" : [1, 4, 7], "assignees" : ["user1#1234", "user4#2312"]}
+    '''
+
+    def put(self, request):
+        try:
+            task_ids = [int(task_id) for task_id in get_list(request.data, 'tasks')]
+            assignees = get_list(request.data, 'assignees')
+        except (TypeError, ValueError):
+            return Response(data='Failed to add user(s)', status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            guilds = assign_users(task_ids, assignees)
+            task_list_cache.invalidate(guilds)
+        except MissingTasks as e:
+            return Response(data=str(e), status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(data="Added User(s)", status=status.HTTP_200_OK)
+
 class reminder (APIView):
     '''
     View for adding a reminder to a task
@@ -148,11 +816,10 @@ class reminder (APIView):
     '''
     def put(self, request, pk):
         try:
-            # add the reminder to the task
+            # add the reminder to the task with a single UPDATE
             reminder_date = request.data['reminder']
-            task = Task.objects.all().get(id = pk)
-            task.reminder = reminder_date
-            task.save()
+            if not update_tasks([(pk, {'reminder': reminder_date})]):
+                raise Task.DoesNotExist
 
             return Response(data="Reminder has been set", status=status.HTTP_200_OK)
         
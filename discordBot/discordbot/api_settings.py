@@ -0,0 +1,51 @@
+"""
+API-only settings for discordbot
+
+Select them with DJANGO_SETTINGS_MODULE=discordbot.api_settings. They are
+the production settings (configured through the same environment, see
+production_settings.py) without what the bot API doesn't use, so a new
+process starts faster:
+
+- no admin, auth, sessions, messages or staticfiles apps and no nose
+  test runner, none of them are imported when the apps are loaded
+- no session, csrf, auth, messages or clickjacking middleware, requests
+  only go through the profiling, security and common middleware
+- DRF renders json only, without the browsable API and its templates,
+  and doesn't authenticate requests (request.user is None)
+
+The /admin/ pages aren't served. migrate only creates the tables of bot8,
+a database shared with the full settings is migrated with those.
+Compare the startup of the profiles with "python -m benchmarks.startup"
+"""
+
+from .production_settings import *
+
+INSTALLED_APPS = [
+    'bot8.apps.Bot8Config',
+    'rest_framework',
+]
+
+MIDDLEWARE = [
+    # removes itself unless PROFILING is enabled, see bot8/profiling.py
+    'bot8.profiling.ProfilingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+TEST_RUNNER = 'django.test.runner.DiscoverRunner'
+
+NOSE_ARGS = []
+
+TEMPLATES = []
+
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,
+    DEFAULT_RENDERER_CLASSES=[
+        'bot8.renderers.FastJSONRenderer',
+    ],
+    DEFAULT_AUTHENTICATION_CLASSES=[],
+    DEFAULT_PERMISSION_CLASSES=[
+        'rest_framework.permissions.AllowAny',
+    ],
+    UNAUTHENTICATED_USER=None,
+)
@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'discordbot.settings')
+# serve the async views, set BOT8_ASYNC_VIEWS=0 to serve the DRF views instead
+os.environ.setdefault('BOT8_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+# deliver reminders from this process instead of a separate
+# "manage.py runreminders" process, only enable it in one process
+if os.environ.get('BOT8_REMINDER_WORKER') == '1':
+    from bot8.reminders import start_worker
+    start_worker()
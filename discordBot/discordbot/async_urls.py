@@ -0,0 +1,16 @@
+"""discordBot URL Configuration for the ASGI server
+
+Same as discordbot/urls.py but routes to the async views of bot8,
+selected with the BOT8_ASYNC_VIEWS environment variable (see settings.py)
+"""
+from django.apps import apps
+from django.urls import path, include
+
+urlpatterns = [
+    path('', include('bot8.async_urls'))
+]
+
+# the api-only settings don't install the admin, see api_settings.py
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -0,0 +1,79 @@
+"""
+Production settings for discordbot
+
+Select them with DJANGO_SETTINGS_MODULE=discordbot.production_settings.
+Everything else is configured through the environment:
+
+- DJANGO_SECRET_KEY, DJANGO_ALLOWED_HOSTS (comma separated)
+- BOT8_DATABASE: "sqlite" (default) or "postgres"
+- BOT8_SQLITE_PATH: the sqlite database file
+- POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT
+- BOT8_CONN_MAX_AGE: seconds a database connection is reused for
+
+PostgreSQL needs a driver (pip install "psycopg[binary]")
+"""
+
+import os
+import django
+from .settings import *
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if host]
+
+
+# Database
+#
+# connections are kept open between requests instead of opening one per
+# request, and checked before they are reused after an error
+
+CONN_MAX_AGE = int(os.environ.get('BOT8_CONN_MAX_AGE', 600))
+
+if os.environ.get('BOT8_DATABASE', 'sqlite') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'discordbot'),
+            'USER': os.environ.get('POSTGRES_USER', 'discordbot'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BOT8_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # seconds a query waits for another connection's write lock
+                # before failing with "database is locked"
+                'timeout': 20,
+            },
+        }
+    }
+    if django.VERSION >= (5, 1):
+        # take the write lock when a transaction starts, a deferred
+        # transaction that reads and then writes can't wait for the lock
+        # and fails straight away when another connection holds it
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# applied to every new sqlite connection, see bot8/db.py
+# - WAL lets readers run while a write is in progress
+# - synchronous=NORMAL only syncs the WAL at checkpoints, a power
+#   loss can lose the last transactions but never corrupts the database
+# - mmap_size reads the database through 256MB of memory mapping
+# - busy_timeout is the lock wait in milliseconds, like the timeout option
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+}
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 import collections
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -55,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # removes itself unless PROFILING is enabled, see bot8/profiling.py
+    'bot8.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,7 +67,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'discordbot.urls'
+# the ASGI entry point serves the async versions of the views, see bot8/async_views.py
+if os.environ.get('BOT8_ASYNC_VIEWS') == '1':
+    ROOT_URLCONF = 'discordbot.async_urls'
+else:
+    ROOT_URLCONF = 'discordbot.urls'
 
 TEMPLATES = [
     {
@@ -98,6 +105,53 @@ DATABASES = {
 
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+#
+# "tasks" holds the rendered task listings, see bot8/cache.py. Local memory
+# is per process, with more than one process use a shared backend, ex
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': '/var/tmp/bot8_task_cache',
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'tasks': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bot8-tasks',
+        # seconds a listing is kept, least recently used listings
+        # are evicted once there are MAX_ENTRIES
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+TASK_LIST_CACHE = os.environ.get('BOT8_TASK_LIST_CACHE') == '1'
+
+# digest counts read from a summary table kept up to date by triggers,
+# run migrate after changing it, see bot8/digest.py
+TASK_DIGEST_SUMMARY = os.environ.get('BOT8_TASK_DIGEST_SUMMARY') == '1'
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+#
+# json is encoded with orjson when it is installed, see bot8/renderers.py
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'bot8.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'bot8.throttling.GuildRateThrottle',
+    ],
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -138,3 +192,43 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Where due task reminders are delivered, see bot8/reminders.py
+# ex {'CLASS': 'bot8.reminders.WebhookSink', 'OPTIONS': {'url': 'http://localhost:8080/reminders'}}
+
+REMINDER_SINK = {
+    'CLASS': 'bot8.reminders.LogSink',
+    'OPTIONS': {},
+}
+
+
+# Request metrics served at /metrics and cProfile dumps of requests picked
+# at SAMPLE_RATE (0 to 1) or with the X-Profile header set to TOKEN, the
+# header is ignored without a token, see bot8/profiling.py
+
+PROFILING = {
+    'ENABLED': os.environ.get('BOT8_PROFILING') == '1',
+    'SAMPLE_RATE': float(os.environ.get('BOT8_PROFILING_SAMPLE_RATE', 0)),
+    'HEADER': 'HTTP_X_PROFILE',
+    'TOKEN': os.environ.get('BOT8_PROFILING_TOKEN', ''),
+    'DIR': BASE_DIR / 'profiles',
+}
+
+
+# Token bucket rate limit per guild (RATE requests per second after a
+# BURST) and limit of concurrent listings per guild in a process, see
+# bot8/throttling.py. Buckets are kept per process unless STORE is the
+# CacheStore of a cache shared by the processes
+# ex {'CLASS': 'bot8.throttling.CacheStore', 'OPTIONS': {'alias': 'default'}}
+
+GUILD_THROTTLE = {
+    'ENABLED': os.environ.get('BOT8_GUILD_THROTTLE') == '1',
+    'RATE': float(os.environ.get('BOT8_GUILD_THROTTLE_RATE', 20)),
+    'BURST': int(os.environ.get('BOT8_GUILD_THROTTLE_BURST', 60)),
+    'MAX_CONCURRENT_LISTINGS': int(os.environ.get('BOT8_GUILD_MAX_LISTINGS', 4)),
+    'STORE': {
+        'CLASS': 'bot8.throttling.MemoryStore',
+        'OPTIONS': {},
+    },
+}
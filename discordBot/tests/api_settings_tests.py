@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# sets up django, migrates and sends requests, then prints what was imported
+SCRIPT = '''
+import json, sys
+import django
+django.setup()
+from django.core.management import call_command
+from django.test import Client
+call_command('migrate', verbosity=0)
+client = Client()
+created = client.post('/task', {'title': 'Task', 'guild': 1})
+client.put(f"/assignees/{created.json()['id']}", {'assignees': ['user1#1234']}, content_type='application/json')
+listed = client.get('/task', {'user': 'user1#1234'})
+print(json.dumps({
+    'created': created.status_code,
+    'listed': [listed.status_code, listed['Content-Type'], [task['title'] for task in listed.json()]],
+    'missing': client.get('/admin/').status_code,
+    'modules': sorted(name for name in sys.modules if name.split('.')[0] in ('nose', 'django_nose', 'pytz')
+                      or name.startswith(('django.contrib.sessions', 'django.contrib.staticfiles'))),
+}))
+'''
+
+
+class ApiSettingsTests(SimpleTestCase):
+    '''Tests for the api-only settings, run in a subprocess on its own database'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def testServesWithoutUnusedApps(self):
+        '''the api works without the admin, session and nose apps, which aren't imported'''
+
+        env = dict(
+            os.environ, DJANGO_SETTINGS_MODULE='discordbot.api_settings',
+            BOT8_SQLITE_PATH=os.path.join(self.directory, 'db.sqlite3'), DJANGO_ALLOWED_HOSTS='testserver')
+        result = subprocess.run(
+            [sys.executable, '-c', SCRIPT], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout), {
+            'created': 201,
+            'listed': [200, 'application/json', ['Task']],
+            'missing': 404,
+            'modules': [],
+        })
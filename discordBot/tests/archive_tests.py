@@ -0,0 +1,155 @@
+import datetime
+import json
+from io import StringIO
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.archive import archive_completed
+from bot8.models import ArchivedTask, Task, TaskChange, TaskOccurrence, Users
+from bot8.reminders import pending_reminders
+
+
+def at(day):
+    return datetime.datetime(2023, 3, day, 9, tzinfo=datetime.timezone.utc)
+
+
+class ArchiveTests(APITestCase):
+    '''Tests for completing tasks, the archiving job and include_archived listings'''
+
+    def setUp(self):
+        self.user = Users.objects.create(username="user1#1234")
+        long_ago = timezone.now() - datetime.timedelta(days=60)
+        self.tasks = [
+            Task.objects.create(title=f"Task {day}", guild=1, due_date=at(day)) for day in range(1, 7)]
+        self.tasks.append(Task.objects.create(title="No due date", guild=1))
+        # every other task was completed long ago
+        for task in self.tasks[::2]:
+            task.completed_at = long_ago
+            task.save()
+        self.tasks[0].assignees.add(self.user)
+
+    def ids(self, data):
+        return [task['id'] for task in data]
+
+    def streamed(self, response):
+        if not response.is_async:
+            return json.loads(b''.join(response.streaming_content))
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        return json.loads(async_to_sync(read)())
+
+    def testComplete(self):
+        '''completing and reopening a task sets and clears completed_at'''
+
+        task = self.tasks[1]
+        response = self.client.put(f"/task/{task.id}/complete")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        task.refresh_from_db()
+        self.assertIsNotNone(task.completed_at)
+        self.assertIsNotNone(self.client.get(f"/task/{task.id}").json()['completed_at'])
+
+        self.assertEqual(self.client.delete(f"/task/{task.id}/complete").status_code, status.HTTP_200_OK)
+        task.refresh_from_db()
+        self.assertIsNone(task.completed_at)
+        self.assertEqual(self.client.put("/task/999/complete").status_code, status.HTTP_404_NOT_FOUND)
+
+    def testCompletedRecurringTask(self):
+        '''a completed recurring task has no occurrences after it was completed'''
+
+        task = self.tasks[1]
+        Task.objects.filter(id=task.id).update(recurrence="FREQ=DAILY", completed_at=at(4))
+        data = self.client.get("/task?from=2023-03-01T00:00:00Z&to=2023-03-10T00:00:00Z").json()
+        self.assertEqual([item['occurrence'] for item in data if item['id'] == task.id],
+                         ["2023-03-02T09:00:00Z", "2023-03-03T09:00:00Z"])
+
+    def testCompletedTasksHaveNoReminders(self):
+        '''completed tasks don't get reminders'''
+
+        Task.objects.update(reminder=at(1))
+        pending = pending_reminders(at(1), at(2)).values_list('id', flat=True)
+        self.assertEqual(sorted(pending), sorted(task.id for task in self.tasks[1::2]))
+
+    def testArchive(self):
+        '''tasks completed before the cutoff are moved to the archive with their assignees'''
+
+        chunks = list(archive_completed(chunk_size=3))
+        self.assertEqual(chunks, [3, 1])
+        self.assertEqual(sorted(Task.objects.values_list('id', flat=True)), [task.id for task in self.tasks[1::2]])
+
+        archived = ArchivedTask.objects.get(id=self.tasks[0].id)
+        self.assertEqual(archived.title, "Task 1")
+        self.assertEqual(list(archived.assignees.all()), [self.user])
+        self.assertFalse(Task.assignees.through.objects.exists())
+        self.assertEqual(TaskChange.objects.filter(op=TaskChange.ARCHIVE).count(), 4)
+
+        # tasks completed recently are kept
+        self.client.put(f"/task/{self.tasks[1].id}/complete")
+        self.assertEqual(list(archive_completed()), [])
+
+    def testArchiveDropsOccurrences(self):
+        '''the occurrence overrides of archived tasks are deleted'''
+
+        task = self.tasks[0]
+        Task.objects.filter(id=task.id).update(recurrence="FREQ=DAILY")
+        TaskOccurrence.objects.create(task=task, occurrence=at(2), completed=True)
+        list(archive_completed())
+        self.assertFalse(TaskOccurrence.objects.exists())
+
+    def testCommand(self):
+        '''the archivetasks command archives in chunks'''
+
+        out = StringIO()
+        call_command('archivetasks', '--days', '30', '--chunk-size', '2', stdout=out)
+        self.assertIn('Archived 4 tasks', out.getvalue())
+        self.assertEqual(ArchivedTask.objects.count(), 4)
+
+    def testChangeFeed(self):
+        '''archived tasks are reported as deleted by the change feed'''
+
+        since = self.client.get("/task/changes").json()['next']
+        list(archive_completed())
+        data = self.client.get(f"/task/changes?since={since}").json()
+        self.assertEqual(sorted(data['deleted']), [task.id for task in self.tasks[::2]])
+        self.assertEqual(data['tasks'], [])
+
+    def testIncludeArchived(self):
+        '''listings only include the archived tasks when asked, in listing order'''
+
+        before = self.client.get("/task?guild=1").json()
+        list(archive_completed())
+        self.assertEqual(self.ids(self.client.get("/task?guild=1").json()), [task.id for task in self.tasks[1::2]])
+
+        for urls in ('discordbot.urls', 'discordbot.async_urls'):
+            with override_settings(ROOT_URLCONF=urls):
+                data = self.client.get("/task?guild=1&include_archived=true").json()
+                self.assertEqual(data, before, urls)
+                response = self.client.get("/task?guild=1&include_archived=true&stream=true")
+                self.assertEqual(self.streamed(response), before, urls)
+                data = self.client.get("/task", {"user": self.user.username, "include_archived": "true"}).json()
+                self.assertEqual(self.ids(data), [self.tasks[0].id], urls)
+
+    def testIncludeArchivedPages(self):
+        '''pages of listings with archived tasks follow on from each other'''
+
+        list(archive_completed())
+        for urls in ('discordbot.urls', 'discordbot.async_urls'):
+            with override_settings(ROOT_URLCONF=urls):
+                ids = []
+                url = "/task?include_archived=true&limit=2"
+                while url:
+                    data = self.client.get(url).json()
+                    ids += self.ids(data['results'])
+                    url = data['next']
+                self.assertEqual(ids, [task.id for task in self.tasks], urls)
+
+    def testIncludeArchivedWindow(self):
+        '''archived tasks due in a window are listed as completed'''
+
+        list(archive_completed())
+        data = self.client.get("/task?from=2023-03-02T00:00:00Z&to=2023-03-04T00:00:00Z&include_archived=true").json()
+        self.assertEqual(self.ids(data), [self.tasks[1].id, self.tasks[2].id])
+        self.assertEqual([task['completed'] for task in data], [False, True])
@@ -0,0 +1,107 @@
+import datetime
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.assignments import stale_assignees
+from bot8.models import Task, TaskAssignee, Users
+
+
+def at(day):
+    return datetime.datetime(2023, 3, day, 9, tzinfo=datetime.timezone.utc)
+
+
+class AssigneeIndexTests(APITestCase):
+    '''Tests for the due dates and guilds copied to the assignee rows'''
+
+    def setUp(self):
+        self.user = Users.objects.create(username="user1#1234")
+        self.tasks = [
+            Task.objects.create(title=f"Task {day}", guild=day % 2, due_date=at(day)) for day in range(1, 9)]
+        self.tasks.append(Task.objects.create(title="No due date", guild=1))
+        for task in self.tasks:
+            task.assignees.add(self.user)
+
+    def joined(self, guild=None):
+        '''the ids of the user's tasks in listing order, read from the tasks'''
+        queryset = Task.objects.filter(assignees=self.user)
+        if guild is not None:
+            queryset = queryset.filter(guild=guild)
+        return list(queryset.order_by(F('due_date').asc(nulls_last=True), 'id').values_list('id', flat=True))
+
+    def listed(self, query):
+        '''the ids of every page of the listing'''
+        ids = []
+        url = f"/task?{query}&limit=2"
+        while url:
+            data = self.client.get(url).json()
+            ids += [task['id'] for task in data['results']]
+            url = data['next']
+        return ids
+
+    def testCopiesOnEveryWrite(self):
+        '''assigning users and changing due dates keep the copies'''
+
+        other = Task.objects.create(title="Other", guild=5, due_date=at(20))
+        self.client.put(f"/assignees/{other.id}", data={"assignees": ["user2#1234"]})
+        self.client.put("/assignees", data={"tasks": [other.id], "assignees": ["user3#1234"]}, format='json')
+        self.client.post("/task/batch", data={"tasks": [
+            {"title": "Batch", "guild": 6, "due_date": at(21).isoformat(), "assignees": ["user2#1234"]}]}, format='json')
+        Users.objects.create(username="user4#1234").task.add(other)
+        self.assertEqual(TaskAssignee.objects.filter(guild__in=[5, 6], due_date__isnull=False).count(), 4)
+
+        self.client.post(f"/due-date/{self.tasks[0].id}", data={"due_date": at(30).isoformat()})
+        self.client.put("/task/batch", data={"tasks": [
+            {"id": self.tasks[1].id, "due_date": None}, {"id": other.id, "due_date": at(2).isoformat()}]}, format='json')
+        self.assertFalse(stale_assignees().exists())
+
+    def testCreateWithAssignees(self):
+        '''a task created with assignees has assignee rows with its due date and guild'''
+
+        response = self.client.post("/task", data={
+            "title": "New", "guild": 4, "due_date": at(12).isoformat(), "assignees": ["user1#1234"]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['assignees'], ["user1#1234"])
+        row = TaskAssignee.objects.get(task_id=response.json()['id'])
+        self.assertEqual((row.users_id, row.due_date, row.guild), ("user1#1234", at(12), 4))
+        self.assertEqual(self.listed("user=user1#1234&guild=4"), [response.json()['id']])
+
+        response = self.client.post("/task", data={"title": "New", "assignees": ["nobody#1"]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testUserListing(self):
+        '''listings of a user are in the same order as the tasks, page after page'''
+
+        self.client.put("/task/batch", data={"tasks": [
+            {"id": self.tasks[0].id, "due_date": at(5).isoformat()},
+            {"id": self.tasks[7].id, "due_date": None}]}, format='json')
+        self.assertEqual([task['id'] for task in self.client.get("/task?user=user1#1234").json()], self.joined())
+        self.assertEqual(self.listed("user=user1#1234"), self.joined())
+        self.assertEqual(self.listed("user=user1#1234&guild=1"), self.joined(1))
+
+    def testCheckCommand(self):
+        '''checkassignees reports the rows a queryset update left stale and fixes them'''
+
+        out = StringIO()
+        call_command('checkassignees', stdout=out)
+        self.assertIn('match', out.getvalue())
+
+        Task.objects.filter(id__in=[self.tasks[0].id, self.tasks[1].id]).update(due_date=at(28), guild=3)
+        with self.assertRaisesMessage(CommandError, '2 assignee rows are stale'):
+            call_command('checkassignees', stdout=StringIO())
+
+        revision = self.client.get("/task?guild=3")['ETag']
+        call_command('checkassignees', '--fix', stdout=out)
+        self.assertIn('Fixed 2 stale assignee rows', out.getvalue())
+        self.assertFalse(stale_assignees().exists())
+        self.assertEqual(self.listed("user=user1#1234&guild=3"), [self.tasks[0].id, self.tasks[1].id])
+        self.assertNotEqual(self.client.get("/task?guild=3")['ETag'], revision)
+
+    def testDeletedTask(self):
+        '''the assignee rows are deleted with their task'''
+
+        response = self.client.delete(f"/task/{self.tasks[0].id}")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(TaskAssignee.objects.filter(users=self.user).count(), len(self.tasks) - 1)
@@ -0,0 +1,180 @@
+import json
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.cache import task_list_cache
+from bot8.models import Task, TaskChange, Users
+
+
+class AsyncViewTests(APITestCase):
+    '''Tests for the async views served under ASGI'''
+
+    def setUp(self):
+        # overridden per test since class level overrides
+        # rely on class cleanups, which nose doesn't run
+        async_urls = override_settings(ROOT_URLCONF='discordbot.async_urls')
+        async_urls.enable()
+        self.addCleanup(async_urls.disable)
+
+        self.user = Users.objects.create(username="user#1")
+        self.task_1 = Task.objects.create(title="Task 1", due_date="2023-03-25T14:30:00Z", guild=1)
+        self.task_2 = Task.objects.create(title="Task 2", guild=1)
+        self.task_3 = Task.objects.create(title="Task 3", due_date="2023-03-21T14:30:00Z", guild=2)
+        self.task_1.assignees.add(self.user)
+
+    def assertSameAsSync(self, method, path, **kwargs):
+        '''the async view should return the same response as the sync view'''
+        with override_settings(ROOT_URLCONF='discordbot.urls'):
+            expected = getattr(self.client, method)(path, **kwargs)
+        response = getattr(self.client, method)(path, **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    def testListingCache(self):
+        '''listings are read through the task listing cache and writes invalidate them'''
+
+        caches['tasks'].clear()
+        task_list_cache.reset_stats()
+        with self.settings(TASK_LIST_CACHE=True):
+            for _ in range(2):
+                self.assertEqual([task['title'] for task in self.client.get('/task?guild=1').json()], ["Task 1", "Task 2"])
+            self.assertEqual(task_list_cache.stats(), {'enabled': True, 'hits': 1, 'misses': 1})
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/task', data={'title': 'Task 4', 'guild': 1})
+            self.assertEqual(len(self.client.get('/task?guild=1').json()), 3)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(f'/assignees/{self.task_2.id}', data={'assignees': ['user#2']}, format='json')
+                self.client.delete(f'/task/{self.task_1.id}')
+            self.assertEqual(
+                [task['assignees'] for task in self.client.get('/task?guild=1').json()], [['user#2'], []])
+            self.client.get('/task?guild=1&stream=true')
+            self.assertEqual(task_list_cache.stats(), {'enabled': True, 'hits': 1, 'misses': 3})
+
+    def testMalformedBody(self):
+        '''a body that isn't valid json is a 400 like in the sync views'''
+
+        for path in ('/task', f'/due-date/{self.task_1.id}'):
+            response = self.assertSameAsSync('post', path, data='{"title": ', content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+
+    def testListMatchesSync(self):
+        '''listing tasks gives the same result as the sync view'''
+
+        response = self.assertSameAsSync('get', '/task')
+        self.assertEqual([task['title'] for task in response.json()], ["Task 3", "Task 1", "Task 2"])
+        self.assertSameAsSync('get', '/task?user=user#1')
+        self.assertSameAsSync('get', '/task?guild=1')
+        self.assertSameAsSync('get', '/task?limit=2')
+
+    def testStreamMatchesList(self):
+        '''a streamed listing has the same content as the normal listing'''
+
+        async def read(response):
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        response = self.client.get('/task?stream=true')
+        streamed = json.loads(async_to_sync(read)(response))
+        self.assertEqual(streamed, self.client.get('/task').json())
+
+    def testPagination(self):
+        '''following the next links visits every task'''
+
+        titles = []
+        url = '/task?limit=1'
+        while url:
+            data = self.client.get(url).json()
+            titles += [task['title'] for task in data['results']]
+            url = data['next']
+        self.assertEqual(titles, ["Task 3", "Task 1", "Task 2"])
+
+    def testCreateTask(self):
+        '''creating a task returns it with a 201'''
+
+        response = self.client.post('/task', data={"title": "New Task", "guild": 3})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['title'], "New Task")
+        self.assertEqual(Task.objects.get(id=response.json()['id']).guild, 3)
+
+        response = self.client.post('/task', data={})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testCreateWithAssignees(self):
+        '''a task created with assignees has assignee rows with its due date and guild'''
+
+        response = self.client.post('/task', data={
+            "title": "New Task", "guild": 3, "due_date": "2023-03-26T14:30:00Z", "assignees": ["user#1"]},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['assignees'], ["user#1"])
+        self.assertEqual(
+            list(self.user.assignments.filter(task_id=response.json()['id']).values_list('guild', flat=True)), [3])
+        listed = self.client.get('/task', {'user': 'user#1', 'guild': 3}).json()
+        self.assertEqual([task['id'] for task in listed], [response.json()['id']])
+
+    def testDetail(self):
+        '''getting and deleting a single task'''
+
+        self.assertSameAsSync('get', f'/task/{self.task_1.id}')
+        self.assertSameAsSync('get', '/task/999')
+        response = self.client.delete(f'/task/{self.task_2.id}')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Task.objects.filter(id=self.task_2.id).exists())
+
+    def testDueDate(self):
+        '''setting and getting a due date'''
+
+        response = self.client.post(f'/due-date/{self.task_2.id}', data={"due_date": "2023-10-25T14:30:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertSameAsSync('get', f'/due-date/{self.task_2.id}')
+        self.assertEqual(self.client.get(f'/due-date/{self.task_2.id}').json(), '2023-10-25 14:30')
+        response = self.client.post('/due-date/999', data={"due_date": "2023-10-25T14:30:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testAssignUsers(self):
+        '''assigning users, assigning a duplicate user returns an error'''
+
+        response = self.client.put(f'/assignees/{self.task_2.id}', data={"assignees": ["user#1", "user#2"]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.task_2.assignees.count(), 2)
+
+        response = self.client.put(f'/assignees/{self.task_2.id}', data={"assignees": ["user#2"]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), "User(s) ['user#2'] are already assigned to this task")
+
+    def testReminder(self):
+        '''setting a reminder'''
+
+        response = self.client.put(f'/reminder/{self.task_1.id}', data={"reminder": "2023-03-26T14:40:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.task_1.refresh_from_db()
+        self.assertEqual(str(self.task_1.reminder), "2023-03-26 14:40:00+00:00")
+        response = self.client.put('/reminder/999', data={"reminder": "2023-03-26T14:40:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testETags(self):
+        '''the async views send the same ETags as the sync views and honour them'''
+
+        for url in ('/task?guild=1', f'/task/{self.task_1.id}', f'/due-date/{self.task_1.id}'):
+            etag = self.client.get(url)['ETag']
+            with override_settings(ROOT_URLCONF='discordbot.urls'):
+                self.assertEqual(self.client.get(url)['ETag'], etag)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = self.client.get('/task?guild=1')['ETag']
+        self.client.post(f'/due-date/{self.task_2.id}', data={"due_date": "2023-10-25T14:30:00Z"})
+        self.assertNotEqual(self.client.get('/task?guild=1')['ETag'], etag)
+
+    def testWritesAreLogged(self):
+        '''the async write paths append to the change log'''
+
+        response = self.client.post('/task', data={"title": "New Task", "guild": 3})
+        self.client.post(f'/due-date/{self.task_2.id}', data={"due_date": "2023-10-25T14:30:00Z"})
+        self.client.delete(f'/task/{self.task_2.id}')
+        changes = list(TaskChange.objects.order_by('seq').values_list('task_id', 'op'))
+        self.assertEqual(changes, [
+            (response.json()['id'], 'create'), (self.task_2.id, 'update'), (self.task_2.id, 'delete')])
@@ -0,0 +1,141 @@
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.cache import task_list_cache
+from bot8.models import Task
+
+
+class TaskListCacheTests(APITestCase):
+    '''Tests for the per guild task listing cache'''
+
+    def setUp(self):
+        # overridden per test since class level overrides
+        # rely on class cleanups, which nose doesn't run
+        cache_on = override_settings(TASK_LIST_CACHE=True)
+        cache_on.enable()
+        self.addCleanup(cache_on.disable)
+        caches['tasks'].clear()
+        task_list_cache.reset_stats()
+
+        self.task_1 = Task.objects.create(title="Task 1", guild=1)
+        self.task_2 = Task.objects.create(title="Task 2", guild=2)
+
+    def titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [task['title'] for task in response.json()]
+
+    def write(self, method, url, **kwargs):
+        '''send a write request and run its on commit callbacks'''
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertIn(response.status_code, (status.HTTP_200_OK, status.HTTP_201_CREATED, status.HTTP_204_NO_CONTENT))
+        return response
+
+    def testRepeatedListingIsHit(self):
+        '''listing the same guild twice is served from the cache the second time'''
+
+        self.assertEqual(self.titles("/task?guild=1"), ["Task 1"])
+        self.assertEqual(self.titles("/task?guild=1"), ["Task 1"])
+        self.assertEqual(task_list_cache.stats(), {'enabled': True, 'hits': 1, 'misses': 1})
+
+    def testDisabled(self):
+        '''nothing is cached when the cache is off'''
+
+        with self.settings(TASK_LIST_CACHE=False):
+            self.client.get("/task?guild=1")
+            self.client.get("/task?guild=1")
+        self.assertEqual(task_list_cache.stats()['misses'], 0)
+
+    def testWriteToOtherGuildKeepsEntry(self):
+        '''writing to a guild does not invalidate the listings of other guilds'''
+
+        self.titles("/task?guild=1")
+        self.titles("/task")
+        self.write('post', f"/due-date/{self.task_2.id}", data={"due_date": "2023-10-25T14:30:00Z"})
+        self.titles("/task?guild=1")
+        self.titles("/task")
+        self.assertEqual(task_list_cache.stats()['hits'], 1)
+        self.assertEqual(task_list_cache.stats()['misses'], 3)
+
+    def testEvictedVersionIsNotStale(self):
+        '''losing the version token of a guild doesn't bring back old listings'''
+
+        self.titles("/task?guild=1")
+        caches['tasks'].delete(task_list_cache.version_key('1'))
+        Task.objects.create(title="Task 3", guild=1)
+        self.assertEqual(self.titles("/task?guild=1"), ["Task 1", "Task 3"])
+
+    def testCreateInvalidates(self):
+        '''creating a task invalidates the listings of its guild'''
+
+        self.titles("/task?guild=1")
+        self.write('post', "/task", data={"title": "Task 3", "guild": 1})
+        self.assertEqual(self.titles("/task?guild=1"), ["Task 1", "Task 3"])
+
+    def testGuildSpellingsInvalidate(self):
+        '''a guild written as "01" or "+1" is cached and invalidated as guild 1'''
+
+        for url in ("/task?guild=01", "/task?guild=%2B1"):
+            self.titles(url)
+        self.write('post', "/task", data={"title": "Task 3", "guild": 1})
+        for url in ("/task?guild=01", "/task?guild=%2B1"):
+            self.assertEqual(self.titles(url), ["Task 1", "Task 3"])
+        self.assertEqual(task_list_cache.stats()['hits'], 0)
+
+    def testInvalidGuildIsNotCached(self):
+        '''a guild that isn't an integer skips the cache'''
+
+        self.assertIsNone(task_list_cache.key('one', 'http://testserver/task?guild=one'))
+        self.assertEqual(task_list_cache.key('01', 'http://testserver/task'), task_list_cache.key('1', 'http://testserver/task'))
+
+    def testBatchCreateInvalidates(self):
+        '''creating tasks in a batch invalidates the listings of their guilds'''
+
+        self.titles("/task?guild=1")
+        self.write('post', "/task/batch", data={"tasks": [{"title": "Task 3", "guild": 1}]}, format='json')
+        self.assertEqual(self.titles("/task?guild=1"), ["Task 1", "Task 3"])
+
+    def testDeleteInvalidates(self):
+        '''deleting a task invalidates the listings of its guild'''
+
+        self.titles("/task")
+        self.write('delete', f"/task/{self.task_1.id}")
+        self.assertEqual(self.titles("/task"), ["Task 2"])
+
+    def testDueDateInvalidates(self):
+        '''setting a due date invalidates the listings of the guild'''
+
+        self.titles("/task")
+        self.write('post', f"/due-date/{self.task_2.id}", data={"due_date": "2023-10-25T14:30:00Z"})
+        self.assertEqual(self.titles("/task"), ["Task 2", "Task 1"])
+
+    def testReminderInvalidates(self):
+        '''setting a reminder invalidates the listings of the guild'''
+
+        self.client.get("/task?guild=1")
+        self.write('put', f"/reminder/{self.task_1.id}", data={"reminder": "2023-03-26T14:40:00Z"})
+        response = self.client.get("/task?guild=1")
+        self.assertEqual(response.json()[0]['reminder'], "2023-03-26T14:40:00Z")
+
+    def testAssignInvalidates(self):
+        '''assigning users invalidates the listings of the guild'''
+
+        self.titles("/task?user=user#1")
+        self.write('put', f"/assignees/{self.task_1.id}", data={"assignees": ["user#1"]})
+        self.assertEqual(self.titles("/task?user=user#1"), ["Task 1"])
+
+    def testBulkAssignInvalidates(self):
+        '''assigning users to many tasks invalidates the listings of their guilds'''
+
+        self.titles("/task?guild=2&user=user#1")
+        self.write('put', "/assignees", data={"tasks": [self.task_2.id], "assignees": ["user#1"]}, format='json')
+        self.assertEqual(self.titles("/task?guild=2&user=user#1"), ["Task 2"])
+
+    def testStatsEndpoint(self):
+        '''the counters are exposed by /task/cache'''
+
+        self.client.get("/task")
+        response = self.client.get("/task/cache")
+        self.assertEqual(response.data, {'enabled': True, 'hits': 0, 'misses': 1})
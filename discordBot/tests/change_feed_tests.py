@@ -0,0 +1,82 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task, TaskChange
+
+
+class ChangeFeedTests(APITestCase):
+    '''Tests for the task change log and /task/changes'''
+
+    def setUp(self):
+        self.task_1 = self.create("Task 1", 1)
+        self.task_2 = self.create("Task 2", 2)
+
+    def create(self, title, guild):
+        response = self.client.post("/task", data={"title": title, "guild": guild})
+        return Task.objects.get(id=response.data['id'])
+
+    def changes(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def testEveryWriteIsLogged(self):
+        '''every write path appends to the log'''
+
+        self.client.post(f"/due-date/{self.task_1.id}", data={"due_date": "2023-10-25T14:30:00Z"})
+        self.client.put(f"/reminder/{self.task_1.id}", data={"reminder": "2023-03-26T14:40:00Z"})
+        self.client.put(f"/assignees/{self.task_1.id}", data={"assignees": ["user#1"]})
+        self.client.put("/assignees", data={"tasks": [self.task_2.id], "assignees": ["user#1"]}, format='json')
+        self.client.post("/task/batch", data={"tasks": [{"title": "Task 3"}]}, format='json')
+        self.client.delete(f"/task/{self.task_2.id}")
+
+        ops = list(TaskChange.objects.order_by('seq').values_list('op', flat=True))
+        self.assertEqual(ops, ['create', 'create', 'update', 'update', 'assign', 'assign', 'create', 'delete'])
+
+    def testStartReturnsLatestSeq(self):
+        '''without since only the current sequence number is returned'''
+
+        data = self.changes("/task/changes")
+        self.assertEqual(data['next'], TaskChange.objects.latest('seq').seq)
+        self.assertEqual(data['tasks'], [])
+
+    def testOnlyChangesSinceAreReturned(self):
+        '''changes before since are not returned, every task is returned once'''
+
+        since = self.changes("/task/changes")['next']
+        self.client.post(f"/due-date/{self.task_1.id}", data={"due_date": "2023-10-25T14:30:00Z"})
+        self.client.put(f"/assignees/{self.task_1.id}", data={"assignees": ["user#1"]})
+
+        data = self.changes(f"/task/changes?since={since}")
+        self.assertEqual([task['id'] for task in data['tasks']], [self.task_1.id])
+        self.assertEqual(data['tasks'][0]['assignees'], ["user#1"])
+        self.assertEqual(data['deleted'], [])
+        self.assertFalse(data['more'])
+
+        self.assertEqual(self.changes(f"/task/changes?since={data['next']}")['tasks'], [])
+
+    def testDeletedTasks(self):
+        '''deleted tasks are returned as ids, even if they were changed first'''
+
+        since = self.changes("/task/changes")['next']
+        self.client.post(f"/due-date/{self.task_1.id}", data={"due_date": "2023-10-25T14:30:00Z"})
+        self.client.delete(f"/task/{self.task_1.id}")
+        data = self.changes(f"/task/changes?since={since}")
+        self.assertEqual(data['tasks'], [])
+        self.assertEqual(data['deleted'], [self.task_1.id])
+
+    def testGuildAndLimit(self):
+        '''changes can be read for one guild and a few at a time'''
+
+        task_3 = self.create("Task 3", 1)
+        data = self.changes("/task/changes?since=0&guild=1&limit=1")
+        self.assertEqual([task['id'] for task in data['tasks']], [self.task_1.id])
+        self.assertTrue(data['more'])
+
+        data = self.changes(f"/task/changes?since={data['next']}&guild=1&limit=1")
+        self.assertEqual([task['id'] for task in data['tasks']], [task_3.id])
+
+    def testInvalidParameters(self):
+        '''since and limit have to be numbers'''
+
+        for url in ("/task/changes?since=abc", "/task/changes?since=0&limit=0", "/task/changes?since=-1"):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
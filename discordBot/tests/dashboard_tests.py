@@ -0,0 +1,69 @@
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task, Users
+
+
+class TaskDashboardTests(APITestCase):
+    '''Tests for the tasks of a user across guilds'''
+
+    def setUp(self):
+        now = timezone.now()
+        self.user = Users.objects.create(username="user#1")
+        other = Users.objects.create(username="user#2")
+        tasks = [
+            Task.objects.create(title="overdue", guild=1, due_date=now - timedelta(days=1)),
+            Task.objects.create(title="soon", guild=1, due_date=now + timedelta(hours=2)),
+            Task.objects.create(title="later", guild=1, due_date=now + timedelta(days=3)),
+            Task.objects.create(title="no due date", guild=2),
+        ]
+        for task in tasks:
+            task.assignees.add(self.user)
+        Task.objects.create(title="not assigned", guild=1).assignees.add(other)
+
+    def testGroupedByGuild(self):
+        '''tasks are grouped by guild with the counts of every guild'''
+
+        with self.assertNumQueries(3):
+            response = self.client.get("/task/dashboard?user=user#1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        guilds = response.data['guilds']
+        self.assertEqual([guild['guild'] for guild in guilds], [1, 2])
+        self.assertEqual(guilds[0]['counts'], {'total': 3, 'overdue': 1, 'due_soon': 1, 'no_due_date': 0})
+        self.assertEqual(guilds[1]['counts'], {'total': 1, 'overdue': 0, 'due_soon': 0, 'no_due_date': 1})
+        self.assertEqual([task['title'] for task in guilds[0]['tasks']], ["overdue", "soon", "later"])
+
+    def testSoonAndLimit(self):
+        '''the due soon window and the number of tasks per guild can be set'''
+
+        response = self.client.get("/task/dashboard?user=user#1&soon=96&limit=1")
+        guilds = response.data['guilds']
+        self.assertEqual(guilds[0]['counts']['due_soon'], 2)
+        self.assertEqual(guilds[0]['counts']['total'], 3)
+        self.assertEqual([task['title'] for task in guilds[0]['tasks']], ["overdue"])
+        self.assertEqual([task['title'] for task in guilds[1]['tasks']], ["no due date"])
+
+    def testCompletedTasksAreNotDue(self):
+        '''completed tasks are listed and counted in the total but aren't overdue or due soon'''
+
+        for task in Task.objects.filter(title__in=["overdue", "soon"]):
+            self.assertEqual(self.client.put(f"/task/{task.id}/complete").status_code, status.HTTP_200_OK)
+        guilds = self.client.get("/task/dashboard?user=user#1").data['guilds']
+        self.assertEqual(guilds[0]['counts'], {'total': 3, 'overdue': 0, 'due_soon': 0, 'no_due_date': 0})
+        self.assertEqual(len(guilds[0]['tasks']), 3)
+
+    def testRecurringTasksAreNotDue(self):
+        '''recurring tasks started in the past or starting soon aren't overdue or due soon'''
+
+        Task.objects.filter(title__in=["overdue", "soon"]).update(recurrence="FREQ=DAILY")
+        guilds = self.client.get("/task/dashboard?user=user#1").data['guilds']
+        self.assertEqual(guilds[0]['counts'], {'total': 3, 'overdue': 0, 'due_soon': 0, 'no_due_date': 0})
+        self.assertEqual(len(guilds[0]['tasks']), 3)
+
+    def testInvalidParameters(self):
+        '''the user is required and soon and limit have to be numbers'''
+
+        for url in ("/task/dashboard", "/task/dashboard?user=user#1&soon=abc", "/task/dashboard?user=user#1&limit=-1"):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get("/task/dashboard?user=nobody").data['guilds'], [])
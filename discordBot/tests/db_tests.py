@@ -0,0 +1,29 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from bot8.db import apply_sqlite_pragmas
+
+
+class SqlitePragmaTests(TestCase):
+    '''Tests for the pragmas set on new sqlite connections'''
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def testPragmasAreApplied(self):
+        '''the SQLITE_PRAGMAS setting is applied to the connection'''
+
+        previous = self.pragma('cache_size')
+        with override_settings(SQLITE_PRAGMAS={'cache_size': -4321}):
+            apply_sqlite_pragmas(None, connection)
+            self.assertEqual(self.pragma('cache_size'), -4321)
+        with override_settings(SQLITE_PRAGMAS={'cache_size': previous}):
+            apply_sqlite_pragmas(None, connection)
+        self.assertEqual(self.pragma('cache_size'), previous)
+
+    def testNoPragmasByDefault(self):
+        '''nothing is run when the setting is missing'''
+
+        with self.assertNumQueries(0):
+            apply_sqlite_pragmas(None, connection)
@@ -0,0 +1,151 @@
+import datetime
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8 import digest
+from bot8.archive import archive_completed
+from bot8.models import GuildDigest, Task
+
+
+class DigestTests(APITestCase):
+    '''Tests for GET /task/digest and the trigger kept summary'''
+
+    def setUp(self):
+        self.bounds = digest.day_bounds()
+        today, tomorrow, week_end = self.bounds
+        hour = datetime.timedelta(hours=1)
+        self.due = {
+            'overdue': today - 30 * hour,
+            'today': today + hour,
+            'week': tomorrow + 2 * hour,
+            'later': week_end + hour,
+        }
+        self.tasks = {bucket: Task.objects.create(title=bucket, guild=1, due_date=due) for bucket, due in self.due.items()}
+        Task.objects.create(title="Later too", guild=1, due_date=week_end + 2 * hour)
+        Task.objects.create(title="No due date", guild=1)
+        Task.objects.create(title="Done", guild=1, due_date=today + hour, completed_at=today)
+        Task.objects.create(title="Other guild", guild=2, due_date=today - hour)
+
+    def enable_summary(self):
+        o = override_settings(TASK_DIGEST_SUMMARY=True)
+        o.enable()
+        self.addCleanup(o.disable)
+        digest.install(connection)
+
+    def counts(self, guilds=(1, 2, 3)):
+        return digest.task_counts(list(guilds), self.bounds)
+
+    def summary(self, guilds=(1, 2, 3)):
+        '''the counts stored in the summary rows'''
+        return {
+            row['guild']: {bucket: row[bucket] for bucket in digest.BUCKETS if row[bucket]}
+            for row in GuildDigest.objects.filter(guild__in=guilds).values()
+            if any(row[bucket] for bucket in digest.BUCKETS)}
+
+    def testDigest(self):
+        '''every guild gets its counts and first tasks per bucket'''
+
+        response = self.client.get("/task/digest?guilds=1,2,3&limit=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['date'], self.bounds[0].date().isoformat())
+        self.assertEqual([guild['guild'] for guild in data['guilds']], [1, 2, 3])
+
+        guild = data['guilds'][0]
+        self.assertEqual(guild['counts'], {"overdue": 1, "today": 1, "week": 1, "later": 2})
+        self.assertEqual(
+            {bucket: [task['id'] for task in tasks] for bucket, tasks in guild['tasks'].items()},
+            {bucket: [task.id for task in [self.tasks[bucket]]] for bucket in digest.BUCKETS})
+        self.assertEqual(data['guilds'][1]['counts'], {"overdue": 1, "today": 0, "week": 0, "later": 0})
+        self.assertEqual(data['guilds'][2]['counts'], {"overdue": 0, "today": 0, "week": 0, "later": 0})
+
+    def testCountsOnly(self):
+        '''a limit of 0 only counts'''
+
+        data = self.client.get("/task/digest?guilds=1&limit=0").json()
+        self.assertEqual(data['guilds'][0]['tasks'], {bucket: [] for bucket in digest.BUCKETS})
+
+    def testInvalid(self):
+        '''guilds are required and the limit is bounded'''
+
+        for query in ("", "?guilds=", "?guilds=a", "?guilds=1&limit=51", "?guilds=1&limit=-1"):
+            self.assertEqual(self.client.get(f"/task/digest{query}").status_code, status.HTTP_400_BAD_REQUEST, query)
+
+    def testSummaryRows(self):
+        '''the summary rows are counted the first time they are read'''
+
+        self.enable_summary()
+        self.assertFalse(GuildDigest.objects.exists())
+        self.assertEqual(digest.summary_counts([1, 2, 3], self.bounds), self.counts())
+        self.assertEqual(GuildDigest.objects.count(), 3)
+        self.assertEqual(self.summary(), self.counts())
+
+    def testSummaryFollowsWrites(self):
+        '''the triggers count every kind of write'''
+
+        self.enable_summary()
+        digest.summary_counts([1, 2, 3], self.bounds)
+        Task.objects.bulk_create([Task(title=f"Bulk {i}", guild=3, due_date=self.due['week']) for i in range(3)])
+        self.client.post("/task", data={"title": "Created", "guild": 2, "due_date": self.due['today'].isoformat()})
+        self.client.post(f"/due-date/{self.tasks['later'].id}", data={"due_date": self.due['overdue'].isoformat()})
+        self.client.put(f"/task/{self.tasks['today'].id}/complete")
+        self.client.delete(f"/task/{self.tasks['week'].id}")
+        Task.objects.filter(id=self.tasks['overdue'].id).update(guild=3)
+        self.assertEqual(self.summary(), self.counts())
+
+        self.client.delete(f"/task/{self.tasks['today'].id}/complete")
+        Task.objects.filter(guild=3).update(due_date=None)
+        self.assertEqual(self.summary(), self.counts())
+
+        # archived tasks were completed, they aren't counted
+        Task.objects.filter(guild=1).update(completed_at=self.bounds[0] - datetime.timedelta(days=60))
+        list(archive_completed())
+        self.assertEqual(self.summary(), self.counts())
+        self.assertNotIn(1, self.summary())
+
+    def testRecurringTasks(self):
+        '''recurring tasks are left out of the digest and the summary, whenever their rule started'''
+
+        expected = self.client.get("/task/digest?guilds=1,2&limit=5").json()
+        started = self.bounds[0] - datetime.timedelta(days=60)
+        standup = Task.objects.create(title="Standup", guild=1, due_date=started, recurrence="FREQ=DAILY")
+        self.assertEqual(self.client.get("/task/digest?guilds=1,2&limit=5").json(), expected)
+
+        self.enable_summary()
+        self.assertEqual(self.client.get("/task/digest?guilds=1,2&limit=5").json(), expected)
+        Task.objects.create(title="Review", guild=2, due_date=self.due['today'], recurrence="FREQ=WEEKLY")
+        Task.objects.filter(id=self.tasks['week'].id).update(recurrence="FREQ=WEEKLY")
+        self.assertEqual(self.summary(), self.counts())
+        Task.objects.filter(id__in=[standup.id, self.tasks['week'].id]).update(recurrence=None)
+        self.assertEqual(self.summary(), self.counts())
+        self.assertEqual(self.summary()[1]['overdue'], 2)
+
+    def testSummaryOfAnotherDay(self):
+        '''rows counted for another day are counted again'''
+
+        self.enable_summary()
+        yesterday = digest.day_bounds(self.bounds[0] - datetime.timedelta(hours=12))
+        digest.summary_counts([1, 2, 3], yesterday)
+        self.assertEqual(self.summary(), digest.task_counts([1, 2, 3], yesterday))
+        self.assertEqual(digest.summary_counts([1, 2, 3], self.bounds), self.counts())
+        self.assertEqual(self.summary(), self.counts())
+
+    def testDigestFromSummary(self):
+        '''the digest is the same with the summary'''
+
+        expected = self.client.get("/task/digest?guilds=1,2&limit=0").json()
+        self.enable_summary()
+        self.assertEqual(self.client.get("/task/digest?guilds=1,2&limit=0").json(), expected)
+        self.assertEqual(self.client.get("/task/digest?guilds=1,2&limit=0").json(), expected)
+
+    def testUninstall(self):
+        '''uninstalling drops the triggers and empties the summary'''
+
+        self.enable_summary()
+        digest.summary_counts([1], self.bounds)
+        digest.uninstall(connection)
+        self.assertFalse(GuildDigest.objects.exists())
+        GuildDigest.objects.create(guild=1, day_start=self.bounds[0], day_end=self.bounds[1], week_end=self.bounds[2])
+        Task.objects.create(title="Not counted", guild=1, due_date=self.due['today'])
+        self.assertEqual(self.summary(), {})
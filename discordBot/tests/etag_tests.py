@@ -0,0 +1,89 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task
+
+
+class ETagTests(APITestCase):
+    '''Tests for conditional GET requests on tasks, listings and due dates'''
+
+    def setUp(self):
+        self.task_1 = Task.objects.create(title="Task 1", due_date="2023-03-25T14:30:00Z", guild=1)
+        self.task_2 = Task.objects.create(title="Task 2", guild=2)
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def testListNotModified(self):
+        '''a listing sent with its ETag returns a 304 without reading tasks'''
+
+        etag = self.client.get("/task?guild=1")['ETag']
+        with self.assertNumQueries(1):
+            self.assertNotModified("/task?guild=1", etag)
+
+    def testListQueriesHaveOwnETags(self):
+        '''listings with different parameters don't share ETags'''
+
+        etag = self.client.get("/task?guild=1")['ETag']
+        self.assertNotEqual(self.client.get("/task?guild=1&limit=1")['ETag'], etag)
+
+    def testListWritesChangeETag(self):
+        '''every write to a guild changes the ETags of its listings'''
+
+        writes = [
+            lambda: self.client.post("/task", data={"title": "Task 3", "guild": 1}),
+            lambda: self.client.post(f"/due-date/{self.task_1.id}", data={"due_date": "2023-10-25T14:30:00Z"}),
+            lambda: self.client.put(f"/reminder/{self.task_1.id}", data={"reminder": "2023-03-26T14:40:00Z"}),
+            lambda: self.client.put(f"/assignees/{self.task_1.id}", data={"assignees": ["user#1"]}),
+            lambda: self.client.put("/assignees", data={"tasks": [self.task_1.id], "assignees": ["user#2"]}, format='json'),
+            lambda: self.client.post("/task/batch", data={"tasks": [{"title": "Task 4", "guild": 1}]}, format='json'),
+            lambda: self.client.delete(f"/task/{self.task_1.id}"),
+        ]
+        for write in writes:
+            etags = [self.client.get(url)['ETag'] for url in ("/task?guild=1", "/task")]
+            write()
+            self.assertModified("/task?guild=1", etags[0])
+            self.assertModified("/task", etags[1])
+
+    def testOtherGuildKeepsETag(self):
+        '''a write to one guild doesn't change the listings of another'''
+
+        etag = self.client.get("/task?guild=2")['ETag']
+        self.client.post(f"/due-date/{self.task_1.id}", data={"due_date": "2023-10-25T14:30:00Z"})
+        self.assertNotModified("/task?guild=2", etag)
+
+    def testDetailNotModified(self):
+        '''a task sent with its ETag returns a 304 until the task changes'''
+
+        url = f"/task/{self.task_1.id}"
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertNotModified(url, etag)
+
+        self.client.put(f"/assignees/{self.task_1.id}", data={"assignees": ["user#1"]})
+        response = self.assertModified(url, etag)
+        self.assertEqual(response.data['assignees'], ["user#1"])
+
+    def testDueDateNotModified(self):
+        '''a due date sent with its ETag returns a 304 until it changes'''
+
+        url = f"/due-date/{self.task_1.id}"
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+
+        self.client.post(url, data={"due_date": "2023-10-25T14:30:00Z"})
+        response = self.assertModified(url, etag)
+        self.assertEqual(response.data, "2023-10-25 14:30")
+
+    def testRevisionIsNotSerialized(self):
+        '''the revision is only sent in the ETag'''
+
+        response = self.client.get(f"/task/{self.task_1.id}")
+        self.assertNotIn('revision', response.data)
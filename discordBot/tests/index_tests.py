@@ -0,0 +1,53 @@
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+from bot8.models import Task, Users
+from bot8.views import list_tasks
+
+
+class IndexUsageTests(TestCase):
+    '''
+    Check with EXPLAIN that the planner uses the task indexes
+    for the main access paths (SQLite and PostgreSQL)
+    '''
+
+    def setUp(self):
+        user = Users.objects.create(username='user#1')
+        for i in range(20):
+            task = Task.objects.create(title=f'Task {i}', guild=i % 4, reminder=timezone.now())
+            task.assignees.add(user)
+
+        if connection.vendor == 'postgresql':
+            # the test tables are tiny so make sequential scans
+            # unattractive instead of relying on table statistics
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'EXPLAIN output of {connection.vendor} is not checked')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def testGuildListingUsesIndex(self):
+        '''listing a guild's tasks by due date uses the guild/due date index'''
+
+        queryset = Task.objects.filter(guild=1).order_by(F('due_date').asc(nulls_last=True), 'id')
+        self.assertUsesIndex(queryset, 'task_guild_due_date_idx')
+
+    def testReminderScanUsesIndex(self):
+        '''finding due reminders uses the reminder index'''
+
+        queryset = Task.objects.filter(reminder__lte=timezone.now())
+        self.assertUsesIndex(queryset, 'task_reminder_idx')
+
+    def testUserListingUsesIndex(self):
+        '''listing a user's tasks uses the user/due date index on the assignees table'''
+
+        self.assertUsesIndex(list_tasks('user#1'), 'taskassignee_user_due_idx')
+
+    def testUserGuildListingUsesIndex(self):
+        '''listing a user's tasks in a guild uses the user/guild/due date index on the assignees table'''
+
+        self.assertUsesIndex(list_tasks('user#1', 1), 'taskassignee_user_guild_idx')
@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import urllib.error
+import urllib.request
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'serve needs os.fork')
+class PreforkTests(SimpleTestCase):
+    '''Tests for manage.py serve, run in a subprocess on its own database'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.env = dict(
+            os.environ, DJANGO_SETTINGS_MODULE='discordbot.production_settings',
+            BOT8_SQLITE_PATH=os.path.join(cls.directory, 'db.sqlite3'), DJANGO_ALLOWED_HOSTS='127.0.0.1')
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+        subprocess.run([sys.executable, manage, 'migrate', '-v', '0'], env=cls.env, check=True)
+        cls.port, cls.health_port = free_port(), free_port()
+        cls.server = subprocess.Popen(
+            [sys.executable, manage, 'serve', '--port', str(cls.port), '--workers', '2',
+             '--health-port', str(cls.health_port)],
+            env=cls.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        cls.waitFor(lambda health: health['healthy'])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.send_signal(signal.SIGTERM)
+        try:
+            cls.server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            cls.server.kill()
+            cls.server.wait()
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    @classmethod
+    def health(cls):
+        try:
+            response = urllib.request.urlopen(f'http://127.0.0.1:{cls.health_port}/health', timeout=5)
+        except urllib.error.HTTPError as e:
+            response = e
+        except OSError:
+            return None
+        return json.load(response)
+
+    @classmethod
+    def waitFor(cls, condition, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            health = cls.health()
+            if health is not None and condition(health):
+                return health
+            time.sleep(0.2)
+        raise AssertionError(f'server not ready: {cls.health()}')
+
+    def get(self, path):
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.port}{path}', timeout=10) as response:
+            return response.status, json.load(response)
+
+    def testServes(self):
+        '''the workers serve requests with their own database connections and report their health'''
+
+        for _ in range(6):
+            self.assertEqual(self.get('/task'), (200, []))
+        health = self.waitFor(lambda health: sum(worker['requests'] for worker in health['workers']) >= 6)
+        self.assertEqual(len(health['workers']), 2)
+        self.assertTrue(all(worker['healthy'] for worker in health['workers']))
+
+    def testReload(self):
+        '''SIGHUP starts new workers and the old ones finish the request they are serving'''
+
+        generation = self.health()['generation']
+        # the request is being read by an old worker when the reload starts
+        connection = socket.create_connection(('127.0.0.1', self.port))
+        connection.sendall(b'GET /task HTTP/1.1\r\nHost: 127.0.0.1\r\n')
+        time.sleep(0.5)
+        self.server.send_signal(signal.SIGHUP)
+        self.waitFor(lambda health: any(
+            worker['generation'] == generation and worker['state'] == 'stopping' for worker in health['workers']))
+        connection.sendall(b'\r\n')
+        self.assertTrue(connection.recv(100).startswith(b'HTTP/1.1 200 OK'))
+        connection.close()
+
+        health = self.waitFor(lambda health: {worker['generation'] for worker in health['workers']} == {generation + 1})
+        self.assertTrue(health['healthy'])
+        self.assertEqual(self.get('/task'), (200, []))
+
+    def testStop(self):
+        '''SIGTERM stops the workers and the supervisor'''
+
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'serve', '--port', str(free_port()),
+             '--workers', '1'], env=self.env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.assertIn(b'Serving on', server.stdout.readline())
+        time.sleep(1)
+        server.send_signal(signal.SIGTERM)
+        self.assertEqual(server.wait(timeout=30), 0)
+        server.stdout.close()
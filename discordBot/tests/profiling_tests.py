@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+from pathlib import Path
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.test import AsyncClient, override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task
+from bot8.profiling import ProfilingMiddleware, route_metrics
+
+
+class ProfilingTests(APITestCase):
+    '''Tests for the profiling middleware and /metrics'''
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        # overridden per test since class level overrides
+        # rely on class cleanups, which nose doesn't run
+        profiling = override_settings(
+            PROFILING={'ENABLED': True, 'SAMPLE_RATE': 0, 'TOKEN': 'secret', 'DIR': self.directory})
+        profiling.enable()
+        self.addCleanup(profiling.disable)
+        route_metrics.reset()
+
+        self.task = Task.objects.create(title="Task 1", guild=1)
+
+    def metrics(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+
+    def testRoutesAreRecorded(self):
+        '''requests are totalled per method, route and status'''
+
+        self.client.get("/task")
+        self.client.get(f"/task/{self.task.id}")
+        self.client.get("/task/999")
+        metrics = self.metrics()
+        self.assertIn('bot8_requests_total{method="GET",route="task",status="200"} 1', metrics)
+        self.assertIn('bot8_requests_total{method="GET",route="task/<int:pk>",status="200"} 1', metrics)
+        self.assertIn('bot8_requests_total{method="GET",route="task/<int:pk>",status="404"} 1', metrics)
+        self.assertIn('bot8_request_duration_seconds_count{method="GET",route="task",status="200"} 1', metrics)
+
+    def testQueriesAndSizeAreRecorded(self):
+        '''the queries and response size of a request are recorded'''
+
+        response = self.client.get("/task")
+        metrics = self.metrics()
+        self.assertIn('bot8_db_queries_total{method="GET",route="task",status="200"} 3', metrics)
+        self.assertIn(
+            f'bot8_response_bytes_total{{method="GET",route="task",status="200"}} {len(response.content)}', metrics)
+
+    def testProfileHeader(self):
+        '''a request with the profiling token in the header is dumped'''
+
+        self.client.get("/task")
+        self.client.get("/task", HTTP_X_PROFILE='1')
+        self.assertEqual(list(self.directory.iterdir()), [])
+        self.client.get("/task", HTTP_X_PROFILE='secret')
+        self.assertEqual(len(list(self.directory.glob('*-GET-task-*.prof'))), 1)
+
+        with self.settings(PROFILING={'ENABLED': True, 'DIR': self.directory}):
+            # without a token the header never profiles
+            self.client_class().get("/task", HTTP_X_PROFILE='1')
+        self.assertEqual(len(list(self.directory.iterdir())), 1)
+
+    def testAsync(self):
+        '''under ASGI the middleware stays async and counts the queries of the async views'''
+
+        async def get_response(request):
+            pass
+        self.assertTrue(iscoroutinefunction(ProfilingMiddleware(get_response)))
+
+        with self.settings(ROOT_URLCONF='discordbot.async_urls'):
+            response = async_to_sync(AsyncClient().get)("/task")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('bot8_db_queries_total{method="GET",route="task",status="200"} 3', self.metrics())
+
+    def testDisabled(self):
+        '''without profiling the middleware is not used and there are no metrics'''
+
+        with self.settings(PROFILING={'ENABLED': False}):
+            client = self.client_class()
+            client.get("/task")
+            self.assertEqual(client.get("/metrics").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(route_metrics.routes, {})
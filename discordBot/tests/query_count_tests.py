@@ -0,0 +1,82 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task, Users
+
+
+class QueryCountTests(APITestCase):
+    '''
+    Regression tests for the number of queries run by the task read endpoints.
+    The query count must not grow with the number of tasks or assignees
+    '''
+
+    def createTasks(self, count):
+        users = [Users.objects.get_or_create(username=f'user#{i}')[0] for i in range(3)]
+        for i in range(count):
+            task = Task.objects.create(title=f'Task {i}', guild=1)
+            task.assignees.set(users)
+
+    def testListQueryCount(self):
+        '''listing tasks costs one query for tasks and one for assignees, plus one for the ETag'''
+
+        self.createTasks(20)
+        with self.assertNumQueries(3):
+            response = self.client.get("/task")
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(len(response.data[0]['assignees']), 3)
+
+    def testListQueryCountIsConstant(self):
+        '''listing more tasks does not run more queries'''
+
+        self.createTasks(5)
+        with self.assertNumQueries(3):
+            self.client.get("/task")
+        self.createTasks(50)
+        with self.assertNumQueries(3):
+            self.client.get("/task")
+
+    def testListByUserQueryCount(self):
+        '''filtering by user still prefetches the assignees in one query'''
+
+        self.createTasks(20)
+        with self.assertNumQueries(3):
+            response = self.client.get("/task?user=user#1&guild=1")
+        self.assertEqual(len(response.data), 20)
+
+    def testPaginatedListQueryCount(self):
+        '''a page of tasks costs one query for tasks and one for assignees'''
+
+        self.createTasks(20)
+        with self.assertNumQueries(3):
+            response = self.client.get("/task?limit=5")
+        self.assertEqual(len(response.data['results']), 5)
+
+    def testStreamedListQueryCount(self):
+        '''streaming prefetches assignees once per chunk of tasks'''
+
+        self.createTasks(20)
+        with self.assertNumQueries(3):
+            response = self.client.get("/task?stream=true")
+            b''.join(response.streaming_content)
+
+    def testDetailQueryCount(self):
+        '''getting a single task costs one query for it and one for assignees'''
+
+        self.createTasks(1)
+        task = Task.objects.get()
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/task/{task.id}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['assignees']), 3)
+
+    def testAssignmentQueryCount(self):
+        '''assigning a role does not run a query per user'''
+
+        self.createTasks(3)
+        task_ids = list(Task.objects.values_list('id', flat=True))
+        assignees = [f'member#{i}' for i in range(50)]
+        # task lookup, user insert, assignee insert, the three revision
+        # increments and the change log insert, plus the transaction
+        with self.assertNumQueries(9):
+            response = self.client.put("/assignees", data={"tasks": task_ids, "assignees": assignees}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.assignees.through.objects.count(), 3 * 53)
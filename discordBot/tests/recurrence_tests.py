@@ -0,0 +1,211 @@
+import json
+from itertools import islice
+from django.test import TestCase, override_settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task, TaskOccurrence
+from bot8.recurrence import Rule, InvalidRule
+
+
+def times(*values):
+    return [parse_datetime(value) for value in values]
+
+
+class RuleTests(TestCase):
+    '''Tests for parsing and expanding recurrence rules'''
+
+    def testParse(self):
+        '''rules are parsed and written back in one form'''
+
+        self.assertEqual(str(Rule.parse("rrule:freq=weekly;byday=th,mo;interval=1")), "FREQ=WEEKLY;BYDAY=MO,TH")
+        self.assertEqual(str(Rule.parse("FREQ=DAILY;UNTIL=20230401")), "FREQ=DAILY;UNTIL=20230401T235959Z")
+        for text in ("", "FREQ=HOURLY", "FREQ=DAILY;BYDAY=MO", "FREQ=DAILY;COUNT=2;UNTIL=20230401",
+                     "FREQ=DAILY;INTERVAL=0", "FREQ=DAILY;BYSETPOS=1", "FREQ=WEEKLY;BYDAY=XX"):
+            with self.assertRaises(InvalidRule):
+                Rule.parse(text)
+
+    def testWeekly(self):
+        '''weekly rules repeat on their days from the start'''
+
+        rule = Rule.parse("FREQ=WEEKLY;BYDAY=MO,TH;COUNT=4")
+        # a wednesday
+        start = parse_datetime("2023-03-22T09:00:00Z")
+        self.assertEqual(list(rule.occurrences(start)), times(
+            "2023-03-23T09:00:00Z", "2023-03-27T09:00:00Z", "2023-03-30T09:00:00Z", "2023-04-03T09:00:00Z"))
+
+    def testMonthlySkipsMissingDays(self):
+        '''monthly occurrences on a day a month doesn't have are skipped'''
+
+        rule = Rule.parse("FREQ=MONTHLY;UNTIL=20230601")
+        self.assertEqual(list(rule.occurrences(parse_datetime("2023-01-31T12:00:00Z"))), times(
+            "2023-01-31T12:00:00Z", "2023-03-31T12:00:00Z", "2023-05-31T12:00:00Z"))
+
+    def testSkippingAhead(self):
+        '''expanding from a later time gives the same occurrences as expanding from the start'''
+
+        start = parse_datetime("2020-02-29T08:30:00Z")
+        after = parse_datetime("2023-06-01T00:00:00Z")
+        for text in ("FREQ=DAILY;INTERVAL=3", "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR,SU",
+                     "FREQ=MONTHLY;INTERVAL=5", "FREQ=YEARLY", "FREQ=WEEKLY;COUNT=500"):
+            rule = Rule.parse(text)
+            expected = list(islice((time for time in rule.occurrences(start) if time >= after), 10))
+            self.assertEqual(list(islice(rule.occurrences(start, after), 10)), expected, text)
+
+    def testWithoutStart(self):
+        '''a rule without a start has no occurrences'''
+
+        rule = Rule.parse("FREQ=DAILY")
+        self.assertEqual(list(rule.occurrences(None)), [])
+        self.assertFalse(rule.is_occurrence(None, parse_datetime("2023-03-20T09:00:00Z")))
+
+    @override_settings(TIME_ZONE='Europe/Paris')
+    def testKeepsWallTime(self):
+        '''occurrences keep their local hour across daylight saving changes'''
+
+        rule = Rule.parse("FREQ=DAILY;COUNT=3")
+        occurrences = list(rule.occurrences(parse_datetime("2023-03-25T09:00:00+01:00")))
+        self.assertEqual(occurrences[-1], parse_datetime("2023-03-27T09:00:00+02:00"))
+
+
+class RecurringTaskTests(APITestCase):
+    '''Tests for recurring tasks in task listings'''
+
+    def setUp(self):
+        response = self.client.post("/task", data={
+            "title": "Standup", "guild": 1, "due_date": "2023-03-20T09:00:00Z", "recurrence": "FREQ=WEEKLY;BYDAY=MO,WE"})
+        self.standup = Task.objects.get(id=response.data['id'])
+        self.review = Task.objects.create(title="Review", guild=1, due_date="2023-03-22T12:00:00Z")
+        Task.objects.create(title="Later", guild=1, due_date="2023-05-01T12:00:00Z")
+        Task.objects.create(title="No due date", guild=1)
+        self.window = "from=2023-03-21T00:00:00Z&to=2023-03-30T00:00:00Z"
+
+    def listing(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        if response.streaming:
+            return json.loads(b''.join(response.streaming_content))
+        return response.json()
+
+    def dueDates(self, url):
+        return [(task['title'], task['due_date']) for task in self.listing(url)]
+
+    def occurrence(self, data):
+        return self.client.put(f"/task/{self.standup.id}/occurrence", data=data, format='json')
+
+    def testValidation(self):
+        '''invalid rules and recurring tasks without a due date are rejected'''
+
+        response = self.client.post("/task", data={"title": "Bad", "due_date": "2023-03-20T09:00:00Z", "recurrence": "FREQ=SOMETIMES"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post("/task", data={"title": "Bad", "recurrence": "FREQ=DAILY"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testDueDateIsKept(self):
+        '''the due date of a recurring task can't be removed, other changes of the batch are skipped'''
+
+        response = self.client.put("/task/batch", data={"tasks": [
+            {"id": self.review.id, "due_date": None}, {"id": self.standup.id, "due_date": None}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in response.json()], ["skipped", "invalid"])
+        response = self.client.post(f"/due-date/{self.standup.id}", data={"due_date": None}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.standup.refresh_from_db()
+        self.review.refresh_from_db()
+        self.assertEqual(str(self.standup.due_date), "2023-03-20 09:00:00+00:00")
+        self.assertIsNotNone(self.review.due_date)
+        response = self.client.put("/task/batch", data={"tasks": [{"id": self.review.id, "due_date": None}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def testWindowMergesOccurrences(self):
+        '''occurrences are listed in due date order with the other tasks of the window'''
+
+        self.assertEqual(self.dueDates(f"/task?{self.window}"), [
+            ("Standup", "2023-03-22T09:00:00Z"),
+            ("Review", "2023-03-22T12:00:00Z"),
+            ("Standup", "2023-03-27T09:00:00Z"),
+            ("Standup", "2023-03-29T09:00:00Z"),
+        ])
+        item = self.listing(f"/task?{self.window}&limit=1")
+        self.assertEqual(len(item), 1)
+        self.assertEqual(item[0]['occurrence'], "2023-03-22T09:00:00Z")
+        self.assertEqual(item[0]['recurrence'], "FREQ=WEEKLY;BYDAY=MO,WE")
+        self.assertFalse(item[0]['completed'])
+
+    def testEmptyRule(self):
+        '''a task with an empty rule doesn't repeat, it's listed once and its due date can be removed'''
+
+        Task.objects.filter(id=self.review.id).update(recurrence="")
+        self.assertEqual(self.dueDates(f"/task?{self.window}"), [
+            ("Standup", "2023-03-22T09:00:00Z"),
+            ("Review", "2023-03-22T12:00:00Z"),
+            ("Standup", "2023-03-27T09:00:00Z"),
+            ("Standup", "2023-03-29T09:00:00Z"),
+        ])
+        response = self.client.put("/task/batch", data={"tasks": [{"id": self.review.id, "due_date": None}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def testStreamedWindow(self):
+        '''streamed windows list the same tasks'''
+
+        self.assertEqual(self.listing(f"/task?{self.window}&stream=true"), self.listing(f"/task?{self.window}"))
+
+    def testListingWithoutWindow(self):
+        '''without a window a recurring task is listed once'''
+
+        titles = [task['title'] for task in self.listing("/task")]
+        self.assertEqual(titles.count("Standup"), 1)
+
+    def testInvalidWindow(self):
+        '''windows need both ends in order and at most MAX_WINDOW long'''
+
+        for query in ("from=2023-03-21T00:00:00Z", "from=2023-03-21T00:00:00Z&to=2023-03-20T00:00:00Z",
+                      "from=2023-03-21T00:00:00Z&to=2025-03-20T00:00:00Z", "from=x&to=y"):
+            self.assertEqual(self.client.get(f"/task?{query}").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testOverrides(self):
+        '''moved, completed and cancelled occurrences are stored and listed'''
+
+        self.assertEqual(self.occurrence({"occurrence": "2023-03-22T09:00:00Z", "due_date": "2023-03-23T10:00:00Z"}).status_code, status.HTTP_200_OK)
+        self.occurrence({"occurrence": "2023-03-27T09:00:00Z", "cancelled": True})
+        self.occurrence({"occurrence": "2023-03-29T09:00:00Z", "completed": True})
+        # moved in from outside of the window
+        self.occurrence({"occurrence": "2023-04-03T09:00:00Z", "due_date": "2023-03-28T09:00:00Z"})
+
+        items = self.listing(f"/task?{self.window}")
+        self.assertEqual([(task['due_date'], task['occurrence'], task['completed']) for task in items], [
+            ("2023-03-22T12:00:00Z", "2023-03-22T12:00:00Z", False),
+            ("2023-03-23T10:00:00Z", "2023-03-22T09:00:00Z", False),
+            ("2023-03-28T09:00:00Z", "2023-04-03T09:00:00Z", False),
+            ("2023-03-29T09:00:00Z", "2023-03-29T09:00:00Z", True),
+        ])
+        self.assertEqual(TaskOccurrence.objects.count(), 4)
+
+        # setting an occurrence back removes its override
+        self.occurrence({"occurrence": "2023-03-27T09:00:00Z"})
+        self.assertEqual(TaskOccurrence.objects.count(), 3)
+
+    def testOverrideChangesEtag(self):
+        '''changing an occurrence changes the ETag of the listings'''
+
+        etag = self.client.get(f"/task?guild=1&{self.window}")['ETag']
+        self.occurrence({"occurrence": "2023-03-22T09:00:00Z", "completed": True})
+        self.assertNotEqual(self.client.get(f"/task?guild=1&{self.window}")['ETag'], etag)
+
+    def testNotAnOccurrence(self):
+        '''only times the rule gives can be changed'''
+
+        self.assertEqual(self.occurrence({"occurrence": "2023-03-23T09:00:00Z", "completed": True}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(f"/task/{self.review.id}/occurrence", data={"occurrence": "2023-03-22T12:00:00Z"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put("/task/999/occurrence", data={"occurrence": "2023-03-22T12:00:00Z"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def testAsyncMatchesSync(self):
+        '''the async listing merges the same occurrences'''
+
+        self.occurrence({"occurrence": "2023-03-22T09:00:00Z", "completed": True})
+        expected = self.listing(f"/task?{self.window}&limit=3")
+        with override_settings(ROOT_URLCONF='discordbot.async_urls'):
+            self.assertEqual(self.listing(f"/task?{self.window}&limit=3"), expected)
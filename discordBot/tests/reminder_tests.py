@@ -0,0 +1,151 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from bot8 import reminders
+from bot8.models import Task, ReminderDelivery
+from bot8.reminders import ReminderScheduler
+from bot8.transfer import import_lines
+
+
+class RecordingSink:
+    '''sink that keeps the delivered reminders and can be made to fail'''
+
+    def __init__(self):
+        self.delivered = []
+        self.fail = False
+
+    def deliver(self, reminder):
+        if self.fail:
+            raise ConnectionError('sink is down')
+        self.delivered.append(reminder)
+
+
+class ReminderSchedulerTests(TestCase):
+    '''Tests for the reminder dispatch scheduler'''
+
+    def setUp(self):
+        self.now = datetime(2023, 3, 25, 12, 0, tzinfo=timezone.utc)
+        self.sink = RecordingSink()
+        self.scheduler = ReminderScheduler(
+            self.sink, lookahead=timedelta(hours=1), refresh_interval=3600, clock=lambda: self.now)
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+    def testOnlyWindowIsLoaded(self):
+        '''reminders after the lookahead window are not loaded'''
+
+        Task.objects.create(title="soon", reminder=self.now + timedelta(minutes=30))
+        Task.objects.create(title="later", reminder=self.now + timedelta(hours=5))
+        Task.objects.create(title="no reminder")
+        self.scheduler.load()
+        self.assertEqual(len(self.scheduler.heap), 1)
+
+    def testDeliversInReminderOrder(self):
+        '''due reminders are delivered earliest first, and only once they are due'''
+
+        Task.objects.create(title="second", reminder=self.now + timedelta(minutes=20))
+        Task.objects.create(title="first", reminder=self.now + timedelta(minutes=10))
+        self.scheduler.load()
+        self.assertEqual(self.scheduler.next_wakeup(), self.now + timedelta(minutes=10))
+
+        self.assertEqual(self.scheduler.run_pending(), 0)
+        self.advance(minutes=30)
+        self.assertEqual(self.scheduler.run_pending(), 2)
+        self.assertEqual([reminder.title for reminder in self.sink.delivered], ["first", "second"])
+
+    def testDeliveredOnlyOnce(self):
+        '''a delivered reminder is not loaded again'''
+
+        task = Task.objects.create(title="task", reminder=self.now)
+        task.assignees.create(username="user#1")
+        self.scheduler.load()
+        self.scheduler.run_pending()
+        self.assertEqual(self.sink.delivered[0].assignees, ["user#1"])
+        self.assertEqual(ReminderDelivery.objects.get(task=task).reminder, self.now)
+
+        self.scheduler.load()
+        self.assertEqual(self.scheduler.run_pending(), 0)
+        self.assertEqual(len(self.sink.delivered), 1)
+
+    def testChangedReminderIsDeliveredAgain(self):
+        '''setting a new reminder on a task schedules it again'''
+
+        task = Task.objects.create(title="task", reminder=self.now)
+        self.scheduler.load()
+        self.scheduler.run_pending()
+
+        task.reminder = self.now + timedelta(minutes=5)
+        task.save()
+        self.advance(minutes=5)
+        self.scheduler.load()
+        self.assertEqual(self.scheduler.run_pending(), 1)
+        self.assertEqual(len(self.sink.delivered), 2)
+
+    def testStaleReminderIsSkipped(self):
+        '''a reminder moved after it was loaded is not delivered at the old time'''
+
+        task = Task.objects.create(title="task", reminder=self.now + timedelta(minutes=5))
+        self.scheduler.load()
+        Task.objects.filter(id=task.id).update(reminder=self.now + timedelta(minutes=50))
+        self.advance(minutes=10)
+        self.assertEqual(self.scheduler.run_pending(), 0)
+
+    def testFailedDeliveryIsRetried(self):
+        '''a reminder the sink failed on is retried and not recorded as delivered'''
+
+        Task.objects.create(title="task", reminder=self.now)
+        self.scheduler.load()
+        self.sink.fail = True
+        self.assertEqual(self.scheduler.run_pending(), 0)
+        self.assertEqual(ReminderDelivery.objects.count(), 0)
+
+        self.sink.fail = False
+        self.advance(seconds=self.scheduler.retry_delay.total_seconds())
+        self.assertEqual(self.scheduler.run_pending(), 1)
+        self.assertEqual(ReminderDelivery.objects.count(), 1)
+
+    def testBatchesAreLoadedIncrementally(self):
+        '''with a full batch the rest of the window is loaded after delivering it'''
+
+        for i in range(5):
+            Task.objects.create(title=f"task {i}", reminder=self.now)
+        self.scheduler.batch_size = 2
+        self.scheduler.load()
+        self.assertEqual(len(self.scheduler.heap), 2)
+
+        delivered = 0
+        while self.scheduler.heap or self.scheduler.needs_load(self.now):
+            self.scheduler.load()
+            delivered += self.scheduler.run_pending()
+        self.assertEqual(delivered, 5)
+
+
+class WakeupTests(APITestCase):
+    '''Tests for waking the scheduler of the process when tasks are created with reminders'''
+
+    def setUp(self):
+        self.worker = mock.Mock()
+        patcher = mock.patch.object(reminders, '_worker', self.worker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reminder = "2023-03-25T14:30:00Z"
+
+    def testCreatedTasks(self):
+        '''every way of creating a task with a reminder wakes the scheduler up'''
+
+        self.client.post("/task", data={"title": "No reminder"})
+        self.client.post("/task/batch", data={"tasks": [{"title": "No reminder"}]}, format='json')
+        import_lines(['{"type": "task", "title": "No reminder"}'])
+        self.worker.notify.assert_not_called()
+
+        self.client.post("/task", data={"title": "Task", "reminder": self.reminder})
+        self.client.post("/task/batch", data={"tasks": [
+            {"title": "No reminder"}, {"title": "Task", "reminder": self.reminder}]}, format='json')
+        import_lines([json.dumps({"type": "task", "title": "Task", "reminder": self.reminder})])
+        with override_settings(ROOT_URLCONF='discordbot.async_urls'):
+            self.client.post("/task", data={"title": "Task", "reminder": self.reminder})
+        self.assertEqual(self.worker.notify.call_count, 4)
+        self.assertEqual(Task.objects.filter(reminder__isnull=False).count(), 4)
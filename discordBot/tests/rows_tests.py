@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from unittest import mock
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from bot8 import renderers
+from bot8.models import Task
+from bot8.renderers import FastJSONRenderer, dumps
+from bot8.rows import task_rows, task_row_data, iter_task_rows
+from bot8.serializers import TaskSerializer
+from bot8.views import list_tasks
+
+
+class TaskRowTests(TestCase):
+    '''Tests for the fast listing path and renderer, which must match TaskSerializer and JSONRenderer'''
+
+    def setUp(self):
+        self.task_1 = Task.objects.create(
+            title="T\u00e2che\u2028 1", guild=1,
+            due_date=datetime(2023, 3, 25, 14, 30, 0, 123456, tzinfo=timezone.utc))
+        self.task_2 = Task.objects.create(
+            title="Task 2", reminder=datetime(2023, 3, 26, 14, 40, tzinfo=timezone.utc))
+        self.task_3 = Task.objects.create(title="Task 3", guild=2)
+        self.task_1.assignees.create(username="user#2")
+        self.task_1.assignees.create(username="user#1")
+        self.task_3.assignees.create(username="user#3")
+
+    def expected(self, queryset):
+        return JSONRenderer().render(TaskSerializer(queryset.prefetch_related('assignees'), many=True).data)
+
+    def testRowsMatchSerializer(self):
+        '''the rows serialize and render to the same bytes as TaskSerializer and JSONRenderer'''
+
+        rows = [task_row_data(row) for row in task_rows(list_tasks())]
+        self.assertEqual(FastJSONRenderer().render(rows), self.expected(list_tasks()))
+        self.assertEqual(rows[0]['assignees'], ["user#1", "user#2"])
+
+    def testFilteredAndChunkedRows(self):
+        '''filtered querysets and chunked reads give the same rows'''
+
+        self.assertEqual(task_rows(list_tasks(guild=1)), list(iter_task_rows(list_tasks(guild=1), 1)))
+        self.assertEqual(list(iter_task_rows(list_tasks(), 2)), task_rows(list_tasks()))
+        rows = [task_row_data(row) for row in task_rows(list_tasks(user="user#3"))]
+        self.assertEqual(dumps(rows), self.expected(list_tasks(user="user#3")))
+
+    def testListingResponseIsUnchanged(self):
+        '''the listing endpoints return what TaskSerializer would'''
+
+        self.assertEqual(self.client.get("/task").content, self.expected(list_tasks()))
+        response = self.client.get("/task?limit=2").json()
+        self.assertEqual(response['results'], self.client.get("/task").json()[:2])
+        self.assertEqual(b''.join(self.client.get("/task?stream=true").streaming_content), self.expected(list_tasks()))
+
+    def testRendererWithoutOrjson(self):
+        '''without orjson the renderer falls back to JSONRenderer'''
+
+        data = [task_row_data(row) for row in task_rows(list_tasks())]
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+            self.assertEqual(dumps(data), JSONRenderer().render(data))
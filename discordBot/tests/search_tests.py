@@ -0,0 +1,95 @@
+from django.db import connection
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task
+from bot8.search import search_task_ids, has_fts, install
+
+
+class SearchTests(APITestCase):
+    '''Tests for the task title search and /task/search'''
+
+    def setUp(self):
+        self.report = Task.objects.create(title="Write the weekly report", guild=1)
+        self.reports = Task.objects.create(title="Report report report", guild=1)
+        self.meeting = Task.objects.create(title="Plan the meeting", guild=2)
+
+    def search(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def testIndexIsInstalled(self):
+        '''the migration created the FTS5 table'''
+
+        self.assertTrue(has_fts(connection))
+
+    def testRankedByRelevance(self):
+        '''titles where the words weigh more come first'''
+
+        ids = [task['id'] for task in self.search("/task/search?q=report")['results']]
+        self.assertEqual(ids, [self.reports.id, self.report.id])
+
+    def testEveryWordMatches(self):
+        '''a task must have every word, the last one can be a prefix'''
+
+        self.assertEqual(search_task_ids("weekly rep"), [self.report.id])
+        self.assertEqual(search_task_ids("weekly meeting"), [])
+
+    def testGuildFilter(self):
+        '''only the tasks of the guild are returned'''
+
+        data = self.search("/task/search?q=the&guild=2")
+        self.assertEqual([task['id'] for task in data['results']], [self.meeting.id])
+
+    def testQuerySyntaxIsIgnored(self):
+        '''FTS5 operators and quotes in the text are plain words'''
+
+        self.assertEqual(search_task_ids('"plan" OR NEAR(meeting'), [])
+        self.assertEqual(search_task_ids('plan* "meeting'), [self.meeting.id])
+
+    def testWritesAreIndexed(self):
+        '''creates, updates and deletes, including bulk ones, update the index'''
+
+        self.meeting.title = "Plan the party"
+        self.meeting.save()
+        Task.objects.bulk_create([Task(title="Party supplies")])
+        Task.objects.filter(id=self.report.id).update(title="Party report")
+        self.reports.delete()
+
+        self.assertEqual(len(search_task_ids("party")), 3)
+        self.assertEqual(search_task_ids("meeting"), [])
+        self.assertEqual(search_task_ids("report"), [self.report.id])
+
+    def testPagination(self):
+        '''pages follow each other through the next link'''
+
+        Task.objects.bulk_create([Task(title=f"Report {i}", guild=3) for i in range(5)])
+        data = self.search("/task/search?q=report&guild=3&limit=2")
+        ids = [task['id'] for task in data['results']]
+        while data['next']:
+            data = self.search(data['next'])
+            ids += [task['id'] for task in data['results']]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def testSerializedLikeListing(self):
+        '''results have the fields of the task listing'''
+
+        self.client.put(f"/assignees/{self.meeting.id}", data={"assignees": ["user#1"]})
+        result = self.search("/task/search?q=meeting")['results'][0]
+        listed = self.client.get("/task?guild=2").json()[0]
+        self.assertEqual(result, listed)
+
+    def testInstallIsIdempotent(self):
+        '''installing again keeps the index'''
+
+        install(connection)
+        self.assertEqual(search_task_ids("meeting"), [self.meeting.id])
+
+    def testInvalidParameters(self):
+        '''missing text or invalid numbers are rejected'''
+
+        self.assertEqual(self.client.get("/task/search").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get("/task/search?q=a&limit=x").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get("/task/search?q=a&offset=-1").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search("/task/search?q=!!")['results'], [])
@@ -0,0 +1,132 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8 import throttling
+from bot8.models import Task
+from bot8.throttling import listing_slots, take_token
+
+
+def throttle(**options):
+    config = {'ENABLED': True, 'RATE': 1, 'BURST': 3, 'MAX_CONCURRENT_LISTINGS': 2}
+    config.update(options)
+    return override_settings(GUILD_THROTTLE=config)
+
+
+class TokenBucketTests(SimpleTestCase):
+    '''Tests for the token bucket arithmetic'''
+
+    def testBurstThenRate(self):
+        '''a full bucket lets BURST requests through, then one per 1 / RATE seconds'''
+
+        full_at = 100.0
+        for _ in range(3):
+            wait, full_at = take_token(full_at, 100.0, rate=2, burst=3)
+            self.assertEqual(wait, 0)
+        wait, _ = take_token(full_at, 100.0, rate=2, burst=3)
+        self.assertAlmostEqual(wait, 0.5)
+        wait, _ = take_token(full_at, 100.5, rate=2, burst=3)
+        self.assertEqual(wait, 0)
+
+
+class ThrottlingTests(APITestCase):
+    '''Tests for the guild rate limit and the listing concurrency limit'''
+
+    def setUp(self):
+        throttling._stores.clear()
+        cache.clear()
+        Task.objects.create(title="Task 1", guild=1)
+
+    def statuses(self, url, n, **extra):
+        return [self.client.get(url, **extra).status_code for _ in range(n)]
+
+    def testDisabledByDefault(self):
+        '''without the setting requests are never throttled'''
+
+        self.assertEqual(set(self.statuses("/task?guild=1", 10)), {status.HTTP_200_OK})
+
+    def testRateLimitPerGuild(self):
+        '''a guild over its burst gets a 429 with Retry-After, other guilds don't'''
+
+        with throttle():
+            self.assertEqual(self.statuses("/task?guild=1", 3), [status.HTTP_200_OK] * 3)
+            response = self.client.get("/task?guild=1")
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '1')
+            # the header counts against the same guild
+            self.assertEqual(self.client.get("/task/cache", HTTP_X_GUILD="1").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(self.client.get("/task?guild=2").status_code, status.HTTP_200_OK)
+
+    def testPaddedGuilds(self):
+        '''spellings of the same guild share its bucket and slots, other values count against the client'''
+
+        with throttle():
+            self.assertEqual(
+                [self.client.get(f"/task?guild={guild}").status_code for guild in ("1", "01", "+1", " 1")],
+                [status.HTTP_200_OK] * 3 + [status.HTTP_429_TOO_MANY_REQUESTS])
+            self.assertEqual(self.statuses("/task/cache?guild=one", 3), [status.HTTP_200_OK] * 3)
+            self.assertEqual(self.client.get("/task/cache?guild=two").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        throttling._stores.clear()
+        with throttle(MAX_CONCURRENT_LISTINGS=1):
+            self.assertTrue(listing_slots.acquire('1', 1))
+            try:
+                self.assertEqual(self.client.get("/task?guild=001").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            finally:
+                listing_slots.release('1')
+
+    def testCacheStore(self):
+        '''buckets can be kept in a shared cache'''
+
+        store = {'CLASS': 'bot8.throttling.CacheStore', 'OPTIONS': {'alias': 'default'}}
+        with throttle(STORE=store):
+            self.assertEqual(self.statuses("/task?guild=1", 4)[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+            # a new store on the same cache sees the same buckets
+            throttling._stores.clear()
+            self.assertEqual(self.client.get("/task?guild=1").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def testAsyncViews(self):
+        '''the async views are throttled the same way'''
+
+        with throttle(), override_settings(ROOT_URLCONF='discordbot.async_urls'):
+            statuses = self.statuses("/task?guild=1", 4)
+            response = self.client.get(f"/task/{Task.objects.get().id}?guild=1")
+        self.assertEqual(statuses, [status.HTTP_200_OK] * 3 + [status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(response['Retry-After'], '1')
+
+    def testConcurrentListings(self):
+        '''listings over the concurrency limit of a guild are turned away'''
+
+        with throttle(BURST=100):
+            self.assertTrue(listing_slots.acquire('1', 2))
+            self.assertTrue(listing_slots.acquire('1', 2))
+            try:
+                response = self.client.get("/task?guild=1")
+                self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+                self.assertEqual(response['Retry-After'], '1')
+                self.assertEqual(self.client.get("/task?guild=2").status_code, status.HTTP_200_OK)
+                with override_settings(ROOT_URLCONF='discordbot.async_urls'):
+                    self.assertEqual(self.client.get("/task?guild=1").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            finally:
+                listing_slots.release('1')
+                listing_slots.release('1')
+            self.assertEqual(self.client.get("/task?guild=1").status_code, status.HTTP_200_OK)
+        self.assertEqual(listing_slots.in_flight, {})
+
+    def testStreamHoldsSlot(self):
+        '''a streamed listing holds its slot until it is streamed'''
+
+        for urls in ('discordbot.urls', 'discordbot.async_urls'):
+            with throttle(BURST=100), override_settings(ROOT_URLCONF=urls):
+                response = self.client.get("/task?guild=1&stream=true")
+                self.assertEqual(listing_slots.in_flight, {'1': 1})
+                if response.is_async:
+                    from asgiref.sync import async_to_sync
+
+                    async def read():
+                        return [chunk async for chunk in response.streaming_content]
+                    async_to_sync(read)()
+                else:
+                    b''.join(response.streaming_content)
+                response.close()
+            self.assertEqual(listing_slots.in_flight, {}, urls)
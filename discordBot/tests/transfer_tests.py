@@ -0,0 +1,107 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from django.core.management import call_command, CommandError
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task, TaskChange, Users
+from bot8.transfer import import_lines, InvalidImport
+
+
+class TransferTests(APITestCase):
+    '''Tests for the NDJSON export and import of tasks'''
+
+    def setUp(self):
+        self.client.post("/task/batch", data={"tasks": [
+            {"title": "Task 1", "guild": 1, "due_date": "2023-10-25T14:30:00Z", "assignees": ["user#1", "user#2"]},
+            {"title": "Task 2", "guild": 1, "assignees": ["user#2"]},
+            {"title": "Task 3", "guild": 2},
+        ]}, format='json')
+        Users.objects.filter(username="user#1").update(servername="server")
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    def records(self, content):
+        return [json.loads(line) for line in content.splitlines()]
+
+    def guildTasks(self, guild):
+        return [(task['title'], task['due_date'], task['assignees'])
+                for task in self.client.get(f"/task?guild={guild}").json()]
+
+    def testExportFormat(self):
+        '''a header, the users of the guild, then its tasks'''
+
+        records = self.records(self.export("/task/export?guild=1"))
+        self.assertEqual(records[0], {"type": "export", "version": 1, "guild": 1})
+        self.assertEqual([record['type'] for record in records[1:]], ['user', 'user', 'task', 'task'])
+        self.assertEqual(records[1], {"type": "user", "username": "user#1", "servername": "server"})
+        self.assertEqual(records[3]['title'], "Task 1")
+        self.assertEqual(records[3]['assignees'], ["user#1", "user#2"])
+
+    def testRoundTrip(self):
+        '''importing an export into another guild copies its tasks'''
+
+        content = self.export("/task/export?guild=1")
+        response = self.client.post("/task/import?guild=9", data=content, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {"users": 2, "tasks": 2})
+        self.assertEqual(self.guildTasks(9), self.guildTasks(1))
+
+    def testGzipRoundTrip(self):
+        '''compressed exports can be imported'''
+
+        content = self.export("/task/export?gzip=true")
+        self.assertEqual(len(self.records(gzip.decompress(content))), 6)
+        response = self.client.post("/task/import", data=content, content_type='application/gzip')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Task.objects.filter(guild=2).count(), 2)
+
+    def testImportIsLogged(self):
+        '''imported tasks are in the change log'''
+
+        content = self.export("/task/export?guild=2")
+        self.client.post("/task/import?guild=3", data=content, content_type='application/x-ndjson')
+        self.assertEqual(TaskChange.objects.filter(guild=3, op=TaskChange.CREATE).count(), 1)
+
+    def testInvalidLine(self):
+        '''the import stops at an invalid line, earlier batches stay imported'''
+
+        lines = [b'{"type": "task", "title": "ok", "guild": 4}', b'{"type": "task", "title": 5, "due_date": "x"}']
+        with self.assertRaises(InvalidImport) as raised:
+            import_lines(lines, batch_size=1)
+        self.assertEqual(raised.exception.line, 2)
+        self.assertEqual(raised.exception.imported, {"users": 0, "tasks": 1})
+
+        response = self.client.post("/task/import", data=b'not json\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['line'], 1)
+
+    def testBatches(self):
+        '''imports in batches smaller than the export give the same tasks'''
+
+        lines = self.export("/task/export?guild=1").splitlines()
+        self.assertEqual(import_lines(lines, guild=5, batch_size=1), {"users": 2, "tasks": 2})
+        self.assertEqual(self.guildTasks(5), self.guildTasks(1))
+
+    def testCommands(self):
+        '''exporttasks and importtasks move a guild through a file'''
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'guild.ndjson.gz')
+            call_command('exporttasks', '--guild', '1', '--output', path)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(2), b'\x1f\x8b')
+            out = io.StringIO()
+            call_command('importtasks', path, '--guild', '7', stdout=out)
+            self.assertIn('Imported 2 tasks', out.getvalue())
+            self.assertEqual(self.guildTasks(7), self.guildTasks(1))
+
+            with open(path, 'wb') as f:
+                f.write(b'{"type": "export", "version": 2}\n')
+            with self.assertRaises(CommandError):
+                call_command('importtasks', path)
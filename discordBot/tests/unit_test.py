@@ -2,6 +2,7 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from bot8.models import Task, Users
 from datetime import datetime
+import json
 
 class US1Tests(APITestCase):
     '''Tests for US1 : Task Creation'''
@@ -38,6 +39,64 @@ class US1Tests(APITestCase):
         self.assertEqual(responseOne["title"], self.data["title"])
 
 
+class TaskBatchTests(APITestCase):
+    '''Tests for creating tasks in a batch'''
+
+    def setUp(self):
+        self.url = "/task/batch"
+        self.tasks = [
+            {"title": "task 1", "guild": 1, "assignees": ["Amann#4989", "Jack#7654"]},
+            {"title": "task 2", "due_date": "2023-03-26T14:40:00Z", "reminder": "2023-03-25T14:40:00Z"},
+            {"title": "task 3", "guild": 1, "assignees": ["Jack#7654"]},
+        ]
+
+    def testCreateBatch(self):
+        '''Every task in the batch should be created with its assignees'''
+
+        response = self.client.post(self.url, data={"tasks": self.tasks}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result['status'] for result in response.data], ["created"] * 3)
+        task_1 = Task.objects.get(id=response.data[0]['id'])
+        self.assertEqual(task_1.title, "task 1")
+        self.assertEqual(sorted(user.username for user in task_1.assignees.all()), ["Amann#4989", "Jack#7654"])
+        task_2 = Task.objects.get(id=response.data[1]['id'])
+        self.assertEqual(str(task_2.due_date), "2023-03-26 14:40:00+00:00")
+        self.assertEqual(Users.objects.count(), 2)
+
+    def testInvalidTaskAbortsBatch(self):
+        '''By default no task is created if one of them is invalid'''
+
+        self.tasks[1]["due_date"] = "not a date"
+        response = self.client.post(self.url, data={"tasks": self.tasks}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in response.data], ["skipped", "invalid", "skipped"])
+        self.assertIn("due_date", response.data[1]['errors'])
+        self.assertEqual(Task.objects.count(), 0)
+        self.assertEqual(Users.objects.count(), 0)
+
+    def testInvalidTaskSkipped(self):
+        '''With on_error skip the valid tasks are still created'''
+
+        del self.tasks[0]["title"]
+        response = self.client.post(self.url, data={"tasks": self.tasks, "on_error": "skip"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in response.data], ["invalid", "created", "created"])
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(Task.objects.get(id=response.data[2]['id']).title, "task 3")
+
+    def testInvalidBatch(self):
+        '''A batch that is not a list of tasks should return an error'''
+
+        response = self.client.post(self.url, data={"tasks": "task 1"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, data=[{"title": "task 1"}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, 'Invalid batch')
+
+
 class US2Tests(APITestCase):
     '''Tests for US2 : Task Assignment'''
 
@@ -92,6 +151,59 @@ class US2Tests(APITestCase):
         self.assertEqual(2, len(Task.objects.get(id=1).assignees.all()))
 
 
+class BulkAssignmentTests(APITestCase):
+    '''Tests for assigning users to many tasks at once'''
+
+    def setUp(self):
+        self.tasks = [Task.objects.create(title=f'Task {i}') for i in range(3)]
+        self.task_ids = [task.id for task in self.tasks]
+        self.url = "/assignees"
+
+    def testAssignToManyTasks(self):
+        '''Every user should be assigned to every task'''
+
+        data = {"tasks": self.task_ids, "assignees": ["Amann#4989", "Jack#7654"]}
+        response = self.client.put(self.url, data=data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for task in self.tasks:
+            usernames = sorted(user.username for user in task.assignees.all())
+            self.assertEqual(usernames, ["Amann#4989", "Jack#7654"])
+        self.assertEqual(Users.objects.count(), 2)
+
+    def testExistingUsersAreReused(self):
+        '''Existing users keep their data and already assigned users are skipped'''
+
+        Users.objects.create(username="Amann#4989", servername="server")
+        self.tasks[0].assignees.add("Amann#4989")
+
+        data = {"tasks": self.task_ids, "assignees": ["Amann#4989"]}
+        response = self.client.put(self.url, data=data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Users.objects.get().servername, "server")
+        for task in self.tasks:
+            self.assertEqual(1, task.assignees.count())
+
+    def testMissingTaskAssignsNothing(self):
+        '''If one of the tasks does not exist no task should be changed'''
+
+        data = {"tasks": self.task_ids + [999], "assignees": ["Amann#4989"]}
+        response = self.client.put(self.url, data=data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, 'Task(s) [999] do not exist')
+        self.assertEqual(0, Task.assignees.through.objects.count())
+        self.assertEqual(0, Users.objects.count())
+
+    def testInvalidTaskIds(self):
+        '''Task ids that are not numbers should return an error'''
+
+        data = {"tasks": ["abc"], "assignees": ["Amann#4989"]}
+        response = self.client.put(self.url, data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class US3Tests(APITestCase):
     '''Tests for US3 : Task Management Dashboard'''
 
@@ -233,3 +345,59 @@ class US6Tests(APITestCase):
         task = Task.objects.all().get(id=1)
         self.assertEqual(str(task.reminder),"2023-03-25 14:40:00+00:00")
 
+
+
+class TaskPaginationTests(APITestCase):
+    '''Tests for paginated and streamed task listings'''
+
+    def setUp(self):
+        Task.objects.create(title="Task 1", due_date="2023-03-23T14:30:00Z")
+        Task.objects.create(title="Task 2")
+        Task.objects.create(title="Task 3", due_date="2023-03-25T13:30:00Z")
+        Task.objects.create(title="Task 4", due_date="2023-03-23T14:30:00Z")
+        Task.objects.create(title="Task 5")
+        Task.objects.create(title="Task 6", due_date="2023-03-21T14:30:00Z")
+
+    def testUnpaginatedByDefault(self):
+        '''Without a limit or cursor the whole list is returned'''
+
+        response = self.client.get("/task")
+        self.assertEqual(len(response.data), 6)
+
+    def testPagesFollowListOrder(self):
+        '''Following the next links should visit every task once in list order'''
+
+        expected = [task['title'] for task in self.client.get("/task").data]
+        titles = []
+        url = "/task?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            titles += [task['title'] for task in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(titles, expected)
+        self.assertEqual(titles, ["Task 6", "Task 1", "Task 4", "Task 3", "Task 2", "Task 5"])
+
+    def testLastPageHasNoNext(self):
+        '''A page that reaches the end of the list has no next link'''
+
+        response = self.client.get("/task?limit=10")
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertIsNone(response.data['next'])
+
+    def testInvalidCursor(self):
+        '''An invalid cursor returns a 404'''
+
+        response = self.client.get("/task?cursor=notacursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def testStreamMatchesList(self):
+        '''A streamed listing has the same content as the normal listing'''
+
+        response = self.client.get("/task?stream=true")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(streamed, self.client.get("/task").json())
@@ -0,0 +1,123 @@
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+from bot8.models import Task, TaskChange
+
+
+class UpdateTests(APITestCase):
+    '''Tests for the single UPDATE due date and reminder writes and PUT /task/batch'''
+
+    def setUp(self):
+        self.task_1 = Task.objects.create(title="Task 1", guild=1)
+        self.task_2 = Task.objects.create(title="Task 2", guild=2)
+
+    def batch(self, tasks):
+        return self.client.put("/task/batch", data={"tasks": tasks}, format='json')
+
+    def testSingleUpdateStatement(self):
+        '''setting a due date writes the task with one UPDATE and never reads it'''
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f"/due-date/{self.task_1.id}", data={"due_date": "2023-10-25T14:30:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        task_queries = [query['sql'] for query in queries if '"bot8_task"' in query['sql']]
+        self.assertEqual(len(task_queries), 1)
+        self.assertTrue(task_queries[0].startswith('UPDATE'))
+
+        self.task_1.refresh_from_db()
+        self.assertEqual(str(self.task_1.due_date), "2023-10-25 14:30:00+00:00")
+        self.assertEqual(self.task_1.revision, 2)
+
+    def testInvalidDueDate(self):
+        '''an invalid due date is rejected without writing'''
+
+        response = self.client.post(f"/due-date/{self.task_1.id}", data={"due_date": "tomorrow"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TaskChange.objects.exists())
+
+    def testMissingTask(self):
+        '''updating a task that doesn't exist writes nothing'''
+
+        response = self.client.put("/reminder/999", data={"reminder": "2023-03-26T14:40:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TaskChange.objects.exists())
+
+    def testBatch(self):
+        '''every change of a batch is applied, missing tasks are reported'''
+
+        response = self.batch([
+            {"id": self.task_1.id, "due_date": "2023-10-25T14:30:00Z", "reminder": "2023-10-25T14:00:00Z"},
+            {"id": 999, "due_date": "2023-10-25T14:30:00Z"},
+            {"id": self.task_2.id, "reminder": None},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.json(), [
+            {"status": "updated", "id": self.task_1.id},
+            {"status": "not_found", "id": 999},
+            {"status": "updated", "id": self.task_2.id},
+        ])
+        self.task_1.refresh_from_db()
+        self.assertEqual(str(self.task_1.reminder), "2023-10-25 14:00:00+00:00")
+        self.assertEqual(
+            sorted(TaskChange.objects.values_list('task_id', 'guild')),
+            sorted([(self.task_1.id, 1), (self.task_2.id, 2)]))
+
+    def testBatchCoalesces(self):
+        '''changes of the same task are merged, the last value wins'''
+
+        response = self.batch([
+            {"id": self.task_1.id, "due_date": "2023-10-25T14:30:00Z"},
+            {"id": self.task_1.id, "reminder": "2023-10-25T14:00:00Z"},
+            {"id": self.task_1.id, "due_date": "2023-11-25T14:30:00Z"},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.task_1.refresh_from_db()
+        self.assertEqual(str(self.task_1.due_date), "2023-11-25 14:30:00+00:00")
+        self.assertEqual(str(self.task_1.reminder), "2023-10-25 14:00:00+00:00")
+        self.assertEqual(self.task_1.revision, 2)
+        self.assertEqual(TaskChange.objects.count(), 1)
+
+    def testBatchInvalid(self):
+        '''nothing is changed when a change is invalid'''
+
+        response = self.batch([
+            {"id": self.task_1.id, "due_date": "2023-10-25T14:30:00Z"},
+            {"id": self.task_2.id},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()[0], {"status": "skipped"})
+        self.assertEqual(response.json()[1]['status'], "invalid")
+        self.task_1.refresh_from_db()
+        self.assertIsNone(self.task_1.due_date)
+
+    def testBatchNotAnObject(self):
+        '''a body that isn't an object with a list of changes is rejected'''
+
+        for data in ([{"id": self.task_1.id, "due_date": None}], {"tasks": "task 1"}):
+            response = self.client.put("/task/batch", data=data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data, 'Invalid batch')
+
+    def testBatchQueries(self):
+        '''a batch costs one UPDATE per task and one revision and log write for all'''
+
+        tasks = Task.objects.bulk_create([Task(title=f"Task {i}", guild=1) for i in range(20)])
+        changes = [{"id": task.id, "due_date": "2023-10-25T14:30:00Z"} for task in tasks]
+        with CaptureQueriesContext(connection) as queries:
+            self.batch(changes)
+        sql = [query['sql'] for query in queries]
+        self.assertEqual(len([query for query in sql if query.startswith('UPDATE "bot8_task"')]), 20)
+        self.assertEqual(len([query for query in sql if 'bot8_taskchange' in query]), 1)
+
+    def testWithoutReturning(self):
+        '''databases without UPDATE ... RETURNING read the guild first'''
+
+        with mock.patch('bot8.updates.can_return_from_update', return_value=False):
+            response = self.batch([
+                {"id": self.task_2.id, "due_date": "2023-10-25T14:30:00Z"},
+                {"id": 999, "due_date": "2023-10-25T14:30:00Z"},
+            ])
+        self.assertEqual([result['status'] for result in response.json()], ["updated", "not_found"])
+        self.assertEqual(list(TaskChange.objects.values_list('task_id', 'guild')), [(self.task_2.id, 2)])